@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+from typing import NamedTuple, Optional
+from scipy import sparse
+
+# project code
+from util import EmtdbConnection
+from emtdb_api import pull_lmp_data_many
+
+PATH_COLUMNS = ['Source', 'Sink', 'MW']
+PLANNING_YEAR_MONTHS = [6, 7, 8, 9, 10, 11, 12, 1, 2, 3, 4, 5]
+
+
+class PathSettles(NamedTuple):
+    # congestion settlements of ARR paths, MW x (sink - source congestion), columns = Paths (index of the path list)
+    hourly: Optional[pd.DataFrame]  # index names = ('Date', 'Hour'), None unless requested
+    monthly: pd.DataFrame  # index = First date of each month
+    planning_year: pd.DataFrame  # index = Planning years, e.g. '2024-2025'
+
+
+def planning_years(dates: pd.DatetimeIndex) -> pd.Index:
+    """
+    Planning year of each date (June to May), e.g. '2024-2025' for 2024-06-01 to 2025-05-31, the vectorized version of
+    "planning_year_from_date" in ARR.ipynb
+    """
+    first_year = dates.year - (dates.month < 6)
+    return pd.Index(first_year.astype(str) + '-' + (first_year + 1).astype(str))
+
+
+def build_incidence(paths: pd.DataFrame, nodes: pd.Index) -> sparse.csr_matrix:
+    """
+    Sparse node x path incidence matrix of ARR paths: +MW at the sink and -MW at the source of each path, so that
+    congestion (hours x nodes) @ incidence is the hourly settlement of every path
+
+    Args:
+        paths: Path list with columns PATH_COLUMNS, node IDs as in nodes
+        nodes: Node IDs (the columns of the congestion matrix)
+
+    Returns: scipy.sparse.csr_matrix of shape (n_nodes, n_paths)
+    """
+    source = nodes.get_indexer(paths['Source'])
+    sink = nodes.get_indexer(paths['Sink'])
+    assert (source >= 0).all() and (sink >= 0).all(), 'path nodes missing from the nodes'
+    mw = paths['MW'].to_numpy(dtype=float)
+    columns = np.arange(len(paths))
+
+    # duplicate entries are summed, so a path with the same source and sink is worth 0
+    return sparse.csr_matrix((np.concatenate([mw, -mw]), (np.concatenate([sink, source]),
+                                                          np.concatenate([columns, columns]))),
+                             shape=(len(nodes), len(paths)))
+
+
+def value_arr_paths(paths: pd.DataFrame, df_congestion: pd.DataFrame, hourly: bool = False,
+                    chunk_hours: int = 24 * 366) -> PathSettles:
+    """
+    Values the congestion settlements of an ARR path portfolio as sparse incidence matrix products. Hours where the
+    source or the sink congestion is missing settle at 0 for that path, as in the stage 1A valuation of ARR.ipynb.
+    The hours are processed chunk_hours at a time, so that the hourly settlements of all paths are only kept if
+    requested.
+
+    Args:
+        paths: Path list with columns PATH_COLUMNS, e.g. one row per selected source with the sink of the zone and the
+            capacity in MW
+        df_congestion: Hourly congestion prices, columns = Node IDs, index names = ('Date', 'Hour'), e.g. from
+            "pull_arr_path_congestion". Node IDs are matched as strings.
+        hourly: Flag to also return the hourly settlement of every path
+        chunk_hours: Number of hours valued at a time
+
+    Returns: PathSettles
+    """
+    missing = [x for x in PATH_COLUMNS if x not in paths.columns]
+    if missing:
+        raise Exception(f'missing path columns: {missing}')
+
+    df_congestion = df_congestion.sort_index()
+    df_congestion.columns = df_congestion.columns.astype(str)
+    paths = paths.assign(Source=paths['Source'].astype(str), Sink=paths['Sink'].astype(str))
+
+    # nodes without congestion history are missing in every hour
+    nodes = pd.Index(pd.concat([paths['Source'], paths['Sink']]).unique())
+    absent = [x for x in nodes if x not in df_congestion.columns]
+    if absent:
+        print(f'missing congestion: {absent}')
+    congestion = df_congestion.reindex(columns=nodes).to_numpy(dtype=float)
+    is_missing = np.isnan(congestion)
+    incidence = build_incidence(paths, nodes)
+    # nodes of each path, to find the hours where either node is missing
+    uses_node = abs(build_incidence(paths.assign(MW=1), nodes))
+
+    # sparse month x hour matrix summing the hours of each month
+    dates = pd.DatetimeIndex(df_congestion.index.get_level_values('Date'))
+    months = dates.to_period('M')
+    month_codes, unique_months = pd.factorize(months, sort=True)
+    n_hours = len(dates)
+    month_sum = sparse.csr_matrix((np.ones(n_hours), (month_codes, np.arange(n_hours))),
+                                  shape=(len(unique_months), n_hours))
+
+    monthly = np.zeros((len(unique_months), len(paths)))
+    hourly_values = []
+    for start in range(0, n_hours, chunk_hours):
+        end = min(start + chunk_hours, n_hours)
+        values = np.asarray(incidence.T @ np.nan_to_num(congestion[start:end]).T).T
+        is_invalid = np.asarray(uses_node.T @ is_missing[start:end].T.astype(float)).T > 0
+        values[is_invalid] = 0
+        monthly += month_sum[:, start:end] @ values
+        if hourly:
+            hourly_values.append(values)
+
+    df_monthly = pd.DataFrame(monthly, index=unique_months.to_timestamp(), columns=paths.index)
+    df_planning_year = df_monthly.groupby(planning_years(df_monthly.index)).sum()
+    df_hourly = pd.DataFrame(np.concatenate(hourly_values), index=df_congestion.index, columns=paths.index) \
+        if hourly else None
+
+    return PathSettles(hourly=df_hourly, monthly=df_monthly, planning_year=df_planning_year)
+
+
+def pivot_month_planning_year(df_monthly: pd.DataFrame) -> pd.DataFrame:
+    """
+    Portfolio settlement (sum of all paths) of each month and planning year, as the stage 1A congestion settles table of
+    ARR.ipynb
+
+    Args:
+        df_monthly: Monthly settlements, e.g. PathSettles.monthly
+
+    Returns: pd.DataFrame
+        columns = Planning years
+        index = Months (6, 7, ..., 12, 1, ..., 5)
+    """
+    total = df_monthly.sum(axis=1)
+    return pd.DataFrame({
+        'Month': total.index.month, 'Planning_year': planning_years(total.index), 'All_Paths': total.to_numpy()
+    }).pivot_table(index='Month', columns='Planning_year', values='All_Paths', aggfunc='sum').reindex(
+        PLANNING_YEAR_MONTHS
+    )
+
+
+def pull_arr_path_congestion(emtdb: EmtdbConnection, paths: pd.DataFrame, start_dt: str, end_dt: str,
+                             da_or_rt: str = 'DA') -> pd.DataFrame:
+    """
+    Pulls the hourly congestion of the union of the sources and sinks of a path list in bulk (see
+    "emtdb_api.pull_lmp_data_many")
+
+    Returns: pd.DataFrame
+        columns = Node IDs
+        index names = ('Date', 'Hour')
+    """
+    nodes = pd.concat([paths['Source'], paths['Sink']]).astype(str).unique()
+    return pull_lmp_data_many(emtdb=emtdb, pnode_ids=nodes, da_or_rt=da_or_rt, start_dt=start_dt, end_dt=end_dt,
+                              price_data_type='CONGESTION', wide=True)
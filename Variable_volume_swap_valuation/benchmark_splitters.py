@@ -0,0 +1,138 @@
+"""
+Benchmark of the splitter kernel ("splitters.calc_splitters_from_daily_prices") against the per-month apply path that
+"pull_lmp_and_calc_splitter" used before it, on synthetic MISO day-ahead LMPs (no EMTDB connection needed)
+
+Usage:
+    python benchmark_splitters.py
+    python benchmark_splitters.py --nodes 1 10 50 --eval-dt 2024-07-10
+"""
+import argparse
+import numpy as np
+import pandas as pd
+from time import time
+from typing import List
+from scipy.stats import norm
+
+# project code
+from util import date_hour_to_peak_block, peak_block_to_traded_peak, get_holidays, convert_lmps_tz
+from splitters import months_away, pull_lmp_and_calc_splitter, pull_lmp_and_calc_splitters
+
+
+def synthetic_lmps(pnode_ids: List[str], start_dt: str, end_dt: str, seed: int = 0) -> pd.DataFrame:
+    """
+    Random hourly LMPs with a daily and seasonal shape, as pulled from EMTDB
+
+    Returns: pd.DataFrame
+        columns = ('Pnode ID', 'Date', 'Hour', 'Price')
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start_dt, end_dt)
+    hours = np.arange(1, 25)
+    seasonal = 8 * np.cos(2 * np.pi * dates.month.to_numpy() / 12)
+    shape = 30 + 10 * np.sin(np.pi * (hours - 6) / 18)[np.newaxis, :] + seasonal[:, np.newaxis]
+
+    data = []
+    for pnode_id in pnode_ids:
+        price = shape * rng.uniform(0.8, 1.2) + rng.normal(scale=5, size=shape.shape)
+        data.append(pd.DataFrame({
+            'Pnode ID': pnode_id, 'Date': np.repeat(dates, len(hours)), 'Hour': np.tile(hours, len(dates)),
+            'Price': price.ravel()
+        }))
+    return pd.concat(data, ignore_index=True)
+
+
+def baseline_splitter(df_lmp: pd.DataFrame, eval_dt: str, clip_quantile: float = 1) -> pd.DataFrame:
+    """
+    Splitters of one MISO node with the per-month apply path used before the kernel (the post-processing of
+    "pull_lmp_and_calc_splitter" in the baseline version of splitters.py), from LMPs pulled from EMTDB
+
+    Returns: pd.DataFrame
+        column names = ('2x16') splitters
+        index = Months 1-12
+    """
+    iso = 'MISO'
+    df_lmp = convert_lmps_tz(df_lmp=df_lmp[['Date', 'Hour', 'Price']].copy(), convert_from='EST', convert_to='EPT')
+    df_lmp['Price'] = df_lmp['Price'].clip(upper=df_lmp['Price'].quantile(clip_quantile, interpolation='higher'))
+    df_lmp['Month'] = df_lmp['Date'].dt.month
+    df_lmp['Peak Block'] = df_lmp.apply(
+        lambda x: date_hour_to_peak_block(date=x['Date'], hour=x['Hour'], iso=iso), axis=1
+    )
+    df_lmp['5x16 / Off'] = df_lmp.apply(
+        lambda x: peak_block_to_traded_peak(peak_block=x['Peak Block'], iso=iso), axis=1
+    )
+    df_daily = df_lmp[['Date', 'Month']].drop_duplicates()
+    df_daily = df_daily.merge(
+        df_lmp.pivot_table(index='Date', columns='5x16 / Off', values='Price', aggfunc='mean'),
+        how='left', on='Date', validate='1:1'
+    ).drop(['5x16'], axis=1)
+    df_daily = df_daily.merge(
+        df_lmp.pivot_table(index='Date', columns='Peak Block', values='Price', aggfunc='mean'),
+        how='left', on='Date', validate='1:1'
+    ).drop(['5x16', '7x8'], axis=1)
+    df_daily['Decay Factor'] = df_daily.apply(
+        lambda x: 0.5 ** ((np.abs(pd.to_datetime(eval_dt) - x['Date']) / pd.Timedelta(days=365)) + 1), axis=1
+    )
+    df_daily['Off peak day weight'] = df_daily.apply(
+        lambda x: 1 if (x['Date'] in get_holidays(x['Date'].year) or x['Date'].dayofweek in [5, 6]) else 1 / 3, axis=1
+    )
+
+    kernel_months = np.arange(1, 13)
+    splitter_dict = {}
+    for splitter_month in np.arange(1, 13):
+        kernel_weights = norm.pdf(months_away(kernel_months=kernel_months, splitter_month=splitter_month) / 0.5)
+        kernel_weights_df = pd.DataFrame({'Month': kernel_months, 'Weights': kernel_weights}).set_index('Month')
+        df_daily['Kernel Weight'] = df_daily.apply(lambda row: kernel_weights_df.iloc[row['Month'] - 1, 0], axis=1)
+        df_daily['2x16 weight'] = df_daily['Kernel Weight'] * df_daily['Decay Factor']
+        df_daily['Off peak weight'] = df_daily['2x16 weight'] * df_daily['Off peak day weight']
+        avg_2x16 = (df_daily['2x16'] * df_daily['2x16 weight']).sum() / \
+            df_daily['2x16 weight'][df_daily['2x16'].notnull()].sum()
+        avg_off = (df_daily['Off'] * df_daily['Off peak weight']).sum() / df_daily['Off peak weight'].sum()
+        splitter_dict[int(splitter_month)] = avg_2x16 / avg_off
+
+    return pd.DataFrame.from_dict(splitter_dict, orient='index', columns=['2x16']).rename_axis('Month')
+
+
+def benchmark(n_nodes: int, eval_dt: str = '2024-07-10', clip_quantile: float = 1) -> dict:
+    """
+    Times the baseline path node by node, the kernel node by node and the kernel for all nodes at once, and returns
+    the largest difference between the baseline and kernel splitters
+    """
+    end_dt = pd.to_datetime(eval_dt)
+    start_dt = end_dt - pd.offsets.MonthEnd() - pd.offsets.MonthBegin(24)
+    pnode_ids = [str(50000 + i) for i in range(n_nodes)]
+    df_lmp = synthetic_lmps(pnode_ids, start_dt, end_dt)
+
+    t0 = time()
+    baseline = pd.concat({
+        pnode_id: baseline_splitter(df_lmp[df_lmp['Pnode ID'] == pnode_id], eval_dt=eval_dt,
+                                    clip_quantile=clip_quantile)['2x16'] for pnode_id in pnode_ids
+    }, axis=1)
+    t1 = time()
+    for pnode_id in pnode_ids:
+        pull_lmp_and_calc_splitter(emtdb=None, iso='MISO', pnode_id=pnode_id, eval_dt=eval_dt,
+                                   clip_quantile=clip_quantile, df_lmp=df_lmp)
+    t2 = time()
+    kernel = pull_lmp_and_calc_splitters(emtdb=None, iso='MISO', pnode_ids=pnode_ids, eval_dt=eval_dt,
+                                         clip_quantile=clip_quantile, df_lmp=df_lmp)
+    t3 = time()
+
+    return {
+        'Nodes': n_nodes,
+        'Baseline (sec)': t1 - t0,
+        'Kernel Node by Node (sec)': t2 - t1,
+        'Kernel Batched (sec)': t3 - t2,
+        'Speedup': (t1 - t0) / (t3 - t2),
+        'Max Abs Diff': np.abs(kernel[pnode_ids].to_numpy() - baseline[pnode_ids].to_numpy()).max(),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of the splitter kernel against the per-month apply path')
+    parser.add_argument('--nodes', type=int, nargs='+', default=[1, 50], help='Numbers of nodes to benchmark')
+    parser.add_argument('--eval-dt', default='2024-07-10', help='Evaluation date')
+    parser.add_argument('--clip-quantile', type=float, default=1, help='Upper quantile of LMPs to clip')
+    args = parser.parse_args()
+
+    results = [benchmark(n_nodes=n, eval_dt=args.eval_dt, clip_quantile=args.clip_quantile) for n in args.nodes]
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(pd.DataFrame(results).set_index('Nodes'))
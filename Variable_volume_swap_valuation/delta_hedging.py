@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+from typing import NamedTuple, Tuple
+
+# project code
+from option_pricing import black_scholes
+
+
+class HedgeBacktest(NamedTuple):
+    # results of delta hedging a short option on each simulated path, present values at time 0
+    option_price: float  # Black-Scholes premium received
+    hedge_cost: np.ndarray  # cost of the trades in the underlying plus the payoff, (n_paths,)
+    pnl: np.ndarray  # premium - hedge cost, (n_paths,)
+
+
+def backtest_delta_hedge(prices: np.ndarray, times: np.ndarray, k: float, r: float, sigma: float, call: bool = True,
+                         rebalance_every: int = 1) -> HedgeBacktest:
+    """
+    Backtests delta hedging a short European option with the underlying on all simulated paths at once (the dynamic
+    hedge study in Options_valuation.ipynb over every path). The deltas of all paths and rebalance dates are computed
+    in one Black-Scholes call, and the trades are financed at the rate r, so the interest accrued on the cumulative cost
+    is the sum of the trades compounded from their trade date (the present value of each trade discounted to time 0).
+
+    Args:
+        prices: Simulated prices of shape (n_paths, n_steps + 1), starting at time 0 and ending at expiry, e.g. from
+            "monte_carlo.simulate_gbm_paths"
+        times: Times of the steps in years, shape (n_steps + 1,), expiry = times[-1]
+        k: Strike price
+        r: Continuously compounded interest rate
+        sigma: Volatility used for the premium and the deltas
+        call: True for a call, False for a put
+        rebalance_every: Number of steps between rebalances (e.g. 5 to rebalance weekly on daily steps). The hedge is
+            set at time 0 and closed at expiry.
+
+    Returns: HedgeBacktest
+    """
+    prices = np.asarray(prices, dtype=float)
+    times = np.asarray(times, dtype=float)
+    assert prices.ndim == 2 and prices.shape[1] == len(times) and rebalance_every > 0
+    expiry = times[-1]
+
+    rebalance_steps = np.arange(0, len(times) - 1, rebalance_every)
+    rebalance_prices = prices[:, rebalance_steps]
+    rebalance_times = times[rebalance_steps]
+
+    # units of the underlying held after each rebalance, and bought at each rebalance
+    shares = black_scholes(s_0=rebalance_prices, k=k, T=expiry - rebalance_times, r=r, sigma=sigma, call=call).delta
+    trades = np.diff(shares, axis=1, prepend=0)
+
+    final_prices = prices[:, -1]
+    payoff = np.maximum(final_prices - k, 0) if call else np.maximum(k - final_prices, 0)
+    hedge_cost = ((trades * rebalance_prices * np.exp(-r * rebalance_times)).sum(axis=1)
+                  + np.exp(-r * expiry) * (payoff - shares[:, -1] * final_prices))
+
+    option_price = float(black_scholes(s_0=prices[0, 0], k=k, T=expiry, r=r, sigma=sigma, call=call).price)
+    return HedgeBacktest(option_price=option_price, hedge_cost=hedge_cost, pnl=option_price - hedge_cost)
+
+
+def summarize_delta_hedges(prices: np.ndarray, times: np.ndarray, k: float, r: float, sigma: float, call: bool = True,
+                           rebalance_every: Tuple[int, ...] = (1, 5, 10, 25, 50)) -> pd.DataFrame:
+    """
+    Hedge performance of several rebalance frequencies on the same paths, see "backtest_delta_hedge"
+
+    Returns: pd.DataFrame
+        columns = ('Option Price', 'Mean Hedge Cost', 'Std Hedge Cost', 'Hedge Performance', 'Mean PnL', '5% PnL',
+                   '95% PnL')
+        index = Rebalance every n steps
+    """
+    data = {}
+    for n in rebalance_every:
+        backtest = backtest_delta_hedge(prices=prices, times=times, k=k, r=r, sigma=sigma, call=call,
+                                        rebalance_every=n)
+        data[n] = {
+            'Option Price': backtest.option_price,
+            'Mean Hedge Cost': backtest.hedge_cost.mean(),
+            'Std Hedge Cost': backtest.hedge_cost.std(ddof=1),
+            # Hull's hedge performance measure, the std of the hedge cost relative to the option price
+            'Hedge Performance': backtest.hedge_cost.std(ddof=1) / backtest.option_price,
+            'Mean PnL': backtest.pnl.mean(),
+            '5% PnL': np.quantile(backtest.pnl, 0.05),
+            '95% PnL': np.quantile(backtest.pnl, 0.95),
+        }
+
+    return pd.DataFrame.from_dict(data, orient='index').rename_axis('Rebalance Every')
@@ -1,13 +1,20 @@
 import pandas as pd
 import numpy as np
+from typing import List, Optional, TYPE_CHECKING
 
 # project code
-from util import EmtdbConnection, timer_func
+from util import EmtdbConnection, timer_func, chunker, parameterize_sql_list
 
+if TYPE_CHECKING:
+    from lmp_cache import LmpCache
+
+# LMPs are fetched straight into typed columns, see "EmtdbConnection.execute"
+LMP_DTYPES = {'Date': 'datetime64[ns]', 'Hour': 'int8', 'Price': 'float64'}
+FWD_MARKET_PRICE_DTYPES = {'EFFECTIVE_DATE': 'datetime64[ns]', 'PRICE': 'float64'}
 
 @timer_func
 def pull_lmp_data(emtdb: EmtdbConnection, pnode_id: str, da_or_rt: str, start_dt: str, end_dt: str,
-                  price_data_type: str = 'PRICE') -> pd.DataFrame:
+                  price_data_type: str = 'PRICE', lmp_cache: Optional['LmpCache'] = None) -> pd.DataFrame:
     """
     Pulls LMP data from RISKDB.MARKET_PRICE_DATA
 
@@ -18,11 +25,16 @@ def pull_lmp_data(emtdb: EmtdbConnection, pnode_id: str, da_or_rt: str, start_dt
         start_dt: First LMP date, e.g. '2024-03-01'
         end_dt: Last LMP date, e.g. '2024-06-30'
         price_data_type: Component of LMP to pull, e.g. 'PRICE', 'CONGESTION', 'LOSS'
+        lmp_cache: Optional lmp_cache.LmpCache, in which case only the dates missing from the cache are pulled
 
     Returns: pd.DataFrame
         columns = ('Price')
         index names = ('Date', 'Hour')
     """
+    if lmp_cache is not None:
+        return lmp_cache.pull_lmp_data(emtdb=emtdb, pnode_id=pnode_id, da_or_rt=da_or_rt, start_dt=start_dt,
+                                       end_dt=end_dt, price_data_type=price_data_type)
+
     start_dt = pd.to_datetime(start_dt).date()
     end_dt = pd.to_datetime(end_dt).date()
     print(f"Pulling {da_or_rt} LMP: pnode={pnode_id}, start={start_dt}, end={end_dt}...")
@@ -46,12 +58,88 @@ def pull_lmp_data(emtdb: EmtdbConnection, pnode_id: str, da_or_rt: str, start_dt
         'price_data_type': price_data_type
     }
 
-    df = emtdb.execute(qry=qry, params=params)
+    df = emtdb.execute(qry=qry, params=params, dtypes=LMP_DTYPES)
     df = df.set_index(['Date', 'Hour'])
 
     return df
 
 
+@timer_func
+def pull_lmp_data_many(emtdb: EmtdbConnection, pnode_ids: List[str], da_or_rt: str, start_dt: str, end_dt: str,
+                       price_data_type: str = 'PRICE', wide: bool = False, chunk_size: int = 500) -> pd.DataFrame:
+    """
+    Pulls LMP data for many pricing nodes from RISKDB.MARKET_PRICE_DATA, using one query per chunk of nodes
+
+    Args:
+        emtdb: EMTDB connection
+        pnode_ids: Pricing node IDs, e.g. ['51288', '51291']. Repeated nodes (e.g. the hub) are only pulled once.
+        da_or_rt: Day-Ahead (DA) or Real-Time (RT), eg. 'DA'
+        start_dt: First LMP date, e.g. '2024-03-01'
+        end_dt: Last LMP date, e.g. '2024-06-30'
+        price_data_type: Component of LMP to pull, e.g. 'PRICE', 'CONGESTION', 'LOSS'
+        wide: Flag to return one column per node instead of a long frame
+        chunk_size: Maximum number of nodes per query (Oracle allows at most 1000 expressions in an IN-list)
+
+    Returns: pd.DataFrame
+        if wide:
+            columns = Pnode IDs (in the order of first appearance in pnode_ids)
+            index names = ('Date', 'Hour')
+        else:
+            columns = ('Price')
+            index names = ('Pnode ID', 'Date', 'Hour')
+    """
+    assert 0 < chunk_size <= 1000
+    start_dt = pd.to_datetime(start_dt).date()
+    end_dt = pd.to_datetime(end_dt).date()
+
+    # de-duplicate while keeping the order of the nodes
+    pnode_ids = list(dict.fromkeys(parameterize_sql_list(pnode_ids)))
+
+    queries = {}
+    for i, chunk in enumerate(chunker(pnode_ids, chunk_size)):
+        pnode_params = {f'pnode_id_{j}': pnode_id for j, pnode_id in enumerate(chunk)}
+        qry = f"""
+            SELECT "LOCATION_4" as "Pnode ID", "PRICE_DATE" as "Date", "HOUR"/100 as "Hour", "PRICE" as "Price"
+            FROM RISKDB.MARKET_PRICE_DATA
+            WHERE "PRICE_DATE" >= :start_dt
+            AND "PRICE_DATE" <= :end_dt
+            AND "LOCATION_4" IN ({', '.join(':' + x for x in pnode_params.keys())})
+            AND "PRICE_TYPE" = :da_or_rt
+            AND "PRICE_DATA_TYPE" = :price_data_type
+            ORDER BY "LOCATION_4", "PRICE_DATE", "HOUR"
+        """
+
+        params = {
+            'start_dt': start_dt,
+            'end_dt': end_dt,
+            'da_or_rt': str(da_or_rt),
+            'price_data_type': price_data_type,
+            **pnode_params
+        }
+
+        queries[f'chunk {i}'] = (qry, params)
+
+    # chunks are pulled concurrently when the connection has a session pool
+    print(f"Pulling {da_or_rt} LMP: {len(pnode_ids)} pnodes in {len(queries)} queries, start={start_dt}, end={end_dt}...")
+    results = emtdb.execute_many(queries=queries, dtypes=LMP_DTYPES)
+    failed = [name for name, res in results.items() if res.error is not None]
+    if failed:
+        raise Exception(f'LMP pull failed for {failed}: {results[failed[0]].error!r}')
+
+    data = [res.df for res in results.values()]
+    df = pd.concat(data, ignore_index=True) if data else pd.DataFrame(columns=['Pnode ID', 'Date', 'Hour', 'Price'])
+    pulled = set(df['Pnode ID'])
+    missing = [x for x in pnode_ids if x not in pulled]
+    if missing:
+        print(f'missing LMPs: {missing}')
+
+    if wide:
+        df = df.pivot(index=['Date', 'Hour'], columns='Pnode ID', values='Price')
+        return df[[x for x in pnode_ids if x in pulled]]
+
+    return df.set_index(['Pnode ID', 'Date', 'Hour'])
+
+
 @timer_func
 def pull_m2m_shaper_vw(emtdb: EmtdbConnection, pnode_id: str, eval_dt: str, is_hourly: bool) -> pd.DataFrame:
     """
@@ -221,6 +309,54 @@ def pull_fwd_market_price(emtdb: EmtdbConnection, cd: str, bp: str, start_dt: st
     return df
 
 
+@timer_func
+def pull_fwd_market_price_many(emtdb: EmtdbConnection, bps: List[str], start_dt: str, end_dt: str,
+                               first_contract_month: str, last_contract_month: str,
+                               n_prompt_months: int = 12) -> pd.DataFrame:
+    """
+    Pulls the backbone prices of many basis points from RISKDB.FWD_MARKET_PRICE in one query (commodity = basis point,
+    e.g. 'PJM-ON'), without the outstanding bal-mo contracts of each trade date
+
+    Args:
+        emtdb: EMTDB connection
+        bps: Basis point codes, e.g. ['PJM-ON', 'PJM-OFF']
+        start_dt: First trade date, e.g. '2024-03-01'
+        end_dt: Last trade date, e.g. '2024-06-30'
+        first_contract_month: First contract month, e.g. '202404'
+        last_contract_month: Last contract month, e.g. '202506'
+        n_prompt_months: Number of prompt contracts kept for each trade date and basis point
+
+    Returns: pd.DataFrame
+        columns = (EFFECTIVE_DATE, BASIS_POINT, CONTRACT_MONTH, PRICE)
+    """
+    bps = list(dict.fromkeys(parameterize_sql_list(bps)))
+    assert 0 < len(bps) <= 1000
+    assert n_prompt_months > 0
+    bp_params = {f'bp_{i}': bp for i, bp in enumerate(bps)}
+    qry = f"""
+        SELECT EFFECTIVE_DATE, BASIS_POINT, CONTRACT_MONTH, PRICE
+        FROM (
+            SELECT EFFECTIVE_DATE, BASIS_POINT, CONTRACT_MONTH, FIXED_AMOUNT as PRICE,
+                ROW_NUMBER() OVER (PARTITION BY EFFECTIVE_DATE, BASIS_POINT ORDER BY CONTRACT_MONTH) as PROMPT
+            FROM RISKDB.FWD_MARKET_PRICE
+            WHERE BASIS_POINT IN ({', '.join(':' + x for x in bp_params.keys())})
+            AND COMMODITY = BASIS_POINT
+            AND EFFECTIVE_DATE BETWEEN :start_dt AND :end_dt
+            AND CONTRACT_MONTH BETWEEN :first_contract_month AND :last_contract_month
+            AND EFFECTIVE_DATE < TO_DATE(CONTRACT_MONTH, 'YYYYMM')
+        )
+        WHERE PROMPT <= :n_prompt_months
+        ORDER BY EFFECTIVE_DATE, BASIS_POINT, CONTRACT_MONTH
+    """
+    params = {
+        'start_dt': pd.to_datetime(start_dt).date(), 'end_dt': pd.to_datetime(end_dt).date(),
+        'first_contract_month': first_contract_month, 'last_contract_month': last_contract_month,
+        'n_prompt_months': n_prompt_months, **bp_params
+    }
+    df = emtdb.execute(qry=qry, params=params, dtypes=FWD_MARKET_PRICE_DTYPES)
+    return df
+
+
 def pull_discount_factors(
         emtdb: EmtdbConnection,
         effective_dt: str,
@@ -0,0 +1,165 @@
+import pandas as pd
+from time import time
+from typing import List, Optional
+
+# project code
+from util import EmtdbConnection
+from emtdb_api import pull_fwd_market_price_many
+from lmp_cache import ParquetCache
+
+
+class FwdPriceCache(ParquetCache):
+    """
+    Local Parquet cache in front of "emtdb_api.pull_fwd_market_price_many"
+
+    The prompt contracts of each trade date are stored in one file per (basis point, number of prompt months) together
+    with the contiguous range of trade dates that has been pulled for it. A request only queries EMTDB for the trade
+    dates outside of that range (e.g. the trade dates since the last eval date), with all basis points missing the same
+    trade dates pulled in one query, and the cached range of each basis point is extended to cover the request, up to
+    the last trade date returned by EMTDB for it. Trade dates after "today - settled_lag_days" are returned but never
+    cached.
+
+    Usage:
+        fwd_price_cache = FwdPriceCache(cache_dir=r'C:\\fwd_price_cache')
+        df_vol = get_forward_monthly_pvm(emtdb, '2024-07-10', fwd_price_cache=fwd_price_cache)[1]
+    """
+
+    INDEX_FILE = 'fwd_index.json'
+
+    def pull_fwd_market_prices(self, emtdb: EmtdbConnection, bps: List[str], start_dt: str, end_dt: str,
+                               n_prompt_months: int = 12) -> pd.DataFrame:
+        """
+        Same as "emtdb_api.pull_fwd_market_price_many" over all the prompt contracts of each trade date, but only pulls
+        the trade dates missing from the cache
+
+        Args:
+            emtdb: EMTDB connection
+            bps: Basis point codes, e.g. ['PJM-ON', 'PJM-OFF']
+            start_dt: First trade date, e.g. '2022-06-01'
+            end_dt: Last trade date, e.g. '2024-06-30'
+            n_prompt_months: Number of prompt contracts kept for each trade date and basis point
+
+        Returns: pd.DataFrame
+            columns = (EFFECTIVE_DATE, BASIS_POINT, CONTRACT_MONTH, PRICE)
+        """
+        start_dt = pd.Timestamp(pd.to_datetime(start_dt).date())
+        end_dt = pd.Timestamp(pd.to_datetime(end_dt).date())
+        last_settled_dt = self._last_settled_dt()
+        bps = list(dict.fromkeys(str(x) for x in bps))
+
+        # trade dates missing on either side of each cached range (the cached ranges are kept contiguous)
+        missing = {}
+        for bp in bps:
+            entry = self._index.get(self._key(bp, n_prompt_months))
+            if entry is None:
+                ranges = [(start_dt, end_dt)]
+            else:
+                cached_start_dt, cached_end_dt = pd.Timestamp(entry['start_dt']), pd.Timestamp(entry['end_dt'])
+                ranges = []
+                if start_dt < cached_start_dt:
+                    ranges.append((start_dt, cached_start_dt - pd.Timedelta(days=1)))
+                if end_dt > cached_end_dt:
+                    ranges.append((cached_end_dt + pd.Timedelta(days=1), end_dt))
+            for missing_range in ranges:
+                missing.setdefault(missing_range, []).append(bp)
+
+        # pull the basis points missing the same trade dates together, with the contract months covering the prompt
+        # contracts of those trade dates. The cached range of a basis point is only extended through the last trade
+        # date actually returned after it, so that marks that are late or missing in EMTDB are pulled again later.
+        pulled = {bp: [] for bp in bps}
+        returned_end_dts = {}
+        for bp in bps:
+            entry = self._index.get(self._key(bp, n_prompt_months))
+            returned_end_dts[bp] = pd.Timestamp(entry['end_dt']) if entry is not None else None
+        for (missing_start_dt, missing_end_dt), missing_bps in missing.items():
+            print(f'fwd price cache miss: bps={missing_bps}, start={missing_start_dt.date()}, '
+                  f'end={missing_end_dt.date()}')
+            df = pull_fwd_market_price_many(
+                emtdb=emtdb, bps=missing_bps, start_dt=missing_start_dt, end_dt=missing_end_dt,
+                first_contract_month=(missing_start_dt + pd.offsets.MonthBegin(n=1)).strftime('%Y%m'),
+                last_contract_month=(missing_end_dt + pd.offsets.MonthBegin(n=n_prompt_months)).strftime('%Y%m'),
+                n_prompt_months=n_prompt_months
+            )
+            for bp, df_bp in df.groupby('BASIS_POINT', sort=False):
+                pulled[bp].append(df_bp)
+                returned_end_dt = returned_end_dts[bp]
+                if returned_end_dt is None or missing_start_dt > returned_end_dt:
+                    returned_end_dts[bp] = pd.Timestamp(df_bp['EFFECTIVE_DATE'].max())
+
+        data = []
+        for bp in bps:
+            key = self._key(bp, n_prompt_months)
+            entry = self._index.get(key)
+            df_cached = self._read(entry) if entry is not None else _empty_fwd_prices()
+            df = pd.concat([df_cached] + pulled[bp], ignore_index=True)
+            df = df.sort_values(['EFFECTIVE_DATE', 'CONTRACT_MONTH'], ignore_index=True).assign(BASIS_POINT=bp)
+
+            # the entry is only rewritten if its range grew, e.g. not when EMTDB returned nothing new
+            cached_range = None if entry is None else (pd.Timestamp(entry['start_dt']), pd.Timestamp(entry['end_dt']))
+            new_range = cached_range
+            if any(bp in missing_bps for missing_bps in missing.values()) and returned_end_dts[bp] is not None:
+                new_range = (min([start_dt] + ([cached_range[0]] if entry is not None else [])),
+                             min(returned_end_dts[bp], last_settled_dt))
+            if new_range != cached_range and new_range[0] <= new_range[1]:
+                new_start_dt, new_end_dt = new_range
+                self._write_entry(
+                    key=key, file_name=f'FWD_{bp}_{n_prompt_months}',
+                    df=df.loc[df['EFFECTIVE_DATE'] <= new_end_dt, _empty_fwd_prices().columns],
+                    start_dt=new_start_dt, end_dt=new_end_dt, bp=bp, n_prompt_months=n_prompt_months
+                )
+            elif entry is not None:
+                entry['last_access'] = time()
+                self._write_index()
+
+            data.append(df[(df['EFFECTIVE_DATE'] >= start_dt) & (df['EFFECTIVE_DATE'] <= end_dt)])
+
+        return pd.concat(data, ignore_index=True)
+
+    def invalidate(self, bp: Optional[str] = None, from_dt: Optional[str] = None) -> int:
+        """
+        Removes cached prices matching the given filters (None matches everything)
+
+        Args:
+            bp: Basis point code, e.g. 'PJM-ON'
+            from_dt: If given, only trade dates on or after from_dt are removed (e.g. after a price correction)
+
+        Returns: number of cache entries modified or removed
+        """
+        count = 0
+        for key, entry in list(self._index.items()):
+            if bp is not None and entry['bp'] != str(bp):
+                continue
+
+            count += 1
+            from_dt_ = pd.Timestamp(from_dt) if from_dt is not None else None
+            if from_dt_ is None or from_dt_ <= pd.Timestamp(entry['start_dt']):
+                self._remove(key)
+            elif from_dt_ <= pd.Timestamp(entry['end_dt']):
+                df = self._read(entry)
+                self._write_entry(key=key, file_name=entry['file'][:-len('.parquet')],
+                                  df=df[df['EFFECTIVE_DATE'] < from_dt_], start_dt=pd.Timestamp(entry['start_dt']),
+                                  end_dt=from_dt_ - pd.Timedelta(days=1), bp=entry['bp'],
+                                  n_prompt_months=entry['n_prompt_months'])
+
+        self._write_index()
+        return count
+
+    def clear(self):
+        # removes all cached prices
+        self.invalidate()
+
+    def entries(self) -> pd.DataFrame:
+        # summary of the cache entries, most recently used first
+        columns = ['bp', 'n_prompt_months', 'start_dt', 'end_dt', 'size_bytes', 'last_access']
+        df = pd.DataFrame(list(self._index.values()), columns=columns + ['file'])[columns]
+        df['last_access'] = pd.to_datetime(df['last_access'], unit='s')
+        return df.sort_values('last_access', ascending=False, ignore_index=True)
+
+    @staticmethod
+    def _key(bp: str, n_prompt_months: int) -> str:
+        return f'{bp}|{n_prompt_months}'
+
+
+def _empty_fwd_prices() -> pd.DataFrame:
+    return pd.DataFrame({'EFFECTIVE_DATE': pd.Series(dtype='datetime64[ns]'), 'BASIS_POINT': pd.Series(dtype=str),
+                         'CONTRACT_MONTH': pd.Series(dtype=str), 'PRICE': pd.Series(dtype='float64')})
@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+from typing import Optional, Tuple
+
+# project code
+from util import spring_dst, fall_dst, hourly_index
+
+REPORT_COLUMNS = ['Fall DST Merged', 'Duplicates Merged', 'HE25 Dropped', 'Spring DST Filled', 'Hours Interpolated',
+                  'Hours Filled From Adjacent Days', 'Hours Missing']
+
+
+def repair_hourly(df: pd.DataFrame, start_dt: Optional[str] = None, end_dt: Optional[str] = None,
+                  fall_method: str = 'mean', spring_hour: int = 3, fall_hour: int = 2,
+                  max_gap_hours: int = 1) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Repairs hourly series of many zones / nodes at once onto "util.hourly_index" (24 hours every day):
+        1. The fall back hour (HE25, or a duplicate of fall_hour on the fall DST date) is merged into fall_hour, other
+           duplicate hours are merged the same way and HE25 on other dates is dropped
+        2. The spring forward hour (spring_hour on the spring DST date) is interpolated from its neighbours
+        3. Gaps of up to max_gap_hours are interpolated linearly from their neighbours (an isolated missing hour is the
+           average of the previous and next hours)
+        4. The remaining missing hours are the average of the same hour on the previous and next dates (as
+           "average_previous_and_subsequent_dates" in BGS.ipynb), when both are available
+
+    Args:
+        df: Hourly values, columns = Zones / nodes, index names = ('Date', 'Hour') with hours ending 1-25. The index can
+            have duplicates (e.g. after converting timezones, see "util.convert_lmps_tz").
+        start_dt: Optional first date of the output (defaults to the first date of df)
+        end_dt: Optional last date of the output (defaults to the last date of df)
+        fall_method: How duplicate hours are merged, 'mean' (e.g. load in MW or LMPs), 'sum' or 'first'
+        spring_hour: Hour ending missing on the spring DST date
+        fall_hour: Hour ending repeated on the fall DST date
+        max_gap_hours: Longest gap interpolated from the neighbouring hours
+
+    Returns: (repaired, report)
+        repaired: pd.DataFrame, columns = Zones / nodes, index = util.hourly_index(start_dt, end_dt)
+        report: pd.DataFrame of the number of hours repaired, columns = REPORT_COLUMNS, index = Zones / nodes
+    """
+    assert fall_method in ('mean', 'sum', 'first')
+    dates = pd.to_datetime(df.index.get_level_values(0))
+    hours = df.index.get_level_values(1).to_numpy().astype(int)
+    start_dt = pd.to_datetime(start_dt) if start_dt is not None else dates.min()
+    end_dt = pd.to_datetime(end_dt) if end_dt is not None else dates.max()
+    years = range(start_dt.year, end_dt.year + 1)
+    spring_dsts = pd.DatetimeIndex([spring_dst(year) for year in years])
+    fall_dsts = pd.DatetimeIndex([fall_dst(year) for year in years])
+    report = pd.DataFrame(0, index=df.columns, columns=REPORT_COLUMNS)
+
+    # 1. HE25 is the fall back hour on the fall DST dates, and dropped on other dates
+    is_fall_dst = dates.isin(fall_dsts)
+    is_he25 = hours == 25
+    report['HE25 Dropped'] = df[is_he25 & ~is_fall_dst].notna().sum()
+    keep = ~is_he25 | is_fall_dst
+    values = df[keep]
+    values.index = pd.MultiIndex.from_arrays([dates[keep], np.where(is_he25[keep], fall_hour, hours[keep])],
+                                             names=['Date', 'Hour'])
+
+    grouped = values.groupby(level=['Date', 'Hour'])
+    count = grouped.count()
+    is_merged = count > 1
+    is_fall_hour = count.index.get_level_values('Date').isin(fall_dsts) & \
+        (count.index.get_level_values('Hour') == fall_hour)
+    report['Fall DST Merged'] = is_merged[is_fall_hour].sum()
+    report['Duplicates Merged'] = is_merged[~is_fall_hour].sum()
+    values = getattr(grouped, fall_method)()
+    if fall_method == 'sum':
+        values = values.where(count > 0)
+
+    index = hourly_index(start_dt, end_dt)
+    values = values.reindex(index)
+    array = values.to_numpy(dtype=float)
+    is_missing = np.isnan(array)
+
+    # 2. and 3. position of the previous and next available hour of each missing hour
+    n_hours = len(array)
+    position = np.arange(n_hours)[:, None]
+    previous = np.maximum.accumulate(np.where(is_missing, -1, position), axis=0)
+    following = np.minimum.accumulate(np.where(is_missing, n_hours, position)[::-1], axis=0)[::-1]
+    is_inside = (previous >= 0) & (following < n_hours)
+
+    is_spring_hour = (index.get_level_values('Date').isin(spring_dsts) &
+                      (index.get_level_values('Hour') == spring_hour))[:, None]
+    is_spring_fill = is_missing & is_inside & is_spring_hour
+    is_interpolated = is_missing & is_inside & ~is_spring_hour & (following - previous - 1 <= max_gap_hours)
+    is_filled = is_spring_fill | is_interpolated
+
+    previous_value = np.take_along_axis(array, np.clip(previous, 0, n_hours - 1), axis=0)
+    following_value = np.take_along_axis(array, np.clip(following, 0, n_hours - 1), axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weight = (position - previous) / (following - previous)
+    array = np.where(is_filled, previous_value + weight * (following_value - previous_value), array)
+    report['Spring DST Filled'] = is_spring_fill.sum(axis=0)
+    report['Hours Interpolated'] = is_interpolated.sum(axis=0)
+
+    # 4. same hour of the previous and next dates
+    previous_date = np.full_like(array, np.nan)
+    previous_date[24:] = array[:-24]
+    next_date = np.full_like(array, np.nan)
+    next_date[:-24] = array[24:]
+    is_adjacent_fill = np.isnan(array) & ~np.isnan(previous_date) & ~np.isnan(next_date)
+    array = np.where(is_adjacent_fill, (previous_date + next_date) / 2, array)
+    report['Hours Filled From Adjacent Days'] = is_adjacent_fill.sum(axis=0)
+    report['Hours Missing'] = np.isnan(array).sum(axis=0)
+
+    repaired = pd.DataFrame(array, index=index, columns=df.columns)
+    repaired_count = report.drop(columns='Hours Missing').sum(axis=1).sum()
+    print(f'repaired {repaired_count} values, {report["Hours Missing"].sum()} missing')
+    return repaired, report
+
+
+def repair_hourly_long(df: pd.DataFrame, column: str, value: str, **kwargs) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Repairs long hourly data (e.g. LMPs with columns 'Pnode ID', 'Date', 'Hour', 'Price'), see "repair_hourly"
+
+    Args:
+        df: pd.DataFrame with columns ('Date', 'Hour', column, value)
+        column: Column identifying the series, e.g. 'Pnode ID'
+        value: Column of the values, e.g. 'Price'
+        kwargs: Arguments of "repair_hourly"
+
+    Returns: (repaired, report)
+        repaired: pd.DataFrame, columns = (column, 'Date', 'Hour', value), with NaN for the hours still missing
+        report: see "repair_hourly"
+    """
+    # duplicates of a (date, hour, column) are kept on separate rows
+    df = df.assign(_n=df.groupby(['Date', 'Hour', column], sort=False).cumcount())
+    wide = df.set_index(['Date', 'Hour', '_n', column])[value].unstack(column).droplevel('_n')
+
+    repaired, report = repair_hourly(wide, **kwargs)
+    repaired = repaired.rename_axis(columns=column).melt(ignore_index=False, value_name=value).reset_index()
+    return repaired[[column, 'Date', 'Hour', value]], report
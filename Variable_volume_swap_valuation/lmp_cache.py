@@ -0,0 +1,228 @@
+import os
+import re
+import json
+import pandas as pd
+from time import time
+from typing import Dict, List, Optional
+
+# project code
+from util import EmtdbConnection
+from emtdb_api import pull_lmp_data
+
+
+class ParquetCache:
+    """
+    Local cache of Parquet files with a JSON index of its entries, evicting the least recently used entries above a
+    total size. Subclasses define what an entry holds, see "LmpCache" and "fwd_price_cache.FwdPriceCache".
+    """
+
+    INDEX_FILE = 'index.json'
+
+    def __init__(self, cache_dir: str, max_size_mb: float = 2048, settled_lag_days: int = 1):
+        """
+        Args:
+            cache_dir: Directory containing the cache files (created if it does not exist)
+            max_size_mb: Total size of the cache files above which the least recently used entries are evicted
+            settled_lag_days: Number of days before today from which prices are treated as settled and can be cached
+        """
+        assert max_size_mb > 0
+        assert settled_lag_days >= 0
+        self.cache_dir = cache_dir
+        self.max_size_mb = max_size_mb
+        self.settled_lag_days = settled_lag_days
+        os.makedirs(cache_dir, exist_ok=True)
+        self._index = self._read_index()
+
+    def _last_settled_dt(self) -> pd.Timestamp:
+        return pd.Timestamp.today().normalize() - pd.Timedelta(days=self.settled_lag_days)
+
+    def size_mb(self) -> float:
+        return sum(entry['size_bytes'] for entry in self._index.values()) / 1e6
+
+    def evict(self) -> List[str]:
+        """
+        Evicts the least recently used entries until the cache is below max_size_mb
+
+        Returns: keys of the evicted entries
+        """
+        evicted = []
+        for key, entry in sorted(self._index.items(), key=lambda x: x[1]['last_access']):
+            if self.size_mb() <= self.max_size_mb:
+                break
+            self._remove(key)
+            evicted.append(key)
+        if evicted:
+            print(f'{type(self).__name__} evicted {len(evicted)} entries')
+            self._write_index()
+        return evicted
+
+    def _read_index(self) -> Dict[str, dict]:
+        file_name = os.path.join(self.cache_dir, self.INDEX_FILE)
+        if not os.path.exists(file_name):
+            return {}
+        with open(file_name) as f:
+            return json.load(f)
+
+    def _write_index(self):
+        file_name = os.path.join(self.cache_dir, self.INDEX_FILE)
+        with open(file_name + '.tmp', 'w') as f:
+            json.dump(self._index, f, indent=1)
+        os.replace(file_name + '.tmp', file_name)
+
+    def _read(self, entry: dict) -> pd.DataFrame:
+        return pd.read_parquet(os.path.join(self.cache_dir, entry['file']))
+
+    def _write_entry(self, key: str, file_name: str, df: pd.DataFrame, start_dt: pd.Timestamp, end_dt: pd.Timestamp,
+                     **fields):
+        # writes df to file_name and indexes it under key with its date range and the given fields
+        file_name = re.sub(r'[^\w.-]', '_', file_name) + '.parquet'
+        df.to_parquet(os.path.join(self.cache_dir, file_name), index=False)
+        self._index[key] = {
+            **fields,
+            'start_dt': str(start_dt.date()),
+            'end_dt': str(end_dt.date()),
+            'file': file_name,
+            'size_bytes': os.path.getsize(os.path.join(self.cache_dir, file_name)),
+            'last_access': time(),
+        }
+        self._write_index()
+        self.evict()
+
+    def _remove(self, key: str):
+        entry = self._index.pop(key)
+        file_name = os.path.join(self.cache_dir, entry['file'])
+        if os.path.exists(file_name):
+            os.remove(file_name)
+
+
+class LmpCache(ParquetCache):
+    """
+    Local Parquet cache in front of "emtdb_api.pull_lmp_data"
+
+    LMPs are stored in one file per (pnode, DA/RT, price data type) together with the contiguous date range that has
+    been pulled for it. A request only queries EMTDB for the dates outside of that range (e.g. the latest month), and the
+    cached range is extended to cover the request, up to the last date returned by EMTDB. Dates after
+    "today - settled_lag_days" are returned but never cached, so that unsettled prices are always re-pulled.
+
+    Usage:
+        lmp_cache = LmpCache(cache_dir=r'C:\\lmp_cache')
+        df_lmp = pull_lmp_data(emtdb, '51288', 'DA', '2023-01-01', '2024-06-30', lmp_cache=lmp_cache)
+    """
+
+    def pull_lmp_data(self, emtdb: EmtdbConnection, pnode_id: str, da_or_rt: str, start_dt: str, end_dt: str,
+                      price_data_type: str = 'PRICE') -> pd.DataFrame:
+        """
+        Same as "emtdb_api.pull_lmp_data", but only pulls the dates missing from the cache
+
+        Returns: pd.DataFrame
+            columns = ('Price')
+            index names = ('Date', 'Hour')
+        """
+        start_dt = pd.Timestamp(pd.to_datetime(start_dt).date())
+        end_dt = pd.Timestamp(pd.to_datetime(end_dt).date())
+        last_settled_dt = self._last_settled_dt()
+
+        key = self._key(pnode_id, da_or_rt, price_data_type)
+        entry = self._index.get(key)
+        df_cached = self._read(entry) if entry is not None else _empty_lmps()
+
+        # pull the dates missing on either side of the cached range (the cached range is kept contiguous)
+        data = [df_cached]
+        if entry is None:
+            missing = [(start_dt, end_dt)]
+        else:
+            cached_start_dt, cached_end_dt = pd.Timestamp(entry['start_dt']), pd.Timestamp(entry['end_dt'])
+            missing = []
+            if start_dt < cached_start_dt:
+                missing.append((start_dt, cached_start_dt - pd.Timedelta(days=1)))
+            if end_dt > cached_end_dt:
+                missing.append((cached_end_dt + pd.Timedelta(days=1), end_dt))
+
+        # the cached range is only extended through the last date actually returned after it, so that a day that is
+        # late or missing in EMTDB is pulled again by the next request
+        returned_end_dt = pd.Timestamp(entry['end_dt']) if entry is not None else None
+        for missing_start_dt, missing_end_dt in missing:
+            print(f'LMP cache miss: pnode={pnode_id}, start={missing_start_dt.date()}, end={missing_end_dt.date()}')
+            df = pull_lmp_data(
+                emtdb=emtdb, pnode_id=pnode_id, da_or_rt=da_or_rt, start_dt=missing_start_dt, end_dt=missing_end_dt,
+                price_data_type=price_data_type
+            ).reset_index()
+            df['Date'] = pd.to_datetime(df['Date'])
+            data.append(df)
+            if len(df) > 0 and (returned_end_dt is None or missing_start_dt > returned_end_dt):
+                returned_end_dt = df['Date'].max()
+
+        df = pd.concat(data, ignore_index=True).sort_values(['Date', 'Hour'], ignore_index=True)
+
+        if missing and returned_end_dt is not None:
+            new_start_dt = min([start_dt] + ([pd.Timestamp(entry['start_dt'])] if entry is not None else []))
+            new_end_dt = min(returned_end_dt, last_settled_dt)
+            if new_start_dt <= new_end_dt:
+                self._write(key, pnode_id, da_or_rt, price_data_type, new_start_dt, new_end_dt,
+                            df[df['Date'] <= new_end_dt])
+        elif entry is not None:
+            entry['last_access'] = time()
+            self._write_index()
+
+        df = df[(df['Date'] >= start_dt) & (df['Date'] <= end_dt)]
+        return df.set_index(['Date', 'Hour'])
+
+    def invalidate(self, pnode_id: Optional[str] = None, da_or_rt: Optional[str] = None,
+                   price_data_type: Optional[str] = None, from_dt: Optional[str] = None) -> int:
+        """
+        Removes cached LMPs matching the given filters (None matches everything)
+
+        Args:
+            pnode_id: Pricing node ID, e.g. '51288'
+            da_or_rt: Day-Ahead (DA) or Real-Time (RT), e.g. 'DA'
+            price_data_type: Component of LMP, e.g. 'PRICE', 'CONGESTION', 'LOSS'
+            from_dt: If given, only dates on or after from_dt are removed (e.g. after a price correction)
+
+        Returns: number of cache entries modified or removed
+        """
+        count = 0
+        for key, entry in list(self._index.items()):
+            if pnode_id is not None and entry['pnode_id'] != str(pnode_id):
+                continue
+            if da_or_rt is not None and entry['da_or_rt'] != da_or_rt:
+                continue
+            if price_data_type is not None and entry['price_data_type'] != price_data_type:
+                continue
+
+            count += 1
+            from_dt_ = pd.Timestamp(from_dt) if from_dt is not None else None
+            if from_dt_ is None or from_dt_ <= pd.Timestamp(entry['start_dt']):
+                self._remove(key)
+            elif from_dt_ <= pd.Timestamp(entry['end_dt']):
+                df = self._read(entry)
+                self._write(key, entry['pnode_id'], entry['da_or_rt'], entry['price_data_type'],
+                            pd.Timestamp(entry['start_dt']), from_dt_ - pd.Timedelta(days=1), df[df['Date'] < from_dt_])
+
+        self._write_index()
+        return count
+
+    def clear(self):
+        # removes all cached LMPs
+        self.invalidate()
+
+    def entries(self) -> pd.DataFrame:
+        # summary of the cache entries, most recently used first
+        columns = ['pnode_id', 'da_or_rt', 'price_data_type', 'start_dt', 'end_dt', 'size_bytes', 'last_access']
+        df = pd.DataFrame(list(self._index.values()), columns=columns + ['file'])[columns]
+        df['last_access'] = pd.to_datetime(df['last_access'], unit='s')
+        return df.sort_values('last_access', ascending=False, ignore_index=True)
+
+    @staticmethod
+    def _key(pnode_id: str, da_or_rt: str, price_data_type: str) -> str:
+        return f'{pnode_id}|{da_or_rt}|{price_data_type}'
+
+    def _write(self, key: str, pnode_id: str, da_or_rt: str, price_data_type: str, start_dt: pd.Timestamp,
+               end_dt: pd.Timestamp, df: pd.DataFrame):
+        self._write_entry(key=key, file_name=f'{pnode_id}_{da_or_rt}_{price_data_type}',
+                          df=df[['Date', 'Hour', 'Price']], start_dt=start_dt, end_dt=end_dt, pnode_id=str(pnode_id),
+                          da_or_rt=da_or_rt, price_data_type=price_data_type)
+
+
+def _empty_lmps() -> pd.DataFrame:
+    return pd.DataFrame({'Date': pd.Series(dtype='datetime64[ns]'), 'Hour': pd.Series(dtype='int8'),
+                         'Price': pd.Series(dtype='float64')})
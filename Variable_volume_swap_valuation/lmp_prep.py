@@ -0,0 +1,117 @@
+import pandas as pd
+from typing import List, Optional
+
+# project code
+from util import EmtdbConnection, lookup_hour_calendar, convert_lmps_tz
+from emtdb_api import pull_lmp_data, pull_lmp_data_many
+from lmp_cache import LmpCache
+from hourly_repair import repair_hourly_long
+
+# (EMTDB timezone, ISO timezone) for ISOs whose LMPs are not stored in the timezone of their peak definitions.
+# Sometimes for MISO, we convert LMPs to CPT and use hours 7-22 as the peak. If that is the case, change the conversion
+# to ('EST', 'CPT') and as a hack, classify the peak blocks with the iso 'SPP'
+ISO_TO_LMP_TZ_CONVERSION = {'MISO': ('EST', 'EPT')}
+
+
+def pull_lmps(emtdb: EmtdbConnection, pnode_ids: List[str], start_dt: str, end_dt: str,
+              lmp_cache: Optional[LmpCache] = None) -> pd.DataFrame:
+    """
+    Pulls day-ahead LMPs for many nodes, in a few chunked queries or node by node through the LMP cache
+
+    Args:
+        emtdb: EMTDB connection
+        pnode_ids: Pricing node IDs, e.g. ['51288', '51291']. Repeated nodes are only pulled once.
+        start_dt: First LMP date, e.g. '2024-03-01'
+        end_dt: Last LMP date, e.g. '2024-06-30'
+        lmp_cache: Optional local LMP cache, see lmp_cache.LmpCache
+
+    Returns: pd.DataFrame
+        columns = ('Pnode ID', 'Date', 'Hour', 'Price') in EMTDB's timezone
+    """
+    if lmp_cache is None:
+        return pull_lmp_data_many(emtdb=emtdb, pnode_ids=pnode_ids, da_or_rt='DA', start_dt=start_dt,
+                                  end_dt=end_dt).reset_index()
+
+    data = [
+        pull_lmp_data(emtdb=emtdb, pnode_id=pnode_id, da_or_rt='DA', start_dt=start_dt, end_dt=end_dt,
+                      lmp_cache=lmp_cache).reset_index().assign(**{'Pnode ID': pnode_id})
+        for pnode_id in dict.fromkeys(str(x) for x in pnode_ids)
+    ]
+    return pd.concat(data, ignore_index=True)[['Pnode ID', 'Date', 'Hour', 'Price']]
+
+
+def prepare_lmps(df_lmp: pd.DataFrame, iso: str, start_dt: Optional[str] = None, end_dt: Optional[str] = None,
+                 clip_quantile: float = 1, repair_hours: bool = False) -> pd.DataFrame:
+    """
+    Prepares LMPs pulled from EMTDB for shapers, splitters and PVMs: selects the dates between start_dt and end_dt,
+    converts them to the ISO's timezone, clips the upper quantile of each node's prices and annotates the month and
+    peak blocks
+
+    Args:
+        df_lmp: pd.DataFrame with columns ('Pnode ID', 'Date', 'Hour', 'Price') in EMTDB's timezone, e.g. from "pull_lmps"
+        iso: ISO, e.g. 'PJM'
+        start_dt: Optional first date (in EMTDB's timezone), e.g. '2022-07-01'
+        end_dt: Optional last date (in EMTDB's timezone), e.g. '2024-06-30'
+        clip_quantile: Upper quantile of each node's LMPs to clip (default methodology = 1, or no clipping)
+        repair_hours: If True, the DST duplicates and missing hours (e.g. from the timezone conversion) are repaired
+            after the conversion, see "hourly_repair.repair_hourly". Hours that cannot be repaired are dropped.
+
+    Returns: pd.DataFrame
+        columns = ('Pnode ID', 'Date', 'Hour', 'Price', 'Month', 'Peak Block', 'Traded Peak') in the ISO's timezone
+    """
+    assert 0 < clip_quantile <= 1
+    if start_dt is not None:
+        df_lmp = df_lmp[df_lmp['Date'] >= pd.to_datetime(start_dt)]
+    if end_dt is not None:
+        df_lmp = df_lmp[df_lmp['Date'] <= pd.to_datetime(end_dt)]
+    df_lmp = df_lmp[['Pnode ID', 'Date', 'Hour', 'Price']].reset_index(drop=True)
+
+    if iso in ISO_TO_LMP_TZ_CONVERSION:
+        convert_from, convert_to = ISO_TO_LMP_TZ_CONVERSION[iso]
+        df_lmp = convert_lmps_tz(df_lmp=df_lmp, convert_from=convert_from, convert_to=convert_to)
+
+    if repair_hours:
+        df_lmp = repair_hourly_long(df_lmp, column='Pnode ID', value='Price', start_dt=start_dt,
+                                    end_dt=end_dt)[0].dropna(subset=['Price']).reset_index(drop=True)
+
+    if clip_quantile < 1:
+        df_lmp['Price'] = df_lmp['Price'].clip(
+            upper=df_lmp.groupby('Pnode ID', sort=False)['Price'].transform('quantile', clip_quantile,
+                                                                            interpolation='higher'))
+
+    df_lmp['Month'] = df_lmp['Date'].dt.month
+    df_lmp[['Peak Block', 'Traded Peak']] = lookup_hour_calendar(
+        dates=df_lmp['Date'], hours=df_lmp['Hour'], iso=iso, columns=['Peak Block', 'Traded Peak'])
+
+    return df_lmp
+
+
+def pull_and_prepare_lmps(emtdb: EmtdbConnection, iso: str, pnode_ids: List[str], start_dt: str, end_dt: str,
+                          clip_quantile: float = 1, lmp_cache: Optional[LmpCache] = None,
+                          df_lmp: Optional[pd.DataFrame] = None, repair_hours: bool = False) -> pd.DataFrame:
+    """
+    Pulls day-ahead LMPs once for all nodes (see "pull_lmps") and prepares them (see "prepare_lmps")
+
+    Args:
+        emtdb: EMTDB connection
+        iso: ISO, e.g. 'PJM'
+        pnode_ids: Pricing node IDs, e.g. ['51288', '51291']
+        start_dt: First LMP date, e.g. '2022-07-01'
+        end_dt: Last LMP date, e.g. '2024-06-30'
+        clip_quantile: Upper quantile of each node's LMPs to clip (default methodology = 1, or no clipping)
+        lmp_cache: Optional local LMP cache, see lmp_cache.LmpCache
+        df_lmp: Optional LMPs already pulled with "pull_lmps" for a window containing start_dt to end_dt, in which case
+            nothing is pulled from EMTDB (e.g. to share one pull between shapers, splitters and PVMs)
+        repair_hours: If True, the DST duplicates and missing hours are repaired, see "prepare_lmps"
+
+    Returns: pd.DataFrame
+        columns = ('Pnode ID', 'Date', 'Hour', 'Price', 'Month', 'Peak Block', 'Traded Peak') in the ISO's timezone
+    """
+    pnode_ids = [str(x) for x in pnode_ids]
+    if df_lmp is None:
+        df_lmp = pull_lmps(emtdb=emtdb, pnode_ids=pnode_ids, start_dt=start_dt, end_dt=end_dt, lmp_cache=lmp_cache)
+    else:
+        df_lmp = df_lmp[df_lmp['Pnode ID'].isin(pnode_ids)]
+
+    return prepare_lmps(df_lmp=df_lmp, iso=iso, start_dt=start_dt, end_dt=end_dt, clip_quantile=clip_quantile,
+                        repair_hours=repair_hours)
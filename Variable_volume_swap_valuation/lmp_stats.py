@@ -0,0 +1,220 @@
+import pandas as pd
+from typing import List, Optional
+
+# project code
+from util import EmtdbConnection
+from lmp_cache import LmpCache
+from lmp_prep import ISO_TO_LMP_TZ_CONVERSION, pull_lmps, prepare_lmps
+from shapers import calc_shaper
+from splitters import calc_splitters_from_daily_prices
+from pvm import calc_cash_vol
+
+# increase when the way the statistics are computed changes, so that stored statistics are rebuilt
+STATS_VERSION = 1
+
+
+class LmpStats:
+    """
+    Sufficient statistics of a node's day-ahead LMPs, stored by month of EMTDB data, from which shapers, splitters and
+    cash vols are computed without the hourly LMPs
+
+    Each month holds the sums and counts of its LMPs by (month, peak block, hour) for shapers and by (date, peak block,
+    traded peak) for splitters and cash vols. "update" rolls the window forward by pulling only the months that are
+    missing or were incomplete (e.g. the current month) and dropping the months that left the window. The results are
+    the same as a full recompute (up to floating point rounding) under the methodology default of no LMP clipping; with
+    clipping, use the full recompute in shapers / splitters / pvm since the clipping quantile depends on the whole window.
+
+    Usage:
+        lmp_stats = LmpStats(iso='PJM', pnode_id='51288')
+        lmp_stats.update(emtdb, *lmp_stats.shaper_and_splitter_window(eval_dt='2024-07-10'))
+        shaper = lmp_stats.calc_shaper(eval_dt='2024-07-10', is_hourly=True)
+        splitter = lmp_stats.calc_splitter(eval_dt='2024-07-10')
+        lmp_stats.to_pickle(file_name)
+    """
+
+    def __init__(self, iso: str, pnode_id: str):
+        self.iso = iso
+        self.pnode_id = str(pnode_id)
+        self._months = {}
+        self._params = self._methodology_params()
+
+    def _methodology_params(self) -> tuple:
+        # parameters the statistics depend on, a change of which requires a full rebuild
+        return self.iso, ISO_TO_LMP_TZ_CONVERSION.get(self.iso), STATS_VERSION
+
+    @staticmethod
+    def shaper_and_splitter_window(eval_dt: str, lookback_yrs: int = 2) -> tuple:
+        """
+        Returns: (start date, end date) of the LMPs used by the shaper and the splitter on eval_dt
+        """
+        end_dt = pd.to_datetime(eval_dt)
+        shaper_end_dt = end_dt if end_dt.is_month_end else end_dt - pd.offsets.MonthEnd()
+        shaper_start_dt = shaper_end_dt - pd.offsets.MonthBegin(12 * lookback_yrs)
+        splitter_start_dt = (end_dt - pd.offsets.MonthEnd()) - pd.offsets.MonthBegin(12 * lookback_yrs)
+        return min(shaper_start_dt, splitter_start_dt), end_dt
+
+    def months(self) -> pd.DataFrame:
+        # summary of the stored months
+        return pd.DataFrame(
+            [(month, stats['end_dt']) for month, stats in sorted(self._months.items())], columns=['Month', 'End Date']
+        )
+
+    def update(self, emtdb: EmtdbConnection, start_dt: str, end_dt: str, lmp_cache: Optional[LmpCache] = None,
+               df_lmp: Optional[pd.DataFrame] = None) -> List[str]:
+        """
+        Updates the statistics to cover the LMPs from start_dt to end_dt
+
+        Args:
+            emtdb: EMTDB connection
+            start_dt: First LMP date (first day of a month), e.g. '2022-06-01'
+            end_dt: Last LMP date, e.g. '2024-07-10'
+            lmp_cache: Optional local LMP cache, see lmp_cache.LmpCache
+            df_lmp: Optional LMPs already pulled with "lmp_prep.pull_lmps" covering the missing months
+
+        Returns: months pulled, e.g. ['2024-06', '2024-07']
+        """
+        start_dt = pd.to_datetime(start_dt)
+        end_dt = pd.to_datetime(end_dt)
+        assert start_dt == start_dt.to_period('M').start_time, 'start_dt must be the first day of a month'
+        assert start_dt <= end_dt
+
+        if self._params != self._methodology_params():
+            print(f'methodology changed, rebuilding LMP stats: {self.pnode_id}')
+            self._months = {}
+            self._params = self._methodology_params()
+
+        # drop the months that left the window
+        months = {str(x): min(x.end_time.normalize(), end_dt) for x in pd.period_range(start_dt, end_dt, freq='M')}
+        self._months = {k: v for k, v in self._months.items() if k in months}
+
+        # pull the months that are missing or that were stored up to a different end date
+        missing = [k for k, v in months.items() if k not in self._months or self._months[k]['end_dt'] != v]
+        if not missing:
+            return missing
+
+        pull_start_dt = pd.Period(missing[0]).start_time
+        pull_end_dt = months[missing[-1]]
+        print(f'Updating LMP stats: pnode={self.pnode_id}, months={missing}')
+        if df_lmp is None:
+            df_lmp = pull_lmps(emtdb=emtdb, pnode_ids=[self.pnode_id], start_dt=pull_start_dt, end_dt=pull_end_dt,
+                               lmp_cache=lmp_cache)
+        df_lmp = df_lmp[df_lmp['Pnode ID'] == self.pnode_id]
+        lmp_months = df_lmp['Date'].dt.to_period('M').astype(str)
+
+        for month in missing:
+            df = prepare_lmps(df_lmp=df_lmp[lmp_months == month], iso=self.iso, start_dt=pd.Period(month).start_time,
+                              end_dt=months[month])
+            self._months[month] = {
+                'end_dt': months[month],
+                'hourly': df.groupby(['Month', 'Peak Block', 'Hour'], observed=True)['Price'].agg(['sum', 'count']),
+                'daily': df.groupby(['Date', 'Peak Block', 'Traded Peak'], observed=True)['Price'].agg(
+                    ['sum', 'count', 'size']),
+            }
+
+        return missing
+
+    def _stats(self, start_dt: pd.Timestamp, end_dt: pd.Timestamp, key: str) -> pd.DataFrame:
+        # sums the statistics of the months from start_dt to end_dt, which must be stored up to end_dt
+        data = []
+        for period in pd.period_range(start_dt, end_dt, freq='M'):
+            stats = self._months.get(str(period))
+            if stats is None or stats['end_dt'] != min(period.end_time.normalize(), end_dt):
+                raise Exception(f'LMP stats of {self.pnode_id} do not cover {period} up to {end_dt.date()}, '
+                                f'call "update" first')
+            data.append(stats[key])
+        df = pd.concat(data)
+        return df.groupby(level=list(range(df.index.nlevels)), observed=True).sum()
+
+    def calc_shaper(self, eval_dt: str, is_hourly: bool, lookback_yrs: int = 2) -> pd.DataFrame:
+        """
+        Same as "shapers.pull_lmp_and_calc_shaper" without clipping
+
+        Returns: pd.DataFrame
+        column names = ('Peak Block', 'Hour')
+        index = Months 1-12
+        """
+        if not is_hourly:
+            assert self.iso != 'CAISO'  # not currently supported
+        end_dt = pd.to_datetime(eval_dt)
+        if not end_dt.is_month_end:
+            end_dt -= pd.offsets.MonthEnd()
+        start_dt = end_dt - pd.offsets.MonthBegin(12 * lookback_yrs)
+
+        df_hourly = self._stats(start_dt=start_dt, end_dt=end_dt, key='hourly')
+        df_peak_block = df_hourly.groupby(level=['Month', 'Peak Block'], observed=True).sum()
+        avg_hourly = df_hourly['sum'] / df_hourly['count']
+        avg_peak_block = df_peak_block['sum'] / df_peak_block['count']
+
+        return calc_shaper(avg_hourly=avg_hourly, avg_peak_block=avg_peak_block, is_hourly=is_hourly)
+
+    def calc_splitter(self, eval_dt: str, lookback_yrs: int = 2) -> pd.DataFrame:
+        """
+        Same as "splitters.pull_lmp_and_calc_splitter" without clipping
+
+        Returns: pd.DataFrame
+        column names = ('2x16') splitters
+        index = Months 1-12
+        """
+        end_dt = pd.to_datetime(eval_dt)
+        start_dt = (end_dt - pd.offsets.MonthEnd()) - pd.offsets.MonthBegin(12 * lookback_yrs)
+
+        df_daily = self._stats(start_dt=start_dt, end_dt=end_dt, key='daily')
+        has_lmps = df_daily['size'].groupby(level='Date').sum() > 0
+
+        def daily_prices(df: pd.DataFrame) -> pd.Series:
+            df = df.groupby(level='Date').sum()
+            return (df['sum'] / df['count']).reindex(has_lmps.index)
+
+        df_2x16 = daily_prices(df_daily[df_daily.index.get_level_values('Peak Block') == '2x16'])
+        df_off = daily_prices(df_daily[df_daily.index.get_level_values('Traded Peak') == 'Off'])
+
+        return calc_splitters_from_daily_prices(
+            df_2x16=df_2x16.to_frame('2x16'), df_off=df_off.to_frame('2x16'), eval_dt=eval_dt, iso=self.iso,
+            has_lmps=has_lmps.to_frame('2x16')
+        )
+
+    def calc_cash_vol(self, start_dt: str, end_dt: str, zero_mean: bool) -> Optional[pd.DataFrame]:
+        """
+        Same as "pvm._get_cash_vol"
+
+        Args:
+            start_dt: Start date, e.g. '2023-10-15'. For ISOs whose LMPs are converted to another timezone (see
+                "lmp_prep.ISO_TO_LMP_TZ_CONVERSION"), the first day of a month, since the hours shifted across the
+                start date cannot be separated from the daily statistics.
+            end_dt: End date, e.g. '2024-06-30'
+            zero_mean: Flag for the assumption E[log LMP returns]=0
+
+        Returns: pd.DataFrame
+            columns = Peak blocks
+            rows = Month end dates over the time period
+        """
+        start_dt = pd.to_datetime(start_dt)
+        end_dt = pd.to_datetime(end_dt)
+        if self.iso in ISO_TO_LMP_TZ_CONVERSION:
+            assert start_dt == start_dt.to_period('M').start_time, 'start_dt must be the first day of a month'
+
+        # the statistics are stored by whole months, the days before start_dt are dropped as in the full recompute
+        df_daily = self._stats(start_dt=start_dt, end_dt=end_dt, key='daily')
+        dates = df_daily.index.get_level_values('Date')
+        df_daily = df_daily[(dates >= start_dt) & (dates <= end_dt)]
+        if df_daily['size'].sum() == 0:
+            print(f'missing LMPs: {self.pnode_id}')
+            return
+
+        df_daily = df_daily.groupby(level=['Date', 'Peak Block'], observed=True).sum()
+        df_daily_prices = (df_daily['sum'] / df_daily['count']).unstack()
+
+        return calc_cash_vol(df_daily_prices=df_daily_prices, iso=self.iso, start_dt=start_dt, end_dt=end_dt,
+                             zero_mean=zero_mean)
+
+    def to_pickle(self, file_name: str):
+        pd.to_pickle({'iso': self.iso, 'pnode_id': self.pnode_id, 'params': self._params, 'months': self._months},
+                     file_name)
+
+    @classmethod
+    def read_pickle(cls, file_name: str) -> 'LmpStats':
+        data = pd.read_pickle(file_name)
+        lmp_stats = cls(iso=data['iso'], pnode_id=data['pnode_id'])
+        lmp_stats._params = data['params']
+        lmp_stats._months = data['months']
+        return lmp_stats
@@ -0,0 +1,313 @@
+import os
+import re
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from time import time
+from typing import Callable, Dict, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# increase when the parsing or the schemas change, so that the files already in a store are parsed again
+PARSER_VERSION = 2
+
+# typed schema of each kind of file in the store
+SCHEMAS = {
+    # hourly load, Hour = hour ending 1-25 (25 = DST fall back hour), Raw MW = value of the non-numeric loads as in the
+    # file (e.g. ' -   '), missing otherwise
+    'load': {'Zone': str, 'Type': str, 'Date': 'datetime64[ns]', 'Hour': 'int64', 'MW': 'float64', 'Raw MW': object},
+    # daily peak load allocations, Tag = PLC or NSPL
+    'tags': {'Zone': str, 'Type': str, 'Date': 'datetime64[ns]', 'Tag': str, 'MW': 'float64'},
+}
+
+# value columns of the schemas, the other columns identify the rows
+VALUE_COLUMNS = ['MW', 'Raw MW']
+
+# files of each kind, same filters as BGS.ipynb
+FILE_FILTERS = {
+    'load': lambda file_name: ('Load' in file_name) or ('Generation' in file_name),
+    'tags': lambda file_name: 'PLA' in file_name,
+}
+
+FILE_TYPES = {'.csv': 'csv', '.xlsx': 'excel', '.xlsb': 'excel', '.xls': 'excel'}
+
+
+class LoadStore:
+    """
+    Local Parquet store of the BGS load and tag files (e.g. PJM EDC hourly load), normalized to the typed schemas in
+    SCHEMAS. Each source file is parsed once into one Parquet file, partitioned by kind and zone
+    (<store_dir>/<kind>/<zone>/), and a JSON manifest records the modification time, size and SHA-256 of the source
+    files. Re-running "ingest" only parses the files that are new or whose content changed (or that were parsed by
+    another PARSER_VERSION), in parallel processes.
+
+    Usage:
+        load_store = LoadStore(store_dir=r'C:\\bgs_load_store')
+        load_store.ingest([os.path.join(monthly_data_folder_path, x, 'CIEP') for x in folder_names], kind='load')
+        df_load = load_store.read('load')
+    """
+
+    MANIFEST_FILE = 'manifest.json'
+
+    def __init__(self, store_dir: str):
+        """
+        Args:
+            store_dir: Directory containing the store (created if it does not exist)
+        """
+        self.store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+        self._manifest = self._read_manifest()
+
+    def ingest(self, folder_paths: List[str], kind: str = 'load', file_filter: Optional[Callable[[str], bool]] = None,
+               max_workers: int = 4) -> pd.DataFrame:
+        """
+        Parses the new and changed files of the given folders into the store, and removes the files deleted from them
+
+        Args:
+            folder_paths: Folders containing the files, e.g. the CIEP folders of BGS.ipynb
+            kind: 'load' or 'tags'
+            file_filter: Optional function of the file name selecting the files (defaults to FILE_FILTERS[kind])
+            max_workers: Number of processes parsing files in parallel
+
+        Returns: pd.DataFrame with a row per parsed file (empty if no file changed)
+            columns = ('File', 'Zone', 'Rows', 'Seconds', 'Error')
+        """
+        if kind not in SCHEMAS:
+            raise Exception(f'unsupported kind: {kind}')
+        file_filter = file_filter or FILE_FILTERS[kind]
+
+        file_paths = [
+            os.path.normpath(os.path.join(folder_path, file_name))
+            for folder_path in folder_paths for file_name in sorted(os.listdir(folder_path))
+            if file_filter(file_name) and os.path.splitext(file_name)[1].lower() in FILE_TYPES
+        ]
+
+        # files deleted from the folders
+        folders = {os.path.normpath(x) for x in folder_paths}
+        for file_path, entry in list(self._manifest.items()):
+            if entry['kind'] == kind and os.path.dirname(file_path) in folders and file_path not in file_paths:
+                print(f'removing deleted file {file_path}')
+                self._remove(file_path)
+
+        # unchanged files have the same modification time and size, or the same content (e.g. copied again)
+        changed = {}
+        for file_path in file_paths:
+            stat = os.stat(file_path)
+            entry = self._manifest.get(file_path)
+            is_current = entry is not None and entry['kind'] == kind and entry.get('version') == PARSER_VERSION
+            if is_current and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+                continue
+            sha256 = _hash_file(file_path)
+            if is_current and entry['sha256'] == sha256:
+                entry.update(mtime=stat.st_mtime, size=stat.st_size)
+                continue
+            changed[file_path] = {'kind': kind, 'mtime': stat.st_mtime, 'size': stat.st_size, 'sha256': sha256,
+                                  'version': PARSER_VERSION}
+        self._write_manifest()
+        print(f'{len(changed)} of {len(file_paths)} {kind} files new or changed')
+
+        report = []
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(_parse_file, file_path, kind): file_path for file_path in changed}
+            for future in as_completed(futures):
+                file_path = futures[future]
+                try:
+                    df, seconds = future.result()
+                except Exception as e:
+                    report.append({'File': file_path, 'Zone': None, 'Rows': 0, 'Seconds': np.nan, 'Error': repr(e)})
+                    continue
+
+                zones = df['Zone'].unique()
+                if len(zones) != 1:
+                    report.append({'File': file_path, 'Zone': None, 'Rows': len(df), 'Seconds': seconds,
+                                   'Error': f'expected one zone, found {list(zones)}'})
+                    continue
+
+                if file_path in self._manifest:
+                    self._remove(file_path)
+                self._write_part(file_path, df, changed[file_path])
+                report.append({'File': file_path, 'Zone': zones[0], 'Rows': len(df), 'Seconds': seconds,
+                               'Error': None})
+
+        report = pd.DataFrame(report, columns=['File', 'Zone', 'Rows', 'Seconds', 'Error'])
+        if report['Error'].notna().any():
+            print(f'{report["Error"].notna().sum()} files failed')
+        return report.sort_values('File', ignore_index=True)
+
+    def read(self, kind: str = 'load', zones: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Reads the parsed files of a kind
+
+        Args:
+            kind: 'load' or 'tags'
+            zones: Optional zones to read, e.g. ['ACE', 'PSEG'] (all zones if not given)
+
+        Returns: pd.DataFrame
+            columns = SCHEMAS[kind], sorted by all columns but VALUE_COLUMNS
+        """
+        schema = SCHEMAS[kind]
+        parts = [entry['part'] for entry in self._manifest.values()
+                 if entry['kind'] == kind and (zones is None or entry['zone'] in zones)]
+        df = pd.concat([_empty(schema)] + [pd.read_parquet(os.path.join(self.store_dir, x)) for x in sorted(parts)],
+                       ignore_index=True)
+        return df.astype(schema).sort_values([x for x in schema if x not in VALUE_COLUMNS], ignore_index=True)
+
+    def entries(self) -> pd.DataFrame:
+        # summary of the parsed files
+        columns = ['kind', 'zone', 'rows', 'size', 'mtime', 'part']
+        df = pd.DataFrame(list(self._manifest.values()), columns=columns + ['sha256'], index=list(self._manifest))
+        df['mtime'] = pd.to_datetime(df['mtime'], unit='s')
+        return df[columns].rename_axis('file').sort_index()
+
+    def _read_manifest(self) -> Dict[str, dict]:
+        file_name = os.path.join(self.store_dir, self.MANIFEST_FILE)
+        if not os.path.exists(file_name):
+            return {}
+        with open(file_name) as f:
+            return json.load(f)
+
+    def _write_manifest(self):
+        file_name = os.path.join(self.store_dir, self.MANIFEST_FILE)
+        with open(file_name + '.tmp', 'w') as f:
+            json.dump(self._manifest, f, indent=1)
+        os.replace(file_name + '.tmp', file_name)
+
+    def _write_part(self, file_path: str, df: pd.DataFrame, entry: dict):
+        # one Parquet file per source file, in the directory of its kind and zone
+        zone = df['Zone'].iloc[0]
+        part = os.path.join(entry['kind'], re.sub(r'[^\w.&-]', '_', zone),
+                            hashlib.sha1(file_path.encode()).hexdigest()[:16] + '.parquet')
+        os.makedirs(os.path.join(self.store_dir, os.path.dirname(part)), exist_ok=True)
+        df.to_parquet(os.path.join(self.store_dir, part), index=False)
+        self._manifest[file_path] = {**entry, 'zone': zone, 'rows': len(df), 'part': part}
+        self._write_manifest()
+
+    def _remove(self, file_path: str):
+        entry = self._manifest.pop(file_path)
+        part = os.path.join(self.store_dir, entry['part'])
+        if os.path.exists(part):
+            os.remove(part)
+        self._write_manifest()
+
+
+def _hash_file(file_path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _empty(schema: dict) -> pd.DataFrame:
+    return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in schema.items()})
+
+
+def _parse_file(file_path: str, kind: str) -> Tuple[pd.DataFrame, float]:
+    # runs in a worker process, returns the file normalized to SCHEMAS[kind] and the parse time in seconds
+    start = time()
+    file_name = os.path.basename(file_path)
+    file_type = FILE_TYPES[os.path.splitext(file_name)[1].lower()]
+    parse = {'load': _parse_load_file, 'tags': _parse_tag_file}[kind]
+    df = parse(file_path, file_type)
+    return df.astype(SCHEMAS[kind])[list(SCHEMAS[kind])], time() - start
+
+
+def _split_load_name(df: pd.DataFrame, load_name: str) -> pd.DataFrame:
+    # load names are <zone>_<type>, e.g. ACE_BGS or JCP&L_Excess_Generation_Eligible
+    zone, load_type = load_name.rsplit('_', 1)
+    return df.assign(Zone=zone, Type=load_type)
+
+
+def _read_dates(dates: pd.Series, file_name: str) -> pd.Series:
+    # pandas sometimes reads xlsb dates as Excel serial numbers
+    if 'xlsb' in file_name:
+        return pd.to_datetime('1899-12-30') + pd.to_timedelta(pd.to_numeric(dates, errors='coerce'), unit='D')
+    return pd.to_datetime(dates, errors='coerce')
+
+
+def _parse_load_file(file_path: str, file_type: str) -> pd.DataFrame:
+    """
+    Reads a load file into the 'load' schema, with the load name parsed from the file name as in "aggregate_load" in
+    BGS.ipynb. Non-numeric loads (e.g. ' -   ') are read as NaN, with their value as in the file in 'Raw MW'.
+    """
+    file_name = os.path.basename(file_path)
+    parts = file_name.split('_')
+
+    if file_type == 'csv':
+        if 'Generation' not in file_name:
+            if 'Eligible' not in file_name:
+                load_name = parts[1] + '_' + parts[2].split('-')[0]
+            else:
+                load_name = parts[1] + '_' + parts[2].split('-')[1]
+        else:  # JCP&L excess generation
+            if 'Eligible' not in file_name:
+                load_name = parts[1] + '_' + parts[5] + '_' + parts[6][:-4] + '_' + parts[2]
+            else:
+                load_name = parts[1] + '_' + parts[5] + '_' + parts[6][:-4] + '_' + parts[3]
+        df = pd.read_csv(file_path, skiprows=4)
+
+    else:
+        if 'Generation' not in file_name:
+            if 'Eligible' not in file_name:
+                load_name = parts[0] + '_' + parts[1].split('-')[0]
+            else:
+                load_name = parts[0] + '_' + parts[1].split('-')[1]
+        else:  # JCP&L excess generation
+            if 'Eligible' not in file_name:
+                load_name = parts[0] + '_' + parts[4] + '_' + parts[5] + '_' + parts[1]
+            else:
+                load_name = parts[0] + '_' + parts[3] + '_' + parts[4] + '_' + parts[1].split('-')[1]
+        # the excel files are shifted by a row compared to the csv files
+        df = pd.read_excel(file_path, engine='pyxlsb' if 'xlsb' in file_name else None, skiprows=5)
+
+    df = df.melt(id_vars='Unnamed: 0').rename(columns={'Unnamed: 0': 'Date', 'variable': 'Hour', 'value': 'MW'})
+    mw = pd.to_numeric(df['MW'], errors='coerce')
+    is_non_numeric = mw.isna() & df['MW'].notna()
+    df = df.assign(
+        Date=_read_dates(df['Date'], file_name) if file_type == 'excel' else pd.to_datetime(df['Date']),
+        Hour=df['Hour'].str[-2:].astype(int),
+        MW=mw,
+        **{'Raw MW': df['MW'].where(is_non_numeric).map(str, na_action='ignore').astype(object)},
+    )
+    return _split_load_name(df, load_name).sort_values(['Date', 'Hour'])
+
+
+def _parse_tag_file(file_path: str, file_type: str) -> pd.DataFrame:
+    """
+    Reads a peak load allocation file into the 'tags' schema, with the load name parsed from the file name as in
+    "aggregate_tags" in BGS.ipynb. Unparseable dates are read as NaT.
+    """
+    file_name = os.path.basename(file_path)
+    parts = file_name.split('_')
+
+    if file_type == 'csv':
+        if 'Generation' not in file_name:
+            if 'Eligible' not in file_name:
+                if 'Retail' not in file_name:
+                    load_name = parts[1] + '_' + parts[2].split('-')[0]
+                else:  # RSCP and TOTAL tags
+                    load_name = parts[1] + '_' + parts[3]
+            else:
+                load_name = parts[1] + '_' + parts[2].split('-')[1]
+        else:  # JCP&L excess generation
+            if 'Eligible' not in file_name:
+                load_name = parts[1] + '_' + parts[2] + '_' + parts[5] + '_' + parts[6][:-4]
+            else:
+                load_name = parts[1] + '_' + parts[3] + '_' + parts[5] + '_' + parts[6][:-4]
+        df = pd.read_csv(file_path, skiprows=4)
+
+    else:
+        if 'Eligible' not in file_name:
+            load_name = parts[0] + '_' + parts[1].split('-')[0]
+        else:
+            load_name = parts[0] + '_' + parts[1].split('-')[1]
+        df = pd.read_excel(file_path, engine='pyxlsb' if 'xlsb' in file_name else None, skiprows=5)
+
+    # some files have spaces in the column names
+    df = df.rename(columns={'Unnamed: 0': 'Date'}).rename(columns=lambda x: x.strip())
+    df = df.assign(Date=_read_dates(df['Date'], file_name)).rename(columns={
+        'Capacity Peak Load Allocation': 'PLC',
+        'Transmission Peak Load Allocation': 'NSPL'
+    })
+    df = df.melt(id_vars='Date', value_vars=[x for x in ['PLC', 'NSPL'] if x in df.columns], var_name='Tag',
+                 value_name='MW')
+    return _split_load_name(df.assign(MW=pd.to_numeric(df['MW'], errors='coerce')), load_name)
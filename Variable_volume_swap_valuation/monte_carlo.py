@@ -0,0 +1,205 @@
+import numpy as np
+from typing import Generator, NamedTuple, Optional, Tuple
+from scipy.stats import norm, qmc
+
+# project code
+from option_pricing import ArrayLike
+
+
+class PathStatistics(NamedTuple):
+    # payoff statistics of each simulated path, shape (n_paths,) or (n_paths, n_assets)
+    terminal: np.ndarray  # price at T
+    average: np.ndarray  # arithmetic average of the prices at steps 1 to n_steps (Asian options)
+    maximum: np.ndarray  # maximum of the prices at steps 0 to n_steps (lookback options)
+    minimum: np.ndarray  # minimum of the prices at steps 0 to n_steps (lookback options)
+
+
+class MonteCarloEstimate(NamedTuple):
+    value: float
+    std_error: float
+
+
+def iter_gbm_path_chunks(S_0: ArrayLike, mu: ArrayLike, sigma: ArrayLike, T: float, n_steps: int, n_paths: int,
+                         corr: Optional[np.ndarray] = None, seed: Optional[int] = None,
+                         steps_per_chunk: int = 100) -> Generator[Tuple[np.ndarray, np.ndarray], None, None]:
+    """
+    Simulates (correlated) geometric Brownian motion paths and yields them in chunks of time steps, so that the full path
+    matrix is never materialized. The log price increments are exact (no discretization error) and accumulated with
+    cumulative sums.
+
+    The normal draws are made in time-major order, so the paths are the same for any steps_per_chunk and the same as
+    "simulate_gbm_paths" with the same seed.
+
+    Args:
+        S_0: Initial price, scalar for one asset or array of n_assets
+        mu: Drift (e.g. the risk-free rate under the risk-neutral measure), scalar or array of n_assets
+        sigma: Volatility, scalar or array of n_assets
+        T: Time horizon in years
+        n_steps: Number of time steps
+        n_paths: Number of simulated paths
+        corr: Optional correlation matrix of the assets' Brownian motions (n_assets x n_assets)
+        seed: Optional seed of the random generator for reproducible paths
+        steps_per_chunk: Number of time steps per chunk
+
+    Returns: generator of (times, prices)
+        times: np.ndarray of the chunk's times in years, shape (n_chunk_steps,)
+        prices: np.ndarray of shape (n_paths, n_chunk_steps) for one asset or (n_paths, n_chunk_steps, n_assets). The
+            first chunk starts with S_0 at time 0.
+    """
+    assert n_steps > 0 and n_paths > 0 and steps_per_chunk > 0
+    is_single_asset = np.ndim(S_0) == 0
+    S_0, mu, sigma = np.broadcast_arrays(*[np.atleast_1d(np.asarray(x, dtype=float)) for x in (S_0, mu, sigma)])
+    n_assets = len(S_0)
+
+    # correlated draws are the independent draws times the Cholesky factor of the correlation matrix
+    cholesky = None
+    if corr is not None:
+        corr = np.asarray(corr, dtype=float)
+        assert corr.shape == (n_assets, n_assets)
+        cholesky = np.linalg.cholesky(corr)
+
+    rng = np.random.default_rng(seed)
+    dt = T / n_steps
+    drift = (mu - (sigma ** 2) / 2) * dt
+    diffusion = sigma * np.sqrt(dt)
+
+    def shape(prices: np.ndarray) -> np.ndarray:
+        # (steps, paths, assets) -> (paths, steps[, assets])
+        prices = np.moveaxis(prices, 0, 1)
+        return prices[..., 0] if is_single_asset else prices
+
+    log_prices = np.broadcast_to(np.log(S_0), (n_paths, n_assets))
+    yield np.zeros(1), shape(np.exp(log_prices)[None])
+
+    for first_step in range(1, n_steps + 1, steps_per_chunk):
+        steps = np.arange(first_step, min(first_step + steps_per_chunk, n_steps + 1))
+        z = rng.standard_normal((len(steps), n_paths, n_assets))
+        if cholesky is not None:
+            z = z @ cholesky.T
+        chunk = log_prices + np.cumsum(drift + diffusion * z, axis=0)
+        log_prices = chunk[-1]
+        yield steps * dt, shape(np.exp(chunk))
+
+
+def simulate_gbm_paths(S_0: ArrayLike, mu: ArrayLike, sigma: ArrayLike, T: float, n_steps: int, n_paths: int,
+                       corr: Optional[np.ndarray] = None, seed: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Simulates (correlated) geometric Brownian motion paths, see "iter_gbm_path_chunks"
+
+    Returns: (times, prices)
+        times: np.ndarray of shape (n_steps + 1,) in years, starting at 0
+        prices: np.ndarray of shape (n_paths, n_steps + 1) for one asset or (n_paths, n_steps + 1, n_assets)
+    """
+    chunks = list(iter_gbm_path_chunks(S_0=S_0, mu=mu, sigma=sigma, T=T, n_steps=n_steps, n_paths=n_paths, corr=corr,
+                                       seed=seed, steps_per_chunk=n_steps))
+    return np.concatenate([x[0] for x in chunks]), np.concatenate([x[1] for x in chunks], axis=1)
+
+
+def simulate_gbm_statistics(S_0: ArrayLike, mu: ArrayLike, sigma: ArrayLike, T: float, n_steps: int, n_paths: int,
+                            corr: Optional[np.ndarray] = None, seed: Optional[int] = None,
+                            steps_per_chunk: int = 100) -> PathStatistics:
+    """
+    Simulates (correlated) geometric Brownian motion paths chunk by chunk (see "iter_gbm_path_chunks") and accumulates
+    the terminal, average, maximum and minimum price of each path, with memory of O(n_paths x steps_per_chunk)
+
+    Returns: PathStatistics of arrays of shape (n_paths,) for one asset or (n_paths, n_assets)
+    """
+    total = maximum = minimum = terminal = None
+    for times, prices in iter_gbm_path_chunks(S_0=S_0, mu=mu, sigma=sigma, T=T, n_steps=n_steps, n_paths=n_paths,
+                                              corr=corr, seed=seed, steps_per_chunk=steps_per_chunk):
+        if total is None:
+            # time 0 only counts towards the maximum and minimum
+            total = np.zeros_like(prices[:, 0])
+            maximum = prices[:, 0].copy()
+            minimum = prices[:, 0].copy()
+            continue
+        total += prices.sum(axis=1)
+        np.maximum(maximum, prices.max(axis=1), out=maximum)
+        np.minimum(minimum, prices.min(axis=1), out=minimum)
+        terminal = prices[:, -1]
+
+    return PathStatistics(terminal=terminal, average=total / n_steps, maximum=maximum, minimum=minimum)
+
+
+def simulate_gbm_terminal(S_0: float, mu: float, sigma: float, T: float, n_paths: int, seed: Optional[int] = None,
+                          antithetic: bool = False, n_sobol_batches: Optional[int] = None) -> np.ndarray:
+    """
+    Simulates the terminal prices of geometric Brownian motion paths in one step (exact, as European payoffs only depend
+    on the terminal price), with optional variance reduction
+
+    Args:
+        S_0: Initial price
+        mu: Drift (e.g. the risk-free rate under the risk-neutral measure)
+        sigma: Volatility
+        T: Time horizon in years
+        n_paths: Number of simulated paths
+        seed: Optional seed of the random generator for reproducible prices
+        antithetic: If True, the second half of the paths uses the negated normal draws of the first half (path i is
+            paired with path i + n_paths / 2, see "monte_carlo_mean")
+        n_sobol_batches: If given, the paths are drawn from n_sobol_batches independently scrambled Sobol sequences of
+            n_paths / n_sobol_batches points each (preferably a power of 2), one batch after the other. The spread of
+            the batch means gives the standard error (see "monte_carlo_mean").
+
+    Returns: np.ndarray of shape (n_paths,)
+    """
+    assert n_paths > 0
+    assert not (antithetic and n_sobol_batches), 'antithetic variates and Sobol sequences cannot be combined'
+    rng = np.random.default_rng(seed)
+
+    if n_sobol_batches:
+        assert n_paths % n_sobol_batches == 0
+        batch_size = n_paths // n_sobol_batches
+        u = np.concatenate([qmc.Sobol(d=1, scramble=True, seed=rng).random(batch_size)[:, 0]
+                            for _ in range(n_sobol_batches)])
+        z = norm.ppf(u)
+    elif antithetic:
+        assert n_paths % 2 == 0
+        z = rng.standard_normal(n_paths // 2)
+        z = np.concatenate([z, -z])
+    else:
+        z = rng.standard_normal(n_paths)
+
+    return S_0 * np.exp((mu - (sigma ** 2) / 2) * T + sigma * np.sqrt(T) * z)
+
+
+def monte_carlo_mean(samples: np.ndarray, antithetic: bool = False, n_batches: Optional[int] = None,
+                     controls: Optional[np.ndarray] = None,
+                     control_means: Optional[ArrayLike] = None) -> MonteCarloEstimate:
+    """
+    Estimates the mean of Monte Carlo samples (e.g. path payoffs) and its standard error
+
+    Args:
+        samples: Samples of shape (n_paths,)
+        antithetic: If True, samples i and i + n_paths / 2 come from antithetic paths and are averaged into one
+            independent sample (see "simulate_gbm_terminal")
+        n_batches: If given, the samples are n_batches consecutive batches of independently randomized quasi-random
+            paths (see "simulate_gbm_terminal") and the standard error is the one of the batch means
+        controls: Optional control variates of shape (n_paths,) or (n_paths, n_controls), e.g. the terminal price
+            and vanilla call payoffs, whose means are known in closed form
+        control_means: Known means of the controls, e.g. from "option_pricing.black_scholes"
+
+    Returns: MonteCarloEstimate
+    """
+    assert not (antithetic and n_batches), 'antithetic variates and batches cannot be combined'
+    samples = np.asarray(samples, dtype=float)
+    n_paths = len(samples)
+    if controls is not None:
+        controls = np.asarray(controls, dtype=float).reshape(n_paths, -1)
+        control_means = np.broadcast_to(np.asarray(control_means, dtype=float), controls.shape[1:])
+
+    if antithetic:
+        assert n_paths % 2 == 0
+        samples = (samples[:n_paths // 2] + samples[n_paths // 2:]) / 2
+        if controls is not None:
+            controls = (controls[:n_paths // 2] + controls[n_paths // 2:]) / 2
+
+    if controls is not None:
+        # the regression coefficients of the samples on the controls minimize the variance of the adjusted samples
+        beta = np.linalg.lstsq(controls - controls.mean(axis=0), samples - samples.mean(), rcond=None)[0]
+        samples = samples - (controls - control_means) @ beta
+
+    if n_batches:
+        assert n_paths % n_batches == 0
+        samples = samples.reshape(n_batches, -1).mean(axis=1)
+
+    return MonteCarloEstimate(value=samples.mean(), std_error=samples.std(ddof=1) / np.sqrt(len(samples)))
@@ -0,0 +1,129 @@
+import numpy as np
+from typing import NamedTuple, Union
+from scipy.stats import norm
+
+# scalars or NumPy arrays that broadcast against each other, e.g. forwards by (contract month, peak block) and a strike
+ArrayLike = Union[float, np.ndarray]
+
+
+class OptionGreeks(NamedTuple):
+    # option price and Greeks, each with the broadcast shape of the inputs
+    price: np.ndarray
+    delta: np.ndarray
+    gamma: np.ndarray
+    theta: np.ndarray
+    vega: np.ndarray
+    rho: np.ndarray
+
+
+def black_scholes(s_0: ArrayLike, k: ArrayLike, T: ArrayLike, r: ArrayLike, sigma: ArrayLike,
+                  div_yield: ArrayLike = 0, div: ArrayLike = 0, call: ArrayLike = True) -> OptionGreeks:
+    """
+    Computes Black-Scholes prices and Greeks of European options in one pass over arrays of contracts, sharing d1, d2
+    and the normal cdf / pdf between the price and the Greeks (same conventions as "euro_option_price", "delta",
+    "gamma", "theta", "vega" and "rho" in Options_valuation.ipynb)
+
+    Args:
+        s_0: Price of the underlying
+        k: Strike price
+        T: Time to maturity in years
+        r: Continuously compounded interest rate
+        sigma: Volatility of the underlying
+        div_yield: Continuously compounded dividend yield
+        div: Present value of dividends
+        call: True for calls, False for puts (can be an array to mix calls and puts)
+
+    Returns: OptionGreeks of arrays with the broadcast shape of the inputs
+    """
+    s_0, k, T, r, sigma, div_yield, div, call = np.broadcast_arrays(
+        *[np.asarray(x, dtype=float) for x in (s_0, k, T, r, sigma, div_yield, div)], np.asarray(call, dtype=bool))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sqrt_T = np.sqrt(T)
+        sigma_sqrt_T = sigma * sqrt_T
+        d1 = (np.log((s_0 - div) / k) + (r - div_yield + (sigma ** 2) / 2) * T) / sigma_sqrt_T
+        d2 = d1 - sigma_sqrt_T
+
+        cdf_d1 = norm.cdf(d1)
+        cdf_d2 = norm.cdf(d2)
+        pdf_d1 = norm.pdf(d1)
+        df_r = np.exp(-r * T)
+        df_q = np.exp(-div_yield * T)
+        s_fwd = s_0 * df_q - div
+
+        # puts use N(-d) = 1 - N(d)
+        sign = np.where(call, 1., -1.)
+        cdf_d1_signed = np.where(call, cdf_d1, 1 - cdf_d1)
+        cdf_d2_signed = np.where(call, cdf_d2, 1 - cdf_d2)
+
+        price = sign * (s_fwd * cdf_d1_signed - k * df_r * cdf_d2_signed)
+        delta = np.where(call, cdf_d1, cdf_d1 - 1) * df_q
+        gamma = pdf_d1 * df_q / (s_0 * sigma_sqrt_T)
+        theta = (-(s_0 - div) * pdf_d1 * sigma * df_q / (2 * sqrt_T)
+                 - sign * (r * k * df_r * cdf_d2_signed - div_yield * s_0 * cdf_d1_signed * df_q))
+        vega = s_0 * sqrt_T * pdf_d1 * df_q
+        rho = sign * k * T * df_r * cdf_d2_signed
+
+    return OptionGreeks(price=price, delta=delta, gamma=gamma, theta=theta, vega=vega, rho=rho)
+
+
+def black_76(f_0: ArrayLike, k: ArrayLike, T: ArrayLike, r: ArrayLike, sigma: ArrayLike,
+             call: ArrayLike = True) -> OptionGreeks:
+    """
+    Computes Black-76 prices and Greeks of European options on forwards / futures in one pass over arrays of contracts
+    (same price as "euro_futures_option_price" in Options_valuation.ipynb), e.g. all contract months and peak blocks of
+    a deal at once
+
+    Args:
+        f_0: Forward price
+        k: Strike price
+        T: Time to maturity in years
+        r: Continuously compounded interest rate used for discounting
+        sigma: Volatility of the forward
+        call: True for calls, False for puts (can be an array to mix calls and puts)
+
+    Returns: OptionGreeks of arrays with the broadcast shape of the inputs, with delta and gamma with respect to f_0
+    """
+    f_0, k, T, r, sigma, call = np.broadcast_arrays(
+        *[np.asarray(x, dtype=float) for x in (f_0, k, T, r, sigma)], np.asarray(call, dtype=bool))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sqrt_T = np.sqrt(T)
+        sigma_sqrt_T = sigma * sqrt_T
+        d1 = (np.log(f_0 / k) + (sigma ** 2) * T / 2) / sigma_sqrt_T
+        d2 = d1 - sigma_sqrt_T
+
+        cdf_d1 = norm.cdf(d1)
+        cdf_d2 = norm.cdf(d2)
+        pdf_d1 = norm.pdf(d1)
+        df_r = np.exp(-r * T)
+
+        sign = np.where(call, 1., -1.)
+        cdf_d1_signed = np.where(call, cdf_d1, 1 - cdf_d1)
+        cdf_d2_signed = np.where(call, cdf_d2, 1 - cdf_d2)
+
+        price = sign * df_r * (f_0 * cdf_d1_signed - k * cdf_d2_signed)
+        delta = df_r * np.where(call, cdf_d1, cdf_d1 - 1)
+        gamma = df_r * pdf_d1 / (f_0 * sigma_sqrt_T)
+        theta = -df_r * f_0 * pdf_d1 * sigma / (2 * sqrt_T) + r * price
+        vega = df_r * f_0 * pdf_d1 * sqrt_T
+        rho = -T * price
+
+    return OptionGreeks(price=price, delta=delta, gamma=gamma, theta=theta, vega=vega, rho=rho)
+
+
+def variable_volume_dollars(s_0: ArrayLike, k: ArrayLike, T: ArrayLike, r: ArrayLike, sigma: ArrayLike) -> np.ndarray:
+    """
+    Expected payoff of a contract that pays s_T * max(s_T - k, 0), used to price variable volume products (the
+    Black-Scholes call price with s_0 replaced by s_0 * exp((r + sigma ** 2) * T), see Options_valuation.ipynb)
+
+    Returns: np.ndarray with the broadcast shape of the inputs
+    """
+    s_0, k, T, r, sigma = np.broadcast_arrays(*[np.asarray(x, dtype=float) for x in (s_0, k, T, r, sigma)])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sigma_sqrt_T = sigma * np.sqrt(T)
+        d1 = (np.log(s_0 / k) + (r + (sigma ** 2) / 2) * T) / sigma_sqrt_T
+        d3 = d1 + sigma_sqrt_T
+
+        return ((s_0 ** 2) * np.exp((r + sigma ** 2) * T) * norm.cdf(d3)) - (k * s_0 * norm.cdf(d1))
@@ -0,0 +1,152 @@
+import numpy as np
+import pandas as pd
+from typing import Optional
+from scipy.stats import norm
+
+# project code
+from variable_volume_swap import value_variable_volume_swaps
+
+POSITION_COLUMNS = ['Risk Factor', 'Forward', 'Vol', 'T', 'N_L', 'N_H', 'K_L', 'K_H', 'Strike']
+
+
+def calc_forward_log_returns(df_prices: pd.DataFrame, horizon_days: int = 1) -> pd.DataFrame:
+    """
+    Calculates log returns of forward contracts over horizon_days trade dates (overlapping), with missing prices treated
+    as no change
+
+    Args:
+        df_prices: Forward prices, e.g. the first element returned by "pvm.get_forward_monthly_pvm", columns = Risk
+            factors (ISO_NAME, BASIS_POINT, CONTRACT_MONTH), index = Trade dates
+        horizon_days: Number of trade dates of each return
+
+    Returns: pd.DataFrame
+        columns = Risk factors
+        index = Last trade date of each return
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = np.log(df_prices).diff().iloc[1:]
+    return returns.fillna(0).rolling(horizon_days).sum().iloc[horizon_days - 1:]
+
+
+def calc_correlation(df_returns: pd.DataFrame) -> pd.DataFrame:
+    """
+    Calculates the correlation matrix of returns over the pairwise available trade dates, repaired to the nearest
+    positive semi-definite correlation matrix (pairwise correlations of contracts with different histories need not
+    be consistent)
+
+    Args:
+        df_returns: Returns with NaN for missing prices, columns = Risk factors, index = Trade dates
+
+    Returns: pd.DataFrame
+        columns, index = Risk factors
+    """
+    corr = df_returns.corr(min_periods=2).fillna(0).to_numpy(copy=True)
+    np.fill_diagonal(corr, 1)
+
+    # clip the negative eigenvalues and rescale to a unit diagonal
+    eigenvalues, eigenvectors = np.linalg.eigh(corr)
+    corr = (eigenvectors * np.maximum(eigenvalues, 0)) @ eigenvectors.T
+    scale = np.sqrt(np.diag(corr))
+    corr = corr / np.outer(scale, scale)
+
+    return pd.DataFrame(corr, index=df_returns.columns, columns=df_returns.columns)
+
+
+def revalue_positions(positions: pd.DataFrame, shocks: np.ndarray) -> np.ndarray:
+    """
+    Fully revalues variable volume swap positions under log return shocks of their forwards, all scenarios and
+    positions at once (see "variable_volume_swap.value_variable_volume_swaps"). Time decay is ignored.
+
+    Args:
+        positions: Positions with columns POSITION_COLUMNS and optional 'Discount Factor' and 'Quantity' (e.g. -1 for
+            a sold swap), one row per bucket
+        shocks: Log returns of the positions' forwards, shape (n_scenarios, n_positions)
+
+    Returns: np.ndarray of the portfolio P&L of each scenario, shape (n_scenarios,)
+    """
+    def value(fwd: np.ndarray) -> np.ndarray:
+        return value_variable_volume_swaps(
+            fwd=fwd, sigma=positions['Vol'].to_numpy(dtype=float), T=positions['T'].to_numpy(dtype=float),
+            N_L=positions['N_L'].to_numpy(dtype=float), N_H=positions['N_H'].to_numpy(dtype=float),
+            K_L=positions['K_L'].to_numpy(dtype=float), K_H=positions['K_H'].to_numpy(dtype=float),
+            K=positions['Strike'].to_numpy(dtype=float), discount_factor=discount_factor
+        ).expected_payoff
+
+    discount_factor = positions.get('Discount Factor', pd.Series(1., index=positions.index)).to_numpy(dtype=float)
+    quantity = positions.get('Quantity', pd.Series(1., index=positions.index)).to_numpy(dtype=float)
+    fwd = positions['Forward'].to_numpy(dtype=float)
+
+    return ((value(fwd * np.exp(shocks)) - value(fwd)) * quantity).sum(axis=1)
+
+
+def calc_portfolio_var(positions: pd.DataFrame, df_prices: pd.DataFrame, confidence: float = 0.99,
+                       horizon_days: int = 1, n_scenarios: int = 100_000, chunk_size: int = 250_000,
+                       seed: Optional[int] = None) -> pd.DataFrame:
+    """
+    Calculates the VaR and expected shortfall of a portfolio of variable volume swap positions with full revaluation:
+        Historical: the historical forward returns over the horizon, applied to today's forwards
+        Monte Carlo: correlated normal log returns with the historical vols and correlation matrix, generated and
+            revalued in chunks so that memory is O(chunk_size + n_scenarios)
+        Cornish-Fisher: the first three moments of the Monte Carlo P&L, as in the VaR section of Options_valuation.ipynb
+
+    Args:
+        positions: Positions, see "revalue_positions". Their risk factors are columns of df_prices, e.g.
+            ('PJM', 'PJM-ON', '202501').
+        df_prices: Forward price history, e.g. the first element returned by "pvm.get_forward_monthly_pvm"
+        confidence: Confidence level, e.g. 0.99
+        horizon_days: Horizon in trade dates
+        n_scenarios: Number of Monte Carlo scenarios
+        chunk_size: Number of (scenario, position) values revalued at a time
+        seed: Optional seed of the random generator for reproducible scenarios
+
+    Returns: pd.DataFrame
+        columns = ('VaR', 'ES', 'Scenarios'), VaR and ES as positive losses
+        index = ('Historical', 'Monte Carlo', 'Cornish-Fisher')
+    """
+    missing = [x for x in POSITION_COLUMNS if x not in positions.columns]
+    if missing:
+        raise Exception(f'missing position columns: {missing}')
+
+    # risk factors of the positions, each position's shock is the shock of its risk factor
+    risk_factors = pd.Index(positions['Risk Factor']).unique()
+    missing = [x for x in risk_factors if x not in df_prices.columns]
+    if missing:
+        raise Exception(f'missing forward price history: {missing}')
+    factor_idx = risk_factors.get_indexer(positions['Risk Factor'])
+    df_prices = df_prices[risk_factors]
+
+    def var_es(pnl: np.ndarray) -> dict:
+        var = -np.quantile(pnl, 1 - confidence)
+        return {'VaR': var, 'ES': -pnl[pnl <= -var].mean(), 'Scenarios': len(pnl)}
+
+    data = {}
+    chunk_scenarios = max(1, chunk_size // len(positions))
+    historical_returns = calc_forward_log_returns(df_prices, horizon_days=horizon_days).to_numpy()
+    pnl = np.concatenate([revalue_positions(positions, historical_returns[start:start + chunk_scenarios, factor_idx])
+                          for start in range(0, len(historical_returns), chunk_scenarios)])
+    data['Historical'] = var_es(pnl)
+
+    # horizon covariance from the daily vols (skipping missing prices) and the pairwise correlations
+    with np.errstate(divide='ignore', invalid='ignore'):
+        df_daily_returns = np.log(df_prices).diff().iloc[1:]
+    vol = np.nan_to_num(df_daily_returns.std().to_numpy()) * np.sqrt(horizon_days)
+    corr = calc_correlation(df_daily_returns).to_numpy()
+    eigenvalues, eigenvectors = np.linalg.eigh(corr * np.outer(vol, vol))
+    cov_root = eigenvectors * np.sqrt(np.maximum(eigenvalues, 0))
+
+    rng = np.random.default_rng(seed)
+    pnl = np.empty(n_scenarios)
+    for start in range(0, n_scenarios, chunk_scenarios):
+        end = min(start + chunk_scenarios, n_scenarios)
+        shocks = rng.standard_normal((end - start, len(risk_factors))) @ cov_root.T
+        pnl[start:end] = revalue_positions(positions, shocks[:, factor_idx])
+    data['Monte Carlo'] = var_es(pnl)
+
+    # Cornish-Fisher expansion using three moments
+    mean, std_dev = pnl.mean(), pnl.std()
+    skewness = ((pnl - mean) ** 3).mean() / std_dev ** 3
+    z_q = norm.ppf(1 - confidence)
+    w_q = z_q + (1 / 6) * (z_q ** 2 - 1) * skewness
+    data['Cornish-Fisher'] = {'VaR': -(mean + w_q * std_dev), 'ES': np.nan, 'Scenarios': n_scenarios}
+
+    return pd.DataFrame(data).T.astype({'Scenarios': int})
@@ -1,10 +1,14 @@
 import pandas as pd
 import numpy as np
-from typing import Dict, Optional, Tuple
+from functools import partial
+from typing import Dict, List, Optional, Tuple, Union
 
 # project code
-from util import EmtdbConnection, date_hour_to_peak_block, list_peak_blocks, get_price_peak_map, spring_dst, fall_dst, hourly_index, convert_lmps_tz
-from emtdb_api import pull_lmp_data, pull_fwd_market_price
+from util import EmtdbConnection, list_peak_blocks, get_price_peak_map, spring_dst, fall_dst, hourly_index, run_calls
+from emtdb_api import pull_fwd_market_price_many
+from lmp_cache import LmpCache
+from fwd_price_cache import FwdPriceCache
+from lmp_prep import pull_lmps, pull_and_prepare_lmps
 
 SUPPORTED_ISO_PNODES = {
     'SPP': 'SPPNORTH_HUB', 'ERCOT': 'HB_NORTH', 'MISO': 'INDIANA.HUB', 'ISONE': '4000', 'PJM': '51288'
@@ -21,7 +25,8 @@ ISO_TO_FWD_MARKET_PRICE_BACKBONE = {
 }
 
 def _get_cash_vol(emtdb: EmtdbConnection, iso: str, pnode_id: str, start_dt: str, end_dt: str,
-                  zero_mean: bool) -> Optional[pd.DataFrame]:
+                  zero_mean: bool, lmp_cache: Optional[LmpCache] = None,
+                  df_lmp: Optional[pd.DataFrame] = None) -> Optional[pd.DataFrame]:
     """
     Computes realized cash volatility for day-ahead LMPs, assuming an annual basis of 360 days
 
@@ -32,53 +37,155 @@ def _get_cash_vol(emtdb: EmtdbConnection, iso: str, pnode_id: str, start_dt: str
         start_dt: Start date, e.g. '2023-10-01'
         end_dt: End date, e.g. '2024-06-30'
         zero_mean: Flag for the assumption E[log LMP returns]=0
+        lmp_cache: Optional local LMP cache, see lmp_cache.LmpCache
+        df_lmp: Optional LMPs already pulled with "lmp_prep.pull_lmps", in which case nothing is pulled from EMTDB
 
     Returns: pd.DataFrame
         columns = Peak blocks
         rows = Month end dates over the time period
     """
 
-    if iso == 'MISO':
-        # convert MISO LMPs from EST to EPT
-        df_lmp = convert_lmps_tz(
-        emtdb=emtdb,
-        pnode_id=pnode_id,
-        df_lmp = pull_lmp_data(
-        emtdb=emtdb,
-        pnode_id=pnode_id,
-        da_or_rt='DA',
-        start_dt=start_dt,
-        end_dt=end_dt
-    ).reset_index(),
-    convert_from='EST',
-    convert_to='EPT'
-    ).set_index(['Date', 'Hour'])
-    else:
-        df_lmp = pull_lmp_data(emtdb=emtdb, pnode_id=pnode_id, da_or_rt='DA', start_dt=start_dt, end_dt=end_dt)
+    # pull DA LMPs, convert MISO LMPs from EST to EPT and classify peak blocks
+    df_lmp = pull_and_prepare_lmps(emtdb=emtdb, iso=iso, pnode_ids=[pnode_id], start_dt=start_dt, end_dt=end_dt,
+                                   lmp_cache=lmp_cache, df_lmp=df_lmp)
 
     if len(df_lmp) == 0:
         print(f'missing LMPs: {pnode_id}')
         return
 
-    df_lmp['Peak Block'] = df_lmp.index.map(lambda x: date_hour_to_peak_block(date=x[0], hour=x[1], iso=iso))
-    df_lmp = df_lmp.groupby(['Date', 'Peak Block'])['Price'].mean().unstack()
+    df_daily_prices = df_lmp.groupby(['Date', 'Peak Block'], observed=True)['Price'].mean().unstack()
+    return calc_cash_vol(df_daily_prices=df_daily_prices, iso=iso, start_dt=start_dt, end_dt=end_dt, zero_mean=zero_mean)
+
+def calc_cash_vol(df_daily_prices: pd.DataFrame, iso: str, start_dt: str, end_dt: str,
+                  zero_mean: bool) -> pd.DataFrame:
+    """
+    Computes realized cash volatility from daily average prices, assuming an annual basis of 360 days
+
+    Args:
+        df_daily_prices: Daily average price of each peak block, columns = Peak blocks, index = Dates
+        iso: ISO, e.g. 'ISONE'
+        start_dt: Start date, e.g. '2023-10-01'
+        end_dt: End date, e.g. '2024-06-30'
+        zero_mean: Flag for the assumption E[log LMP returns]=0
+
+    Returns: pd.DataFrame
+        columns = Peak blocks
+        rows = Month end dates over the time period
+    """
+    peak_blocks = list_peak_blocks(iso=iso)
+    month_ends = pd.date_range(start_dt, end_dt, freq='ME') # Only cash vols for complete months are calculated
+    daily_prices = df_daily_prices.reindex(columns=peak_blocks).to_numpy(dtype=float)[:, :, np.newaxis]
 
-    df_cash_vol = pd.DataFrame(columns=list_peak_blocks(iso=iso), index=pd.date_range(start_dt, end_dt, freq='ME')) # Only cash vols for complete months are calculated
+    cash_vols = calc_cash_vol_array(daily_prices=daily_prices, dates=pd.DatetimeIndex(df_daily_prices.index),
+                                    month_ends=month_ends, zero_mean=zero_mean)
 
-    for peak_block in list_peak_blocks(iso=iso):
-        daily_prices = df_lmp[peak_block].dropna() # Dropping NaNs can lead to significantly different results
-        dt = (daily_prices.index[1:] - daily_prices.index[:-1]).days / 360  # annualized
-        daily_returns = np.log(daily_prices).diff().iloc[1:] / np.sqrt(dt)
+    return pd.DataFrame(cash_vols[:, :, 0], columns=peak_blocks, index=month_ends)
+
+def calc_cash_vol_array(daily_prices: np.ndarray, dates: pd.DatetimeIndex, month_ends: pd.DatetimeIndex,
+                        zero_mean: bool) -> np.ndarray:
+    """
+    Computes realized monthly cash volatilities of many peak blocks and nodes at once, assuming an annual basis of 360
+    days. For each peak block and node, days without a price are dropped, so that a return spans the days since the
+    previous price.
+
+    Args:
+        daily_prices: Daily average prices of shape (days, peak blocks, nodes), NaN on days without prices
+        dates: Sorted dates of the days
+        month_ends: Month end dates of the vols
+        zero_mean: Flag for the assumption E[log LMP returns]=0
+
+    Returns: np.ndarray of shape (months, peak blocks, nodes)
+    """
+    n_days = daily_prices.shape[0]
+    day_idx = np.arange(n_days).reshape((n_days,) + (1,) * (daily_prices.ndim - 1))
+    has_price = ~np.isnan(daily_prices)
+
+    # index of the previous day with a price, -1 before the first price
+    last_price_idx = np.maximum.accumulate(np.where(has_price, day_idx, -1), axis=0)
+    prev_idx = np.concatenate([np.full((1,) + daily_prices.shape[1:], -1), last_price_idx[:-1]], axis=0)
+    has_return = has_price & (prev_idx >= 0)
+    prev_idx = np.maximum(prev_idx, 0)
+
+    day_number = np.asarray((dates - dates[0]).days) if n_days > 0 else np.zeros(0, dtype=int)
+    dt = (day_number.reshape(day_idx.shape) - day_number[prev_idx]) / 360  # annualized
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_prices = np.log(daily_prices)
+        daily_returns = (log_prices - np.take_along_axis(log_prices, prev_idx, axis=0)) / np.sqrt(dt)
+    daily_returns = np.where(has_return, daily_returns, np.nan)
+
+    # accumulate the returns of each month (NaN returns, e.g. from negative prices, are skipped)
+    month_idx = pd.DatetimeIndex(month_ends).get_indexer(pd.DatetimeIndex(dates) + pd.offsets.MonthEnd(0))
+    in_months = month_idx >= 0
+    month_idx = month_idx[in_months]
+    daily_returns = daily_returns[in_months]
+    is_return = ~np.isnan(daily_returns)
+
+    shape = (len(month_ends),) + daily_prices.shape[1:]
+    n_returns = np.zeros(shape)
+    np.add.at(n_returns, month_idx, is_return)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
         if zero_mean:
-            monthly_vols = np.sqrt((daily_returns ** 2).groupby(pd.Grouper(freq='ME')).mean())
-        else:
-            monthly_vols = daily_returns.groupby(pd.Grouper(freq='ME')).std()
-        df_cash_vol[peak_block] = monthly_vols
+            sum_squares = np.zeros(shape)
+            np.add.at(sum_squares, month_idx, np.where(is_return, daily_returns ** 2, 0))
+            return np.sqrt(sum_squares / n_returns)
+
+        sums = np.zeros(shape)
+        np.add.at(sums, month_idx, np.where(is_return, daily_returns, 0))
+        means = sums / n_returns
+        sum_squares = np.zeros(shape)
+        np.add.at(sum_squares, month_idx, np.where(is_return, (daily_returns - means[month_idx]) ** 2, 0))
+        return np.where(n_returns > 1, np.sqrt(sum_squares / (n_returns - 1)), np.nan)
+
+def get_cash_vols(emtdb: EmtdbConnection, iso: str, pnode_ids: List[str], start_dt: str, end_dt: str,
+                  zero_mean: bool, lmp_cache: Optional[LmpCache] = None,
+                  df_lmp: Optional[pd.DataFrame] = None) -> Dict[str, pd.DataFrame]:
+    """
+    Computes realized cash volatility for day-ahead LMPs of many nodes of an ISO at once (see "_get_cash_vol")
+
+    Args:
+        emtdb: EMTDB connection
+        iso: ISO, e.g. 'ISONE'
+        pnode_ids: Pricing node IDs, e.g. ['4000', '4001']
+        start_dt: Start date, e.g. '2023-10-01'
+        end_dt: End date, e.g. '2024-06-30'
+        zero_mean: Flag for the assumption E[log LMP returns]=0
+        lmp_cache: Optional local LMP cache, see lmp_cache.LmpCache
+        df_lmp: Optional LMPs already pulled with "lmp_prep.pull_lmps", in which case nothing is pulled from EMTDB
 
-    return df_cash_vol
+    Returns: dictionary of pnode ID (with LMPs) to pd.DataFrame
+        columns = Peak blocks
+        rows = Month end dates over the time period
+    """
+    df_lmp = pull_and_prepare_lmps(emtdb=emtdb, iso=iso, pnode_ids=pnode_ids, start_dt=start_dt, end_dt=end_dt,
+                                   lmp_cache=lmp_cache, df_lmp=df_lmp)
+    pulled = set(df_lmp['Pnode ID'])
+    for pnode_id in dict.fromkeys(str(x) for x in pnode_ids):
+        if pnode_id not in pulled:
+            print(f'missing LMPs: {pnode_id}')
+    pnode_ids = [x for x in dict.fromkeys(str(x) for x in pnode_ids) if x in pulled]
+
+    # (days x peak blocks x nodes) daily average prices
+    peak_blocks = list_peak_blocks(iso=iso)
+    df_daily_prices = df_lmp.groupby(['Date', 'Peak Block', 'Pnode ID'], observed=True)['Price'].mean().unstack(
+        ['Peak Block', 'Pnode ID'])
+    df_daily_prices = df_daily_prices.reindex(columns=pd.MultiIndex.from_product([peak_blocks, pnode_ids]))
+    daily_prices = df_daily_prices.to_numpy(dtype=float).reshape(len(df_daily_prices), len(peak_blocks), len(pnode_ids))
+
+    month_ends = pd.date_range(start_dt, end_dt, freq='ME')
+    cash_vols = calc_cash_vol_array(daily_prices=daily_prices, dates=pd.DatetimeIndex(df_daily_prices.index),
+                                    month_ends=month_ends, zero_mean=zero_mean)
+
+    return {
+        pnode_id: pd.DataFrame(cash_vols[:, :, i], columns=peak_blocks, index=month_ends)
+        for i, pnode_id in enumerate(pnode_ids)
+    }
 
 def get_cash_pvm(emtdb: EmtdbConnection, iso: str, pnode_id: str, start_dt: str, end_dt: str, zero_mean: bool,
-                 q_upper: float) -> Optional[Dict[str, pd.DataFrame]]:
+                 q_upper: float, lmp_cache: Optional[LmpCache] = None,
+                 lmp_data: Optional[Dict[str, pd.DataFrame]] = None,
+                 hub_cash_vols: Optional[Dict[tuple, pd.DataFrame]] = None) -> Optional[Dict[str, pd.DataFrame]]:
     """
     Computes cash PVMs for a given pnode
 
@@ -90,6 +197,10 @@ def get_cash_pvm(emtdb: EmtdbConnection, iso: str, pnode_id: str, start_dt: str,
         end_dt: End date, e.g. '2024-06-30'
         zero_mean: Flag for the assumption E[LMP returns]=0
         q_upper: Upper quantile of PVMs to clip (between 0 and 1, methodology default = 1)
+        lmp_cache: Optional local LMP cache, see lmp_cache.LmpCache
+        lmp_data: Optional dictionary of pnode ID to LMPs already pulled with "lmp_prep.pull_lmps". Nodes missing from
+            it are pulled individually.
+        hub_cash_vols: Optional memo of hub cash vols shared between calls, see "get_hub_cash_vol"
 
     Returns: dictionary of "Node" or "Hub" to pd.DataFrame
         columns = Peak blocks
@@ -99,14 +210,69 @@ def get_cash_pvm(emtdb: EmtdbConnection, iso: str, pnode_id: str, start_dt: str,
     if iso not in SUPPORTED_ISO_PNODES.keys():
         print(f'unsupported ISO: {iso}')
         return
+    lmp_data = lmp_data if lmp_data is not None else {}
 
     # calculate cash vol for each historical month
-    node_cash_vol = _get_cash_vol(emtdb, iso, pnode_id, start_dt, end_dt, zero_mean)
+    node_cash_vol = _get_cash_vol(emtdb, iso, pnode_id, start_dt, end_dt, zero_mean, lmp_cache,
+                                  lmp_data.get(str(pnode_id)))
     if node_cash_vol is None:
         return None
 
+    hub_cash_vol = get_hub_cash_vol(emtdb, iso, start_dt, end_dt, zero_mean, lmp_cache, lmp_data, hub_cash_vols)
+
+    return calc_cash_pvm(node_cash_vol=node_cash_vol, hub_cash_vol=hub_cash_vol, q_upper=q_upper)
+
+def get_hub_cash_vol(emtdb: EmtdbConnection, iso: str, start_dt: str, end_dt: str, zero_mean: bool,
+                     lmp_cache: Optional[LmpCache] = None, lmp_data: Optional[Dict[str, pd.DataFrame]] = None,
+                     hub_cash_vols: Optional[Dict[tuple, pd.DataFrame]] = None) -> pd.DataFrame:
+    """
+    Computes the cash vol of an ISO's hub (see "_get_cash_vol"), once per memo
+
+    Args:
+        emtdb: EMTDB connection
+        iso: ISO, e.g. 'ISONE'
+        start_dt: Start date, e.g. '2023-10-01'
+        end_dt: End date, e.g. '2024-06-30'
+        zero_mean: Flag for the assumption E[LMP returns]=0
+        lmp_cache: Optional local LMP cache, see lmp_cache.LmpCache
+        lmp_data: Optional dictionary of pnode ID to LMPs already pulled with "lmp_prep.pull_lmps"
+        hub_cash_vols: Optional memo of hub cash vols keyed by (hub pnode ID, start date, end date, zero_mean), e.g. an
+            empty dictionary shared by the calls of one run. The hub cash vol is computed if missing and stored in it.
+
+    Raises an exception if the hub has no LMPs over the time period (nothing is stored in the memo).
+
+    Returns: pd.DataFrame
+        columns = Peak blocks
+        rows = Month end dates over the time period
+    """
     hub_pnode_id = SUPPORTED_ISO_PNODES[iso]
-    hub_cash_vol = _get_cash_vol(emtdb, iso, hub_pnode_id, start_dt, end_dt, zero_mean)
+    key = (hub_pnode_id, pd.to_datetime(start_dt), pd.to_datetime(end_dt), bool(zero_mean))
+    if hub_cash_vols is not None and key in hub_cash_vols:
+        return hub_cash_vols[key]
+
+    lmp_data = lmp_data if lmp_data is not None else {}
+    hub_cash_vol = _get_cash_vol(emtdb, iso, hub_pnode_id, start_dt, end_dt, zero_mean, lmp_cache,
+                                 lmp_data.get(hub_pnode_id))
+    if hub_cash_vol is None:
+        raise Exception(f'missing hub LMPs: {hub_pnode_id}')
+    if hub_cash_vols is not None:
+        hub_cash_vols[key] = hub_cash_vol
+    return hub_cash_vol
+
+def calc_cash_pvm(node_cash_vol: pd.DataFrame, hub_cash_vol: pd.DataFrame, q_upper: float) -> Dict[str, pd.DataFrame]:
+    """
+    Computes cash PVMs from the monthly cash vols of a node and its hub
+
+    Args:
+        node_cash_vol: Node cash vols, columns = Peak blocks, rows = Month end dates
+        hub_cash_vol: Hub cash vols, columns = Peak blocks, rows = Month end dates
+        q_upper: Upper quantile of PVMs to clip (between 0 and 1, methodology default = 1)
+
+    Returns: dictionary of "Node" or "Hub" to pd.DataFrame
+        columns = Peak blocks
+        rows = Months 1-12 and "Avg"
+    """
+    assert 0 < q_upper <= 1
 
     # calculate price vol multiplier for each historical month
     node_pvm = node_cash_vol.div(hub_cash_vol, axis=0)  # nodal pvm = node cash vol / hub cash vol
@@ -127,42 +293,111 @@ def get_cash_pvm(emtdb: EmtdbConnection, iso: str, pnode_id: str, start_dt: str,
     return {'Node': node_pvm_averages, 'Hub': hub_pvm_averages}
 
 def get_all_zone_and_hub_cash_pvm(emtdb: EmtdbConnection, start_dt: str, end_dt: str, zero_mean: bool,
-                                  q_upper: float) -> Dict[str, Dict[str, pd.DataFrame]]:
+                                  q_upper: float, lmp_cache: Optional[LmpCache] = None, max_workers: int = 4,
+                                  return_report: bool = False
+                                  ) -> Union[Dict[str, Dict[str, pd.DataFrame]],
+                                             Tuple[Dict[str, Dict[str, pd.DataFrame]], pd.DataFrame]]:
     """
     Computes cash PVMs all major zones and hubs (as defined in "get_price_peak_map")
 
+    The LMPs of all nodes are pulled once, the cash vol of each ISO's hub is computed once, and the zones are then
+    computed concurrently from the pulled LMPs only (a zone without LMPs fails instead of being pulled by its thread).
+    A zone that fails does not stop the others and is left out of the PVMs (see return_report), and the zones of an ISO
+    whose hub has no LMPs are skipped.
+
     Args:
         emtdb: EMTDB connection
         start_dt: Start date, e.g. '2023-10-01'
         end_dt: End date, e.g. '2024-06-30'
         zero_mean: Flag for the assumption E[LMP returns]=0
         q_upper: Upper quantile of PVMs to clip (between 0 and 1, methodology default = 1)
+        lmp_cache: Optional local LMP cache, see lmp_cache.LmpCache
+        max_workers: Number of threads computing the zones
+        return_report: Flag to also return the report of the zones
 
     Returns: dictionary of ISO to dictionary of zone name to pd.DataFrame
         columns = Peak blocks
         rows = Months 1-12 and "Avg"
+    or (pvm, report) if return_report, with report a pd.DataFrame
+        columns = ('ISO', 'Name', 'Pnode ID', 'Seconds', 'Error'), Error is None for the zones computed
     """
+    assert 0 < q_upper <= 1
     pvm = {}
     price_peak_map = get_price_peak_map()
 
-    for _, row in price_peak_map.iterrows():
+    # pull the LMPs of all supported nodes and hubs once, up front (each hub is pulled once)
+    is_supported = price_peak_map['General']['ISO'].isin(SUPPORTED_ISO_PNODES.keys())
+    isos = price_peak_map.loc[is_supported, ('General', 'ISO')].unique()
+    pnode_ids = (
+        price_peak_map.loc[is_supported, ('RISKDB.MARKET_PRICE_DATA', 'Node ID')].tolist() +
+        [SUPPORTED_ISO_PNODES[iso] for iso in isos]
+    )
+    df_lmp = pull_lmps(emtdb=emtdb, pnode_ids=pnode_ids, start_dt=start_dt, end_dt=end_dt, lmp_cache=lmp_cache)
+    lmp_data = {pnode_id: df for pnode_id, df in df_lmp.groupby('Pnode ID', sort=False)}
+
+    # the zones depend on the hub cash vols, so compute each hub first (once) and share it with the zones
+    hub_cash_vols = {}
+    hub_errors = {}
+    for iso in isos:
+        try:
+            get_hub_cash_vol(emtdb, iso, start_dt, end_dt, zero_mean, lmp_cache, lmp_data, hub_cash_vols)
+        except Exception as e:
+            print(f'{iso} zones skipped: {e}')
+            hub_errors[iso] = repr(e)
+
+    def calc_zone_pvm(iso: str, pnode_id: str, vol_backbone: bool) -> pd.DataFrame:
+        # the workers share one EMTDB connection and the LMP cache, so they never pull
+        if str(pnode_id) not in lmp_data:
+            raise Exception(f'missing LMPs: {pnode_id}')
+        cash_pvm = get_cash_pvm(emtdb, iso, pnode_id, start_dt, end_dt, zero_mean, q_upper, lmp_cache, lmp_data,
+                                hub_cash_vols)
+        if cash_pvm is None:
+            raise Exception(f'missing LMPs: {pnode_id}')
+        return cash_pvm['Hub'] if vol_backbone else cash_pvm['Node']
+
+    calls = {}
+    report = {}
+    for i, row in price_peak_map.iterrows():
         iso = row['General']['ISO']
-        if iso not in SUPPORTED_ISO_PNODES.keys():
-            print(f'unsupported ISO: {iso}')
-            continue
-        if iso not in pvm.keys():
-            pvm[iso] = {}
-
         name = row['General']['Name']
         pnode_id = row['RISKDB.MARKET_PRICE_DATA']['Node ID']
+        if iso not in SUPPORTED_ISO_PNODES.keys():
+            report[i] = (iso, name, pnode_id, 0., f'unsupported ISO: {iso}')
+            continue
+        if iso in hub_errors:
+            report[i] = (iso, name, pnode_id, 0., f'skipped, {hub_errors[iso]}')
+            continue
         vol_backbone = row['RISKDB.FWD_MARKET_PRICE']['Vol Backbone']
+        calls[i] = partial(calc_zone_pvm, iso=iso, pnode_id=pnode_id, vol_backbone=vol_backbone)
+
+    results = run_calls(calls=calls, max_workers=max_workers, description='zone cash PVMs')
 
-        cash_pvm = get_cash_pvm(emtdb, iso, pnode_id, start_dt, end_dt, zero_mean, q_upper)
-        pvm[iso][name] = cash_pvm['Hub'] if vol_backbone else cash_pvm['Node']
+    for i, res in results.items():
+        iso, name, pnode_id = price_peak_map.loc[i, [('General', 'ISO'), ('General', 'Name'),
+                                                     ('RISKDB.MARKET_PRICE_DATA', 'Node ID')]]
+        report[i] = (iso, name, pnode_id, res.seconds, None if res.error is None else repr(res.error))
+        if res.error is None:
+            pvm.setdefault(iso, {})[name] = res.df
 
-    return pvm
+    report = pd.DataFrame([report[i] for i in price_peak_map.index if i in report],
+                          columns=['ISO', 'Name', 'Pnode ID', 'Seconds', 'Error'])
+    return (pvm, report) if return_report else pvm
 
-def _get_forward_monthly_prices(emtdb: EmtdbConnection, eval_dt: str, n_months_lookback: int = 25) -> pd.DataFrame:
+def _get_forward_window(eval_dt: str, n_months_lookback: int = 25) -> Tuple[pd.Timestamp, pd.Timestamp, str, str]:
+    """
+    Returns: (first trade date, last trade date, first contract month, last contract month) of the forward data used on
+    eval_dt, e.g. (Timestamp('2022-06-01'), Timestamp('2024-06-30'), '202207', '202406')
+    """
+    eval_dt = pd.to_datetime(eval_dt)
+    last_trade_dt = eval_dt.normalize() if eval_dt.is_month_end else (eval_dt - pd.offsets.MonthEnd()).normalize()
+    first_trade_dt = last_trade_dt - pd.offsets.MonthBegin(n=n_months_lookback)
+
+    first_contract_month = (first_trade_dt + pd.offsets.MonthBegin(n=1)).strftime('%Y%m')
+    last_contract_month = (last_trade_dt + pd.offsets.MonthBegin(n=12)).strftime('%Y%m')
+    return first_trade_dt, last_trade_dt, first_contract_month, last_contract_month
+
+def _get_forward_monthly_prices(emtdb: EmtdbConnection, eval_dt: str, n_months_lookback: int = 25,
+                                fwd_price_cache: Optional[FwdPriceCache] = None) -> pd.DataFrame:
     """
     Returns historical forward data from RISKDB.FWD_MARKET_PRICE
 
@@ -170,40 +405,47 @@ def _get_forward_monthly_prices(emtdb: EmtdbConnection, eval_dt: str, n_months_l
         emtdb: EMTDB connection
         eval_dt: Evaluation date, e.g. '2024-07-10'
         n_months_lookback: Number of months in the period prior to the eval date (default methodology = 25)
+        fwd_price_cache: Optional local forward price cache, see fwd_price_cache.FwdPriceCache
 
     Returns: pd.DataFrame
-        columns = (EFFECTIVE_DATE, BASIS_POINT, CONTRACT_MONTH, FIXED_AMOUNT, ISO_NAME)
+        columns = (EFFECTIVE_DATE, BASIS_POINT, CONTRACT_MONTH, PRICE, ISO_NAME)
     """
-    eval_dt = pd.to_datetime(eval_dt)
-    last_trade_dt = eval_dt.date() if eval_dt.is_month_end else (eval_dt - pd.offsets.MonthEnd()).date()
-    first_trade_dt = (last_trade_dt - pd.offsets.MonthBegin(n=n_months_lookback)).date()
-
-    first_contract_month = (first_trade_dt + pd.offsets.MonthBegin(n=1)).strftime('%Y%m')
-    last_contract_month = (last_trade_dt + pd.offsets.MonthBegin(n=12)).strftime('%Y%m')
-
-    data = []
-
-    for iso, basis_points in ISO_TO_FWD_MARKET_PRICE_BACKBONE.items():
-        for bp in basis_points:
-            print(f'pulling fwd_market_price data: {bp}')
-
-            df = pull_fwd_market_price(
-                emtdb=emtdb, cd=bp, bp=bp, start_dt=first_trade_dt, end_dt=last_trade_dt,
-                first_contract_month=first_contract_month, last_contract_month=last_contract_month
-            )
-            df = df[['EFFECTIVE_DATE', 'BASIS_POINT', 'CONTRACT_MONTH', 'FIXED_AMOUNT']]
-            df['ISO_NAME'] = iso
-            df = df.rename({'FIXED_AMOUNT': 'PRICE'}, axis=1)
-            # remove outstanding bal-mo contracts and select prompt 12 mo
-            df = df[df['EFFECTIVE_DATE'] < pd.to_datetime(df['CONTRACT_MONTH'], format='%Y%m')]
-            df = df.groupby(['EFFECTIVE_DATE', 'BASIS_POINT']).head(12)
+    return _pull_forward_monthly_prices(emtdb, *_get_forward_window(eval_dt, n_months_lookback),
+                                        fwd_price_cache=fwd_price_cache)
 
-            data.append(df)
-
-    df = pd.concat(data)
-    return df
+def _pull_forward_monthly_prices(emtdb: EmtdbConnection, first_trade_dt: pd.Timestamp, last_trade_dt: pd.Timestamp,
+                                 first_contract_month: str, last_contract_month: str,
+                                 fwd_price_cache: Optional[FwdPriceCache] = None) -> pd.DataFrame:
+    """
+    Returns historical forward data from RISKDB.FWD_MARKET_PRICE between the given trade dates and contract months,
+    without bal-mo contracts and limited to the prompt 12 contracts of each trade date, for all backbones in one query
 
-def get_forward_monthly_pvm(emtdb: EmtdbConnection, eval_dt: str, n_months_lookback: int = 25) -> Tuple[pd.DataFrame]:
+    Returns: pd.DataFrame
+        columns = (EFFECTIVE_DATE, BASIS_POINT, CONTRACT_MONTH, PRICE, ISO_NAME)
+    """
+    bps = [bp for basis_points in ISO_TO_FWD_MARKET_PRICE_BACKBONE.values() for bp in basis_points]
+    print(f'pulling fwd_market_price data: {bps}')
+    if fwd_price_cache is None:
+        df = pull_fwd_market_price_many(emtdb=emtdb, bps=bps, start_dt=first_trade_dt, end_dt=last_trade_dt,
+                                        first_contract_month=first_contract_month,
+                                        last_contract_month=last_contract_month)
+    else:
+        df = fwd_price_cache.pull_fwd_market_prices(emtdb=emtdb, bps=bps, start_dt=first_trade_dt,
+                                                    end_dt=last_trade_dt)
+        df = df[df['CONTRACT_MONTH'].between(first_contract_month, last_contract_month)]
+
+    missing = [bp for bp in bps if bp not in set(df['BASIS_POINT'])]
+    if missing:
+        print(f'missing fwd_market_price data: {missing}')
+
+    # one block of rows per basis point, in the order of the backbones
+    bp_to_iso = {bp: iso for iso, basis_points in ISO_TO_FWD_MARKET_PRICE_BACKBONE.items() for bp in basis_points}
+    df = df.assign(ISO_NAME=df['BASIS_POINT'].map(bp_to_iso))
+    order = np.lexsort((df['CONTRACT_MONTH'], df['EFFECTIVE_DATE'], df['BASIS_POINT'].map(bps.index)))
+    return df.iloc[order].reset_index(drop=True)
+
+def get_forward_monthly_pvm(emtdb: EmtdbConnection, eval_dt: str, n_months_lookback: int = 25,
+                            fwd_price_cache: Optional[FwdPriceCache] = None) -> Tuple[pd.DataFrame]:
     """
     Calculates monthly forward PVMs from historical forward date
 
@@ -211,70 +453,100 @@ def get_forward_monthly_pvm(emtdb: EmtdbConnection, eval_dt: str, n_months_lookb
         emtdb: EMTDB connection
         eval_dt: Evaluation date, e.g. '2024-07-10'
         n_months_lookback: Number of months in the period prior to the eval date (default methodology = 25)
+        fwd_price_cache: Optional local forward price cache, see fwd_price_cache.FwdPriceCache
 
     Returns:
         pd.DataFrame of prices, pd.DataFrame of vols, pd.DataFrame of vol ratios, and pd.DataFrame of monthly PVM values
     """
-    # pull prices for each contract and reformat data so that index=effective_date
-    df_prices = _get_forward_monthly_prices(emtdb, eval_dt, n_months_lookback)
+    # pull prices for each contract
+    df_prices = _get_forward_monthly_prices(emtdb, eval_dt, n_months_lookback, fwd_price_cache)
     print(df_prices.shape)
 
     contracts = sorted(df_prices['CONTRACT_MONTH'].unique())
     print(contracts, '\n')
 
-    df_prices = df_prices.pivot(index='EFFECTIVE_DATE', columns=['ISO_NAME', 'BASIS_POINT', 'CONTRACT_MONTH'],
-                                values='PRICE')
+    return calc_forward_monthly_pvm(df_prices)
 
-    # calculate vols for each contract
-    vols = []
-    for contract in contracts:
-        contract_prices = df_prices.loc[:, (slice(None), slice(None), contract)] #.dropna() # Dropping NaNs can lead to significantly different results
-        dt = (contract_prices.index[1:] - contract_prices.index[:-1]).days / 360 # annualized
-        contract_returns = np.log(contract_prices).diff().iloc[1:].div(np.sqrt(dt), axis=0)
-        contract_vol = contract_returns.std(axis=0).rename('Vol')
-        vols.append(contract_vol)
+def calc_forward_monthly_pvm(df_prices: pd.DataFrame) -> Tuple[pd.DataFrame]:
+    """
+    Calculates monthly forward PVMs from historical forward prices, with the vols of all basis points and contracts
+    computed at once from a (trade date x basis point x contract) array
+
+    Args:
+        df_prices: pd.DataFrame with columns (EFFECTIVE_DATE, BASIS_POINT, CONTRACT_MONTH, PRICE, ISO_NAME), e.g. from
+            "_get_forward_monthly_prices"
 
-    df_vol = pd.concat(vols).to_frame().unstack(['ISO_NAME', 'BASIS_POINT'])['Vol']
+    Returns:
+        pd.DataFrame of prices, pd.DataFrame of vols, pd.DataFrame of vol ratios, and pd.DataFrame of monthly PVM values
+    """
+    # reformat data so that index=effective_date
+    df_prices = df_prices.pivot(index='EFFECTIVE_DATE', columns=['ISO_NAME', 'BASIS_POINT', 'CONTRACT_MONTH'],
+                                values='PRICE')
 
-    df_vol_backbone = df_vol[[(k, v[0]) for k, v in ISO_TO_FWD_MARKET_PRICE_BACKBONE.items()]]
-    df_vol_backbone = df_vol_backbone.droplevel('BASIS_POINT', axis=1)
-    df_vol_ratio = df_vol / df_vol_backbone
+    # reshape to (trade date, basis point, contract), with NaN for the contracts missing from a basis point
+    curves = df_prices.columns.droplevel('CONTRACT_MONTH').unique()
+    contracts = df_prices.columns.get_level_values('CONTRACT_MONTH').unique().sort_values()
+    columns = pd.MultiIndex.from_tuples([curve + (contract,) for curve in curves for contract in contracts],
+                                        names=df_prices.columns.names)
+    prices = df_prices.reindex(columns=columns).to_numpy(dtype=float).reshape(len(df_prices), len(curves),
+                                                                            len(contracts))
+
+    # calculate vols for each contract: std of annualized log returns, skipping NaNs (dropping the trade dates with a
+    # NaN for any contract can lead to significantly different results)
+    dt = np.diff(df_prices.index.to_numpy()) / np.timedelta64(1, 'D') / 360  # annualized
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = np.diff(np.log(prices), axis=0) / np.sqrt(dt)[:, None, None]
+        count = (~np.isnan(returns)).sum(axis=0)
+        mean = np.nansum(returns, axis=0) / count
+        vol = np.sqrt(np.nansum((returns - mean) ** 2, axis=0) / (count - 1))
+    vol[count < 2] = np.nan
+
+    df_vol = pd.DataFrame(vol.T, index=contracts, columns=curves)
+
+    # vol ratio to the backbone (first basis point) of each ISO
+    backbone = curves.get_indexer([(iso, ISO_TO_FWD_MARKET_PRICE_BACKBONE[iso][0]) for iso, _ in curves])
+    vol_backbone = np.where((backbone >= 0)[:, None], vol[backbone], np.nan)
+    df_vol_ratio = pd.DataFrame((vol / vol_backbone).T, index=contracts, columns=curves)
 
     monthly_pvm = df_vol_ratio.mean().rename('Monthly PVM')
 
     return df_prices, df_vol, df_vol_ratio, monthly_pvm
 
-"""
-SELECT
-    fmp.EFFECTIVE_DATE, 
-    fmp.CONTRACT_MONTH,
-    fmp.BASIS_POINT,
-    fmp.FIXED_AMOUNT as "PRICE",
-    pcm.BASIS_ISO_REF,
-    pcm.ISO_NAME,
-    pcm.HOUR_TYPE
-FROM RISKDB.FWD_MARKET_PRICE fmp
-LEFT JOIN RISKDB.PRICE_CURVE_MAPPING pcm 
-ON (fmp.BASIS_POINT = pcm.BACKBONE_BASIS_POINT AND fmp.COMMODITY = pcm.BACKBONE_COMMODITY)
-WHERE fmp.BACKBONE_FLAG = 'Y'
-AND fmp.COMMODITY = fmp.BASIS_POINT
-AND fmp.EFFECTIVE_DATE BETWEEN :first_trade_dt AND :last_trade_dt
-AND fmp.CONTRACT_MONTH BETWEEN :first_contract_month AND :last_contract_month
-AND pcm.BACKBONE_BASIS_POINT IN (
-    'PJM-ON', 'PJM-OFF',
-    'NEPOOLMAHUB-ON', 'NEPOOLMAHUB-OFF',
-    'MISO-INDIANA.HUB-DA-5X16', 'MISO-INDIANA.HUB-DA-OFF',
-    'ERCOT-ON', 'ERCOT-OFF', 'ERCOT-2X16', 'ERCOT-7X8', 'ERCOT-7X24',
-    'SPP-SPPNORTH_HUB-DA-5X16', 'SPP-SPPNORTH_HUB-DA-OFF',
-    'SP15-ON', 'SP15-OFF'
-)
-AND pcm.BASIS_ISO_REF IN (
-    '51288',
-    '4000',
-    'INDIANA.HUB-DA',
-    'HB_NORTH_FIN',
-    'SPPNORTH_HUB-DA',
-    'TH_SP15_GEN-APND'
-)
-ORDER BY fmp.EFFECTIVE_DATE, fmp.CONTRACT_MONTH, fmp.BASIS_POINT
-"""
+def get_forward_monthly_pvm_many(emtdb: EmtdbConnection, eval_dts: List[str], n_months_lookback: int = 25,
+                                 fwd_price_cache: Optional[FwdPriceCache] = None) -> pd.DataFrame:
+    """
+    Calculates monthly forward PVMs for many eval dates (see "get_forward_monthly_pvm"), pulling the forward prices
+    once for the union of their windows. Eval dates with the same window (e.g. in the same month) are computed once.
+
+    Args:
+        emtdb: EMTDB connection
+        eval_dts: Evaluation dates, e.g. ['2024-05-10', '2024-06-10', '2024-07-10']
+        n_months_lookback: Number of months in the period prior to the eval date (default methodology = 25)
+        fwd_price_cache: Optional local forward price cache, see fwd_price_cache.FwdPriceCache
+
+    Returns: pd.DataFrame
+        columns = (ISO_NAME, BASIS_POINT) monthly PVMs
+        index = Eval dates
+    """
+    windows = {pd.to_datetime(eval_dt): _get_forward_window(eval_dt, n_months_lookback) for eval_dt in eval_dts}
+    assert windows, 'no eval dates'
+
+    # the prompt 12 contracts of a trade date do not depend on the contract months pulled around them, so slicing the
+    # union pull by window gives the same prices as pulling each window
+    df_prices = _pull_forward_monthly_prices(
+        emtdb, min(x[0] for x in windows.values()), max(x[1] for x in windows.values()),
+        min(x[2] for x in windows.values()), max(x[3] for x in windows.values()), fwd_price_cache
+    )
+    trade_dts = pd.to_datetime(df_prices['EFFECTIVE_DATE'])
+
+    pvm = {}
+    data = {}
+    for eval_dt, window in windows.items():
+        if window not in pvm:
+            first_trade_dt, last_trade_dt, first_contract_month, last_contract_month = window
+            is_in_window = (trade_dts >= first_trade_dt) & (trade_dts <= last_trade_dt) & \
+                           df_prices['CONTRACT_MONTH'].between(first_contract_month, last_contract_month)
+            pvm[window] = calc_forward_monthly_pvm(df_prices[is_in_window])[3]
+        data[eval_dt] = pvm[window]
+
+    return pd.DataFrame(data).T.rename_axis('Eval Date')
@@ -1,14 +1,21 @@
 import pandas as pd
+import numpy as np
+from typing import List, Optional, Tuple
 
 # project code
-from util import EmtdbConnection, date_hour_to_peak_block, spring_dst, fall_dst, hourly_index, convert_lmps_tz
-from emtdb_api import pull_lmp_data
+from util import EmtdbConnection, spring_dst, fall_dst, hourly_index
+from lmp_cache import LmpCache
+from lmp_prep import pull_lmps, prepare_lmps, pull_and_prepare_lmps
 
 SUPPORTED_ISOS = ('SPP', 'CAISO', 'MISO', 'ISONE', 'PJM')
 
+# time blocks of 4 consecutive hours within each peak block, see "pull_lmp_and_calc_shaper"
+PEAK_BLOCK_TO_TIME_BLOCK_PREFIX = {'5x16': 'WD', '2x16': 'WE'}
+
 
 def pull_lmp_and_calc_shaper(emtdb: EmtdbConnection, iso: str, pnode_id: str, eval_dt: str, is_hourly: bool,
-                             lookback_yrs: int = 2, clip_quantile: float = 1):
+                             lookback_yrs: int = 2, clip_quantile: float = 1, lmp_cache: Optional[LmpCache] = None,
+                             df_lmp: Optional[pd.DataFrame] = None):
     """    Computes historical day-ahead LMP shaper over the given period
     Args:        
         emtdb: EMTDB connection
@@ -18,6 +25,8 @@ def pull_lmp_and_calc_shaper(emtdb: EmtdbConnection, iso: str, pnode_id: str, ev
         is_hourly: Hourly vs. time-block flag
         lookback_yrs: Number of years of historical data (default methodology = 2)
         clip_quantile: Upper quantile of LMP values to clip (default methodology = 1, or no clipping)
+        lmp_cache: Optional local LMP cache, see lmp_cache.LmpCache
+        df_lmp: Optional LMPs already pulled with "lmp_prep.pull_lmps" (e.g. shared with splitters)
     Returns: pd.DataFrame
     column names = ('Peak Block', 'Hour')
     index = Months 1-12
@@ -33,37 +42,31 @@ def pull_lmp_and_calc_shaper(emtdb: EmtdbConnection, iso: str, pnode_id: str, ev
     if not end_dt.is_month_end:
         end_dt -= pd.offsets.MonthEnd()
     start_dt = end_dt - pd.offsets.MonthBegin(12 * lookback_yrs)
-    if iso == 'MISO':
-
-        # convert MISO LMPs from EST to EPT. Sometimes for MISO, we convert LMPs to CPT and use hours 7-22 as the peak.
-        # If that is the case,change the convert_to to 'CPT' and as a hack, change the iso in date_hour_to_peak_block
-        # to 'SPP'
-        df_lmp = convert_lmps_tz(pull_lmp_data(
-            emtdb=emtdb,
-            pnode_id=pnode_id,
-            da_or_rt='DA',
-            start_dt=start_dt,
-            end_dt=end_dt
-        ).reset_index(),
-            convert_from='EST',
-            convert_to='EPT'
-        )
-    else:
-
-        # pull data from EMTDB - shapers calculated using DA LMPs
-        df_lmp = pull_lmp_data(emtdb=emtdb, pnode_id=pnode_id, da_or_rt='DA', start_dt=start_dt,
-                               end_dt=end_dt).reset_index()
-
-    # post-processing
-    df_lmp['Price'] = df_lmp['Price'].clip(upper=df_lmp['Price'].quantile(clip_quantile, interpolation='higher'))
-    df_lmp['Month'] = df_lmp['Date'].dt.month
-    df_lmp['Peak Block'] = df_lmp.apply(
-        lambda x: date_hour_to_peak_block(date=x['Date'], hour=x['Hour'], iso=iso), axis=1)
+
+    # pull DA LMPs, convert MISO LMPs from EST to EPT, clip and classify peak blocks
+    df_lmp = pull_and_prepare_lmps(emtdb=emtdb, iso=iso, pnode_ids=[pnode_id], start_dt=start_dt, end_dt=end_dt,
+                                   clip_quantile=clip_quantile, lmp_cache=lmp_cache, df_lmp=df_lmp)
 
     # calculate shaper
-    avg_hourly = df_lmp.groupby(['Month', 'Peak Block', 'Hour'])['Price'].mean()
-    avg_peak_block = df_lmp.groupby(['Month', 'Peak Block'])['Price'].mean()
+    avg_hourly = df_lmp.groupby(['Month', 'Peak Block', 'Hour'], observed=True)['Price'].mean()
+    avg_peak_block = df_lmp.groupby(['Month', 'Peak Block'], observed=True)['Price'].mean()
+
+    return calc_shaper(avg_hourly=avg_hourly, avg_peak_block=avg_peak_block, is_hourly=is_hourly)
+
+
+def calc_shaper(avg_hourly: pd.Series, avg_peak_block: pd.Series, is_hourly: bool) -> pd.DataFrame:
+    """
+    Computes the shaper from average prices
+
+    Args:
+        avg_hourly: Average price, index names = ('Month', 'Peak Block', 'Hour')
+        avg_peak_block: Average price, index names = ('Month', 'Peak Block')
+        is_hourly: Hourly vs. time-block flag
 
+    Returns: pd.DataFrame
+    column names = ('Peak Block', 'Hour')
+    index = Months 1-12
+    """
     shaper = avg_hourly / avg_peak_block
 
     shaper = shaper.unstack(['Peak Block', 'Hour']).sort_index(axis=1)
@@ -84,3 +87,74 @@ def pull_lmp_and_calc_shaper(emtdb: EmtdbConnection, iso: str, pnode_id: str, ev
         shaper = pd.DataFrame(data).sort_index(axis=1)
 
     return shaper
+
+
+def pull_lmp_and_calc_shapers(emtdb: EmtdbConnection, nodes: List[Tuple[str, str]], eval_dt: str, is_hourly: bool,
+                              lookback_yrs: int = 2, clip_quantile: float = 1, lmp_cache: Optional[LmpCache] = None,
+                              df_lmp: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    Computes historical day-ahead LMP shapers for a portfolio of nodes (see "pull_lmp_and_calc_shaper"), with one pull
+    and one grouped pass over the LMPs of all nodes
+
+    Args:
+        emtdb: EMTDB connection
+        nodes: (ISO, pricing node ID) pairs, e.g. [('PJM', '51288'), ('ISONE', '4001')]
+        eval_dt: Evaluation date, e.g. '2024-07-10'
+        is_hourly: Hourly vs. time-block flag
+        lookback_yrs: Number of years of historical data (default methodology = 2)
+        clip_quantile: Upper quantile of LMP values to clip, applied to each node separately (default = 1, no clipping)
+        lmp_cache: Optional local LMP cache, see lmp_cache.LmpCache
+        df_lmp: Optional LMPs already pulled with "lmp_prep.pull_lmps"
+
+    Returns: pd.DataFrame
+        column names = ('Peak Block', 'Hour') or ('Peak Block', 'Time Block')
+        index names = ('ISO', 'Pnode ID', 'Month')
+    """
+    assert 0 < clip_quantile <= 1
+    assert lookback_yrs >= 1
+    iso_to_pnode_ids = {}
+    for iso, pnode_id in nodes:
+        assert iso in SUPPORTED_ISOS
+        if not is_hourly:
+            assert iso != 'CAISO'  # not currently supported
+        iso_to_pnode_ids.setdefault(iso, []).append(str(pnode_id))
+
+    # use the past 'lookback_years' years of data up to the most recent month-end
+    end_dt = pd.to_datetime(eval_dt)
+    if not end_dt.is_month_end:
+        end_dt -= pd.offsets.MonthEnd()
+    start_dt = end_dt - pd.offsets.MonthBegin(12 * lookback_yrs)
+
+    # pull DA LMPs of all nodes at once, then prepare them by ISO (timezone and peak blocks depend on the ISO)
+    if df_lmp is None:
+        df_lmp = pull_lmps(emtdb=emtdb, pnode_ids=[str(x) for _, x in nodes], start_dt=start_dt, end_dt=end_dt,
+                           lmp_cache=lmp_cache)
+    df_lmp = pd.concat([
+        prepare_lmps(df_lmp=df_lmp[df_lmp['Pnode ID'].isin(pnode_ids)], iso=iso, start_dt=start_dt, end_dt=end_dt,
+                     clip_quantile=clip_quantile).assign(ISO=iso)
+        for iso, pnode_ids in iso_to_pnode_ids.items()
+    ], ignore_index=True)
+    df_lmp['Peak Block'] = df_lmp['Peak Block'].astype(str)  # peak block categories differ between ISOs
+
+    # calculate shaper: hourly averages and peak block averages from the same grouped sums and counts
+    keys = ['ISO', 'Pnode ID', 'Month', 'Peak Block']
+    df_hourly = df_lmp.groupby(keys + ['Hour'])['Price'].agg(['sum', 'count'])
+    df_peak_block = df_hourly.groupby(level=keys).sum()
+
+    shaper = (df_hourly['sum'] / df_hourly['count']) / (df_peak_block['sum'] / df_peak_block['count'])
+    shaper = shaper.rename('Shaper').reorder_levels(keys + ['Hour'])
+
+    if is_hourly:
+        return shaper.unstack(['Peak Block', 'Hour']).sort_index(axis=1)
+
+    # calculate time-block shaper: average of the shapers of each 4 consecutive hours of a peak block, or of all hours
+    # of 7x8
+    df_shaper = shaper.reset_index()
+    position = df_shaper.groupby(['ISO', 'Pnode ID', 'Peak Block'])['Hour'].rank(method='dense').astype(int) - 1
+    prefix = df_shaper['Peak Block'].map(PEAK_BLOCK_TO_TIME_BLOCK_PREFIX)
+    df_shaper['Time Block'] = np.where(df_shaper['Peak Block'] == '7x8', 'WN_1',
+                                       prefix + '_' + (position // 4 + 1).astype(str))
+    df_shaper = df_shaper[(df_shaper['Peak Block'] == '7x8') | (prefix.notnull() & (position < 16))]
+
+    shaper = df_shaper.groupby(['ISO', 'Pnode ID', 'Month', 'Peak Block', 'Time Block'])['Shaper'].mean()
+    return shaper.unstack(['Peak Block', 'Time Block']).sort_index(axis=1)
@@ -1,13 +1,18 @@
 import pandas as pd
+from typing import List, Optional, Tuple
 
 # project code
-from util import EmtdbConnection, date_hour_to_peak_block, spring_dst, fall_dst, hourly_index, peak_block_to_traded_peak, get_holidays, convert_lmps_tz
-from emtdb_api import pull_lmp_data
+from util import EmtdbConnection, lookup_hour_calendar, spring_dst, fall_dst, hourly_index
+from lmp_cache import LmpCache
+from lmp_prep import pull_and_prepare_lmps
 import numpy as np
 from scipy.stats import norm
 
 SUPPORTED_ISOS = ('SPP', 'CAISO', 'MISO', 'ISONE', 'PJM')
 
+# kernel bandwidth, defined in risk methodology paper
+KERNEL_BANDWIDTH = 0.5
+
 # helper function to calculate the number of months a given observation's month is from the month for which the splitter is to be calculated
 
 def months_away(kernel_months, splitter_month):
@@ -15,7 +20,8 @@ def months_away(kernel_months, splitter_month):
     return np.where(months_away_abs <= 6, months_away_abs, 12 - months_away_abs)
 
 def pull_lmp_and_calc_splitter(emtdb: EmtdbConnection, iso: str, pnode_id: str, eval_dt: str,
-                               lookback_yrs: int = 2, clip_quantile: float = 1):
+                               lookback_yrs: int = 2, clip_quantile: float = 1, lmp_cache: Optional[LmpCache] = None,
+                               df_lmp: Optional[pd.DataFrame] = None):
     """    Computes historical day-ahead LMP shaper over the given period
     Args:
         emtdb: EMTDB connection
@@ -24,6 +30,8 @@ def pull_lmp_and_calc_splitter(emtdb: EmtdbConnection, iso: str, pnode_id: str,
         eval_dt: Evaluation date, e.g. '2024-07-10'
         lookback_yrs: Number of years of historical data (default methodology = 2). To be precise, this is exactly 2 years for shapers but between 24 and 25 months for splitters
         clip_quantile: Upper quantile of LMP values to clip (default methodology = 1, or no clipping)
+        lmp_cache: Optional local LMP cache, see lmp_cache.LmpCache
+        df_lmp: Optional LMPs already pulled with "lmp_prep.pull_lmps" (e.g. shared with shapers)
     Returns: pd.DataFrame
     column names = ('2x16') splitters
     index = Months 1-12
@@ -37,113 +45,135 @@ def pull_lmp_and_calc_splitter(emtdb: EmtdbConnection, iso: str, pnode_id: str,
     start_dt = previous_month_end - pd.offsets.MonthBegin(12 * lookback_yrs)
     start_dt_one_day_before = start_dt - pd.Timedelta(days=1) # this is for MISO where we may need to fill a missing hour
 
-    # pull data from EMTDB - splitters calculated using DA LMPs
-    df_lmp = pull_lmp_data(emtdb=emtdb, pnode_id=pnode_id, da_or_rt='DA', start_dt=start_dt, end_dt=end_dt).reset_index()
-
-    if iso == 'MISO':
-        # convert MISO LMPs from EST to EPT. Sometimes for MISO, we convert LMPs to CPT and use hours 7-22 as the peak. If that is the case,
-        # change the convert_to to 'CPT' and as a hack, change the iso in date_hour_to_peak_block and peak_block_traded_block to 'SPP'
-        df_lmp = convert_lmps_tz(
-            df_lmp = pull_lmp_data(
-                emtdb=emtdb,
-                pnode_id=pnode_id,
-                da_or_rt='DA',
-                start_dt=start_dt,
-                end_dt=end_dt
-            ).reset_index(),
-            convert_from='EST',
-            convert_to='EPT'
-        ) #.reset_index()
-
-    # post-processing
-        df_lmp['Price'] = df_lmp['Price'].clip(upper=df_lmp['Price'].quantile(clip_quantile, interpolation='higher'))
-        df_lmp['Month'] = df_lmp['Date'].dt.month
-        df_lmp['Peak Block'] = df_lmp.apply(
-            lambda x: date_hour_to_peak_block(date=x['Date'], hour=x['Hour'], iso=iso), axis=1
-        )
-        df_lmp['5x16 / Off'] = df_lmp.apply(
-            lambda x: peak_block_to_traded_peak(peak_block=x['Peak Block'], iso=iso), axis=1
-        )
+    # pull DA LMPs, convert MISO LMPs from EST to EPT, clip and classify peak blocks
+    df_lmp = pull_and_prepare_lmps(emtdb=emtdb, iso=iso, pnode_ids=[pnode_id], start_dt=start_dt, end_dt=end_dt,
+                                   clip_quantile=clip_quantile, lmp_cache=lmp_cache, df_lmp=df_lmp)
+
     # Aggregating the LMPs at the daily level to calculate splitters
-        df_daily = df_lmp[['Date','Month']].drop_duplicates()
-    # merging with off prices
-        df_daily = df_daily.merge(
-            df_lmp.pivot_table(
-                index='Date',
-                columns='5x16 / Off',
-                values='Price',
-                aggfunc='mean'
-            ),
-            how='left',
-            on='Date',
-            validate='1:1'
-        ).drop(['5x16'], axis=1)
-
-    # merging with 2x16 prices
-        df_daily = df_daily.merge(
-            df_lmp.pivot_table(
-                index='Date',
-                columns='Peak Block',
-                values='Price',
-                aggfunc='mean'
-            ),
-            how='left',
-            on='Date',
-            validate='1:1'
-        ).drop(['5x16', '7x8'], axis=1)
-
-    # calculating decay factors
-        df_daily['Decay Factor'] = df_daily.apply(
-            lambda x: 0.5 ** ((np.abs(pd.to_datetime(eval_dt) - x['Date']) / pd.Timedelta(days=365)) + 1), axis=1
-        )
-    # Since off-peak days (weekends/holidays) have 24 off-peak hours while non-off peak days have only 8 off-peak hours, we weight them accordingly
-        df_daily['Off peak day weight'] = df_daily.apply(
-            lambda x: 1 if (x['Date'] in get_holidays(x['Date'].year) or x['Date'].dayofweek in [5, 6]) else 1 / 3, axis=1
-        )
-    # months 1 through 12 to calculate kernel weights
-        kernel_months = np.arange(1, 13)
-    # months 1 through 12 to calculate splitters
-        splitter_months = np.arange(1, 13)
-    # Dictionary to store splitters
-        splitter_dict = {}
-    # Defined in risk methodology paper
-        bm = 0.5
-    # Looping through each month to calculate splitters
-        for splitter_month in splitter_months:
-            months_away_arr = months_away(kernel_months=kernel_months, splitter_month=splitter_month)
-            kernel_weights = norm.pdf(months_away_arr / bm)
-            kernel_weights_df = pd.DataFrame(
-                {
-                    'Month': kernel_months,
-                    'Weights': kernel_weights
-                }
-            ).set_index('Month')
-
-            # mapping from kernel weight dataframe
-
-            df_daily['Kernel Weight'] = df_daily.apply(
-                lambda row: kernel_weights_df.iloc[row['Month'] - 1, 0], axis=1
-            )
-            df_daily['2x16 weight'] = df_daily['Kernel Weight'] * df_daily['Decay Factor']
-            df_daily['Off peak weight'] = df_daily['Kernel Weight'] * df_daily['Decay Factor'] * df_daily['Off peak day weight']
-            df_daily['2x16 weighted price'] = df_daily['2x16'] * df_daily['2x16 weight']
-            df_daily['Off weighted price'] = df_daily['Off'] * df_daily['Off peak weight']
-
-            # Weighted-average 2x16 price
-            avg_2x16 = df_daily['2x16 weighted price'].sum() / df_daily['2x16 weight'][df_daily['2x16'].notnull()].sum()
-
-            # Weighted-average off price
-            avg_off = df_daily['Off weighted price'].sum() / df_daily['Off peak weight'].sum()
-
-            # By definition of splitter
-            splitter_dict[int(splitter_month)] = avg_2x16 / avg_off
-
-    # Converting splitter dictionary to dataframe and renaming index and columns
-    calc_splitters = pd.DataFrame.from_dict(
-        splitter_dict,
-        orient='index')
-
-    calc_splitters.index.rename('Month', inplace=True)
-    calc_splitters.rename(columns={0: '2x16'}, inplace=True)
+    df_2x16, df_off, has_lmps = _daily_2x16_and_off_prices(df_lmp)
+    calc_splitters = calc_splitters_from_daily_prices(
+        df_2x16=df_2x16, df_off=df_off, eval_dt=eval_dt, iso=iso, has_lmps=has_lmps
+    ).rename(columns={str(pnode_id): '2x16'}).rename_axis(columns=None)
 
     return calc_splitters
+
+
+def pull_lmp_and_calc_splitters(emtdb: EmtdbConnection, iso: str, pnode_ids: List[str], eval_dt: str,
+                                lookback_yrs: int = 2, clip_quantile: float = 1, lmp_cache: Optional[LmpCache] = None,
+                                df_lmp: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    Computes historical day-ahead LMP splitters for many nodes of an ISO at once (see "pull_lmp_and_calc_splitter")
+
+    Args:
+        emtdb: EMTDB connection
+        iso: ISO, e.g. 'PJM'
+        pnode_ids: Pricing node IDs, e.g. ['51288', '51291']
+        eval_dt: Evaluation date, e.g. '2024-07-10'
+        lookback_yrs: Number of years of historical data (default methodology = 2)
+        clip_quantile: Upper quantile of LMP values to clip, applied to each node separately (default = 1, no clipping)
+        lmp_cache: Optional local LMP cache, see lmp_cache.LmpCache
+        df_lmp: Optional LMPs already pulled with "lmp_prep.pull_lmps"
+
+    Returns: pd.DataFrame
+        column names = Pnode IDs with LMPs
+        index = Months 1-12
+    """
+    assert iso in SUPPORTED_ISOS
+    assert 0 < clip_quantile <= 1
+    assert lookback_yrs >= 1
+    end_dt = pd.to_datetime(eval_dt)
+    previous_month_end = end_dt - pd.offsets.MonthEnd()
+    start_dt = previous_month_end - pd.offsets.MonthBegin(12 * lookback_yrs)
+
+    df_lmp = pull_and_prepare_lmps(emtdb=emtdb, iso=iso, pnode_ids=pnode_ids, start_dt=start_dt, end_dt=end_dt,
+                                   clip_quantile=clip_quantile, lmp_cache=lmp_cache, df_lmp=df_lmp)
+
+    df_2x16, df_off, has_lmps = _daily_2x16_and_off_prices(df_lmp)
+    return calc_splitters_from_daily_prices(df_2x16=df_2x16, df_off=df_off, eval_dt=eval_dt, iso=iso, has_lmps=has_lmps)
+
+
+def kernel_weight_matrix(months: np.ndarray) -> np.ndarray:
+    """
+    Kernel weights of observations in each month for splitter months 1-12
+
+    Args:
+        months: Month (1-12) of each observation
+
+    Returns: np.ndarray of shape (12, number of observations)
+    """
+    splitter_months = np.arange(1, 13)
+    months_away_arr = months_away(kernel_months=np.asarray(months)[np.newaxis, :],
+                                  splitter_month=splitter_months[:, np.newaxis])
+    return norm.pdf(months_away_arr / KERNEL_BANDWIDTH)
+
+
+def calc_splitters_from_daily_prices(df_2x16: pd.DataFrame, df_off: pd.DataFrame, eval_dt: str, iso: str,
+                                     has_lmps: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    Computes 2x16 splitters for months 1-12 from daily prices of many nodes, as the ratio of the kernel- and
+    decay-weighted average 2x16 price to the weighted average Off price
+
+    Args:
+        df_2x16: Daily average 2x16 prices (NaN on days without 2x16 hours), index = dates, columns = nodes
+        df_off: Daily average Off prices, with the same index and columns as df_2x16
+        eval_dt: Evaluation date, e.g. '2024-07-10'
+        iso: ISO, e.g. 'PJM'
+        has_lmps: Optional flags of the days with LMPs for each node, with the same index and columns as df_2x16
+            (default = all days). Days without LMPs are excluded from the Off weights.
+
+    Returns: pd.DataFrame
+        column names = columns of df_2x16
+        index = Months 1-12
+    """
+    dates = pd.DatetimeIndex(df_2x16.index)
+    df_off = df_off.reindex(index=df_2x16.index, columns=df_2x16.columns)
+
+    decay_factor = np.asarray(0.5 ** (np.abs(pd.to_datetime(eval_dt) - dates) / pd.Timedelta(days=365) + 1))
+    # Since off-peak days (weekends/holidays) have 24 off-peak hours while non-off peak days have only 8 off-peak hours,
+    # we weight them accordingly
+    df_calendar = lookup_hour_calendar(dates=dates, hours=None, iso=iso, columns=['Is Holiday', 'Is Weekend'])
+    off_peak_day_weight = np.where(df_calendar['Is Holiday'] | df_calendar['Is Weekend'], 1, 1 / 3)
+
+    # (12 x days) weight matrices against (days x nodes) price matrices
+    weights_2x16 = kernel_weight_matrix(months=dates.month) * decay_factor
+    weights_off = weights_2x16 * off_peak_day_weight
+
+    prices_2x16 = df_2x16.to_numpy(dtype=float)
+    prices_off = df_off.to_numpy(dtype=float)
+    if has_lmps is None:
+        has_lmps = np.ones(prices_off.shape)
+    else:
+        has_lmps = has_lmps.reindex(index=df_2x16.index, columns=df_2x16.columns, fill_value=False).to_numpy(dtype=float)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avg_2x16 = (weights_2x16 @ np.nan_to_num(prices_2x16)) / (weights_2x16 @ ~np.isnan(prices_2x16))
+        avg_off = (weights_off @ np.nan_to_num(prices_off)) / (weights_off @ has_lmps)
+
+    # By definition of splitter
+    return pd.DataFrame(avg_2x16 / avg_off, index=pd.Index(np.arange(1, 13), name='Month'), columns=df_2x16.columns)
+
+
+def _daily_2x16_and_off_prices(df_lmp: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Aggregates hourly LMPs to daily average 2x16 and Off prices
+
+    Args:
+        df_lmp: pd.DataFrame with columns ('Pnode ID', 'Date', 'Price', 'Peak Block', 'Traded Peak'), see
+            "lmp_prep.prepare_lmps"
+
+    Returns: daily 2x16 prices, daily Off prices and flags of days with LMPs
+        index = Dates with LMPs for any node
+        columns = Pnode IDs
+    """
+    df_lmp_counts = df_lmp.groupby(['Date', 'Pnode ID'], sort=True).size().unstack()
+    has_lmps = df_lmp_counts.notnull()
+    pnode_ids = has_lmps.columns
+
+    df_2x16 = df_lmp[df_lmp['Peak Block'] == '2x16'].pivot_table(
+        index='Date', columns='Pnode ID', values='Price', aggfunc='mean'
+    ).reindex(index=has_lmps.index, columns=pnode_ids)
+    df_off = df_lmp[df_lmp['Traded Peak'] == 'Off'].pivot_table(
+        index='Date', columns='Pnode ID', values='Price', aggfunc='mean'
+    ).reindex(index=has_lmps.index, columns=pnode_ids)
+
+    return df_2x16, df_off, has_lmps
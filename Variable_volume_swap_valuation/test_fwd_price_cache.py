@@ -0,0 +1,119 @@
+import pandas as pd
+import pytest
+
+# project code
+import fwd_price_cache
+from fwd_price_cache import FwdPriceCache
+
+
+class FakeFwdMarks:
+    # local stand-in for "emtdb_api.pull_fwd_market_price_many" answering from the trade dates marked for each bp
+    def __init__(self, trade_dts: dict):
+        self.trade_dts = trade_dts
+        self.queries = []
+
+    def __call__(self, emtdb, bps: list, start_dt: pd.Timestamp, end_dt: pd.Timestamp, first_contract_month: str,
+                 last_contract_month: str, n_prompt_months: int = 12) -> pd.DataFrame:
+        self.queries.append((list(bps), pd.Timestamp(start_dt), pd.Timestamp(end_dt)))
+        data = []
+        for bp in bps:
+            for trade_dt in self.trade_dts.get(bp, []):
+                if start_dt <= trade_dt <= end_dt:
+                    for i in range(1, n_prompt_months + 1):
+                        data.append((trade_dt, bp, (trade_dt + pd.offsets.MonthBegin(n=i)).strftime('%Y%m'),
+                                     expected_price(bp, trade_dt, i)))
+        return pd.DataFrame(data, columns=['EFFECTIVE_DATE', 'BASIS_POINT', 'CONTRACT_MONTH', 'PRICE']).astype(
+            {'EFFECTIVE_DATE': 'datetime64[ns]', 'PRICE': 'float64'})
+
+
+def expected_price(bp: str, trade_dt: pd.Timestamp, prompt: int) -> float:
+    return (50 if bp.endswith('-ON') else 30) + trade_dt.dayofyear / 10 + prompt
+
+
+@pytest.fixture
+def fake_marks(monkeypatch):
+    marks = FakeFwdMarks({'PJM-ON': pd.bdate_range('2024-01-01', '2024-06-28'),
+                          'PJM-OFF': pd.bdate_range('2024-01-01', '2024-06-28')})
+    monkeypatch.setattr(fwd_price_cache, 'pull_fwd_market_price_many', marks)
+    return marks
+
+
+def assert_marks(df: pd.DataFrame, bp: str, trade_dts: pd.DatetimeIndex, n_prompt_months: int = 3):
+    df = df[df['BASIS_POINT'] == bp]
+    assert list(df['EFFECTIVE_DATE'].unique()) == list(trade_dts)
+    assert len(df) == len(trade_dts) * n_prompt_months
+    prompts = df.groupby('EFFECTIVE_DATE').cumcount() + 1
+    assert df['PRICE'].tolist() == [expected_price(bp, x, i) for x, i in zip(df['EFFECTIVE_DATE'], prompts)]
+
+
+def test_only_missing_trade_dates_are_queried(tmp_path, fake_marks):
+    cache = FwdPriceCache(cache_dir=str(tmp_path))
+    bps = ['PJM-ON', 'PJM-OFF']
+
+    df = cache.pull_fwd_market_prices(None, bps, '2024-02-01', '2024-03-31', n_prompt_months=3)
+    for bp in bps:
+        assert_marks(df, bp, pd.bdate_range('2024-02-01', '2024-03-31'))
+    assert fake_marks.queries == [(bps, pd.Timestamp('2024-02-01'), pd.Timestamp('2024-03-31'))]
+
+    # the basis points missing the same trade dates are pulled together, from the day after the last cached mark
+    # (Friday 2024-03-29)
+    df = cache.pull_fwd_market_prices(None, bps, '2024-01-15', '2024-04-30', n_prompt_months=3)
+    for bp in bps:
+        assert_marks(df, bp, pd.bdate_range('2024-01-15', '2024-04-30'))
+    assert fake_marks.queries[1:] == [(bps, pd.Timestamp('2024-01-15'), pd.Timestamp('2024-01-31')),
+                                      (bps, pd.Timestamp('2024-03-30'), pd.Timestamp('2024-04-30'))]
+
+    df = FwdPriceCache(cache_dir=str(tmp_path)).pull_fwd_market_prices(None, bps, '2024-02-01', '2024-04-30',
+                                                                         n_prompt_months=3)
+    assert_marks(df, 'PJM-ON', pd.bdate_range('2024-02-01', '2024-04-30'))
+    assert len(fake_marks.queries) == 3
+
+
+def test_missing_trade_dates_are_pulled_again(tmp_path, fake_marks):
+    # PJM-OFF has no marks after 2024-03-15 yet, and nothing at all is marked for NEPOOLMAHUB-ON
+    fake_marks.trade_dts['PJM-OFF'] = pd.bdate_range('2024-01-01', '2024-03-15')
+    cache = FwdPriceCache(cache_dir=str(tmp_path))
+    bps = ['PJM-ON', 'PJM-OFF', 'NEPOOLMAHUB-ON']
+
+    df = cache.pull_fwd_market_prices(None, bps, '2024-03-01', '2024-03-31', n_prompt_months=3)
+    assert_marks(df, 'PJM-ON', pd.bdate_range('2024-03-01', '2024-03-31'))
+    assert_marks(df, 'PJM-OFF', pd.bdate_range('2024-03-01', '2024-03-15'))
+    end_dts = cache.entries().set_index('bp')['end_dt']
+    assert end_dts.to_dict() == {'PJM-ON': '2024-03-29', 'PJM-OFF': '2024-03-15'}
+
+    # the late PJM-OFF marks are pulled again (and the trade dates of NEPOOLMAHUB-ON), PJM-ON comes from the cache
+    fake_marks.trade_dts['PJM-OFF'] = pd.bdate_range('2024-01-01', '2024-06-28')
+    df = cache.pull_fwd_market_prices(None, bps, '2024-03-01', '2024-03-31', n_prompt_months=3)
+    assert_marks(df, 'PJM-OFF', pd.bdate_range('2024-03-01', '2024-03-31'))
+    assert fake_marks.queries[1:] == [
+        (['PJM-ON'], pd.Timestamp('2024-03-30'), pd.Timestamp('2024-03-31')),
+        (['PJM-OFF'], pd.Timestamp('2024-03-16'), pd.Timestamp('2024-03-31')),
+        (['NEPOOLMAHUB-ON'], pd.Timestamp('2024-03-01'), pd.Timestamp('2024-03-31')),
+    ]
+    assert cache.entries().set_index('bp').loc['PJM-OFF', 'end_dt'] == '2024-03-29'
+    assert 'NEPOOLMAHUB-ON' not in set(cache.entries()['bp'])
+
+
+def test_entry_is_not_rewritten_when_nothing_new_is_returned(tmp_path, fake_marks):
+    cache = FwdPriceCache(cache_dir=str(tmp_path))
+    cache.pull_fwd_market_prices(None, ['PJM-ON'], '2024-06-01', '2024-06-28', n_prompt_months=3)
+    entry = dict(cache._index['PJM-ON|3'])
+
+    # no marks after 2024-06-28 yet
+    df = cache.pull_fwd_market_prices(None, ['PJM-ON'], '2024-06-01', '2024-07-10', n_prompt_months=3)
+    assert_marks(df, 'PJM-ON', pd.bdate_range('2024-06-03', '2024-06-28'))
+    assert fake_marks.queries[-1] == (['PJM-ON'], pd.Timestamp('2024-06-29'), pd.Timestamp('2024-07-10'))
+    assert {k: v for k, v in cache._index['PJM-ON|3'].items() if k != 'last_access'} == \
+        {k: v for k, v in entry.items() if k != 'last_access'}
+
+
+def test_unsettled_trade_dates_are_not_cached(tmp_path, fake_marks):
+    today = pd.Timestamp.today().normalize()
+    fake_marks.trade_dts['PJM-ON'] = pd.date_range(today - pd.Timedelta(days=30), today)
+    cache = FwdPriceCache(cache_dir=str(tmp_path), settled_lag_days=2)
+
+    cache.pull_fwd_market_prices(None, ['PJM-ON'], today - pd.Timedelta(days=10), today, n_prompt_months=3)
+    assert cache.entries().loc[0, 'end_dt'] == str((today - pd.Timedelta(days=2)).date())
+
+    cache.pull_fwd_market_prices(None, ['PJM-ON'], today - pd.Timedelta(days=10), today, n_prompt_months=3)
+    assert fake_marks.queries[-1] == (['PJM-ON'], today - pd.Timedelta(days=1), today)
@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+
+# project code
+from lmp_cache import LmpCache
+
+
+class FakeEmtdb:
+    # local stand-in for util.EmtdbConnection answering the LMP query of "emtdb_api.pull_lmp_data" from a set of dates
+    def __init__(self, dates: pd.DatetimeIndex):
+        self.dates = dates
+        self.queries = []
+
+    def execute(self, qry: str, params: dict, dtypes: dict) -> pd.DataFrame:
+        start_dt, end_dt = pd.Timestamp(params['start_dt']), pd.Timestamp(params['end_dt'])
+        self.queries.append((params['pnode_id'], start_dt, end_dt))
+        dates = self.dates[(self.dates >= start_dt) & (self.dates <= end_dt)]
+        df = pd.DataFrame({'Date': np.repeat(dates, 24), 'Hour': np.tile(np.arange(1, 25), len(dates))})
+        df['Price'] = df['Date'].dt.dayofyear + df['Hour'] / 100 + int(params['pnode_id'])
+        return df.astype(dtypes)
+
+
+def expected_lmps(pnode_id: str, start_dt: str, end_dt: str) -> pd.DataFrame:
+    return FakeEmtdb(pd.date_range(start_dt, end_dt)).execute(
+        qry='', params={'start_dt': start_dt, 'end_dt': end_dt, 'pnode_id': pnode_id},
+        dtypes={'Date': 'datetime64[ns]', 'Hour': 'int8', 'Price': 'float64'}
+    ).set_index(['Date', 'Hour'])
+
+
+def assert_lmps_equal(df: pd.DataFrame, pnode_id: str, start_dt: str, end_dt: str):
+    pd.testing.assert_frame_equal(df, expected_lmps(pnode_id, start_dt, end_dt), check_index_type=False,
+                                  check_dtype=False)
+
+
+def test_only_missing_dates_are_queried(tmp_path):
+    emtdb = FakeEmtdb(pd.date_range('2022-01-01', '2023-12-31'))
+    lmp_cache = LmpCache(cache_dir=str(tmp_path))
+
+    df = lmp_cache.pull_lmp_data(emtdb, '51288', 'DA', '2023-01-01', '2023-01-31')
+    assert_lmps_equal(df, '51288', '2023-01-01', '2023-01-31')
+    assert emtdb.queries == [('51288', pd.Timestamp('2023-01-01'), pd.Timestamp('2023-01-31'))]
+
+    df = lmp_cache.pull_lmp_data(emtdb, '51288', 'DA', '2022-12-15', '2023-02-15')
+    assert_lmps_equal(df, '51288', '2022-12-15', '2023-02-15')
+    assert emtdb.queries[1:] == [('51288', pd.Timestamp('2022-12-15'), pd.Timestamp('2022-12-31')),
+                                 ('51288', pd.Timestamp('2023-02-01'), pd.Timestamp('2023-02-15'))]
+
+    df = lmp_cache.pull_lmp_data(emtdb, '51288', 'DA', '2023-01-10', '2023-01-20')
+    assert_lmps_equal(df, '51288', '2023-01-10', '2023-01-20')
+    assert len(emtdb.queries) == 3
+
+    # a new cache on the same directory reads the index written by the first one
+    df = LmpCache(cache_dir=str(tmp_path)).pull_lmp_data(emtdb, '51288', 'DA', '2022-12-15', '2023-02-15')
+    assert_lmps_equal(df, '51288', '2022-12-15', '2023-02-15')
+    assert len(emtdb.queries) == 3
+
+
+def test_missing_days_are_pulled_again(tmp_path):
+    # EMTDB has no prices after 2023-02-10 yet
+    emtdb = FakeEmtdb(pd.date_range('2023-01-01', '2023-02-10'))
+    lmp_cache = LmpCache(cache_dir=str(tmp_path))
+
+    df = lmp_cache.pull_lmp_data(emtdb, '51288', 'DA', '2023-02-01', '2023-02-15')
+    assert_lmps_equal(df, '51288', '2023-02-01', '2023-02-10')
+    assert lmp_cache.entries().loc[0, 'end_dt'] == '2023-02-10'
+
+    emtdb.dates = pd.date_range('2023-01-01', '2023-02-28')
+    df = lmp_cache.pull_lmp_data(emtdb, '51288', 'DA', '2023-02-01', '2023-02-15')
+    assert_lmps_equal(df, '51288', '2023-02-01', '2023-02-15')
+    assert emtdb.queries[-1] == ('51288', pd.Timestamp('2023-02-11'), pd.Timestamp('2023-02-15'))
+
+    # nothing returned at all: no entry is cached
+    df = lmp_cache.pull_lmp_data(emtdb, '99999', 'DA', '2024-01-01', '2024-01-31')
+    assert df.empty and '99999' not in set(lmp_cache.entries()['pnode_id'])
+
+
+def test_unsettled_dates_are_not_cached(tmp_path):
+    today = pd.Timestamp.today().normalize()
+    emtdb = FakeEmtdb(pd.date_range(today - pd.Timedelta(days=30), today))
+    lmp_cache = LmpCache(cache_dir=str(tmp_path), settled_lag_days=2)
+
+    lmp_cache.pull_lmp_data(emtdb, '51288', 'DA', today - pd.Timedelta(days=10), today)
+    assert lmp_cache.entries().loc[0, 'end_dt'] == str((today - pd.Timedelta(days=2)).date())
+
+    lmp_cache.pull_lmp_data(emtdb, '51288', 'DA', today - pd.Timedelta(days=10), today)
+    assert emtdb.queries[-1][1:] == (today - pd.Timedelta(days=1), today)
+
+
+def test_invalidate(tmp_path):
+    emtdb = FakeEmtdb(pd.date_range('2023-01-01', '2023-12-31'))
+    lmp_cache = LmpCache(cache_dir=str(tmp_path))
+    lmp_cache.pull_lmp_data(emtdb, '51288', 'DA', '2023-01-01', '2023-03-31')
+    lmp_cache.pull_lmp_data(emtdb, '51291', 'DA', '2023-01-01', '2023-03-31')
+
+    # a price correction from 2023-03-01: only the dates from then on are pulled again
+    assert lmp_cache.invalidate(pnode_id='51288', from_dt='2023-03-01') == 1
+    df = lmp_cache.pull_lmp_data(emtdb, '51288', 'DA', '2023-01-01', '2023-03-31')
+    assert_lmps_equal(df, '51288', '2023-01-01', '2023-03-31')
+    assert emtdb.queries[-1] == ('51288', pd.Timestamp('2023-03-01'), pd.Timestamp('2023-03-31'))
+
+    assert lmp_cache.invalidate(pnode_id='51291') == 1
+    assert set(lmp_cache.entries()['pnode_id']) == {'51288'}
+    assert sorted(x.name for x in tmp_path.iterdir()) == ['51288_DA_PRICE.parquet', 'index.json']
+
+    lmp_cache.clear()
+    assert lmp_cache.entries().empty and lmp_cache.size_mb() == 0
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    emtdb = FakeEmtdb(pd.date_range('2023-01-01', '2023-12-31'))
+    lmp_cache = LmpCache(cache_dir=str(tmp_path))
+    lmp_cache.pull_lmp_data(emtdb, '51288', 'DA', '2023-01-01', '2023-06-30')
+    lmp_cache.max_size_mb = lmp_cache.size_mb() * 2.5
+
+    lmp_cache.pull_lmp_data(emtdb, '51291', 'DA', '2023-01-01', '2023-06-30')
+    lmp_cache.pull_lmp_data(emtdb, '51288', 'DA', '2023-02-01', '2023-02-28')  # 51288 is now the most recently used
+    lmp_cache.pull_lmp_data(emtdb, '51300', 'DA', '2023-01-01', '2023-06-30')
+
+    assert set(lmp_cache.entries()['pnode_id']) == {'51288', '51300'}
+    assert lmp_cache.size_mb() <= lmp_cache.max_size_mb
+    assert not (tmp_path / '51291_DA_PRICE.parquet').exists()
+
+    n_queries = len(emtdb.queries)
+    lmp_cache.pull_lmp_data(emtdb, '51291', 'DA', '2023-01-01', '2023-06-30')
+    assert len(emtdb.queries) == n_queries + 1
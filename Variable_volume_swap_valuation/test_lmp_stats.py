@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+# project code
+import lmp_stats as lmp_stats_module
+from lmp_stats import LmpStats
+from pvm import _get_cash_vol
+from shapers import pull_lmp_and_calc_shaper
+from splitters import pull_lmp_and_calc_splitter
+
+PNODE_ID = '51288'
+
+
+def synthetic_lmps(start_dt: str, end_dt: str, seed: int = 0) -> pd.DataFrame:
+    # hourly LMPs with a daily and seasonal shape, missing hours and a missing week, as pulled from EMTDB
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start_dt, end_dt)
+    hours = np.arange(1, 25)
+    seasonal = 8 * np.cos(2 * np.pi * dates.month.to_numpy() / 12)
+    shape = 30 + 10 * np.sin(np.pi * (hours - 6) / 18)[np.newaxis, :] + seasonal[:, np.newaxis]
+    price = shape * np.exp(rng.normal(scale=0.2, size=shape.shape))
+
+    df = pd.DataFrame({'Pnode ID': PNODE_ID, 'Date': np.repeat(dates, len(hours)),
+                       'Hour': np.tile(hours, len(dates)), 'Price': price.ravel()})
+    is_missing = (rng.random(len(df)) < 0.03) | df['Date'].between('2023-12-04', '2023-12-10')
+    return df[~is_missing].reset_index(drop=True)
+
+
+class FakePull:
+    # stand-in for "lmp_prep.pull_lmps" returning the synthetic LMPs EMTDB has up to last_dt
+    def __init__(self, df_lmp: pd.DataFrame, last_dt: str):
+        self.df_lmp = df_lmp
+        self.last_dt = pd.Timestamp(last_dt)
+        self.pulls = []
+
+    def __call__(self, emtdb, pnode_ids: list, start_dt: pd.Timestamp, end_dt: pd.Timestamp, lmp_cache=None):
+        self.pulls.append((pd.Timestamp(start_dt), pd.Timestamp(end_dt)))
+        dates = self.df_lmp['Date']
+        return self.df_lmp[(dates >= start_dt) & (dates <= min(pd.Timestamp(end_dt), self.last_dt))]
+
+
+def assert_same_as_full_recompute(lmp_stats: LmpStats, df_lmp: pd.DataFrame, eval_dt: str):
+    iso = lmp_stats.iso
+    for is_hourly in (True, False):
+        pd.testing.assert_frame_equal(
+            lmp_stats.calc_shaper(eval_dt=eval_dt, is_hourly=is_hourly),
+            pull_lmp_and_calc_shaper(None, iso, PNODE_ID, eval_dt, is_hourly=is_hourly, df_lmp=df_lmp),
+            check_names=False, rtol=1e-10
+        )
+    pd.testing.assert_frame_equal(lmp_stats.calc_splitter(eval_dt=eval_dt),
+                                  pull_lmp_and_calc_splitter(None, iso, PNODE_ID, eval_dt, df_lmp=df_lmp),
+                                  check_names=False, rtol=1e-10)
+
+
+@pytest.mark.parametrize('iso', ['PJM', 'MISO'])
+def test_update_across_a_month_boundary_matches_full_recompute(monkeypatch, iso):
+    df_lmp = synthetic_lmps('2022-01-01', '2024-07-31')
+    fake_pull = FakePull(df_lmp, last_dt='2024-06-20')
+    monkeypatch.setattr(lmp_stats_module, 'pull_lmps', fake_pull)
+    lmp_stats = LmpStats(iso=iso, pnode_id=PNODE_ID)
+
+    # June is stored up to the last day EMTDB has on 2024-06-20
+    lmp_stats.update(None, *lmp_stats.shaper_and_splitter_window(eval_dt='2024-06-20'))
+    assert_same_as_full_recompute(lmp_stats, fake_pull(None, [PNODE_ID], '2022-01-01', '2024-06-20'), '2024-06-20')
+
+    # next month: only June (incomplete before) and July are pulled, the months that left the window are dropped
+    fake_pull.last_dt = pd.Timestamp('2024-07-10')
+    window = lmp_stats.shaper_and_splitter_window(eval_dt='2024-07-10')
+    assert lmp_stats.update(None, *window) == ['2024-06', '2024-07']
+    assert fake_pull.pulls[-1] == (pd.Timestamp('2024-06-01'), pd.Timestamp('2024-07-10'))
+    assert lmp_stats.months()['Month'].iloc[0] == str(window[0].to_period('M'))
+
+    df_full = fake_pull(None, [PNODE_ID], '2022-01-01', '2024-07-10')
+    assert_same_as_full_recompute(lmp_stats, df_full, '2024-07-10')
+
+    # a full rebuild at the new eval date gives the same statistics
+    lmp_stats_rebuilt = LmpStats(iso=iso, pnode_id=PNODE_ID)
+    lmp_stats_rebuilt.update(None, *window)
+    pd.testing.assert_frame_equal(lmp_stats.calc_splitter(eval_dt='2024-07-10'),
+                                  lmp_stats_rebuilt.calc_splitter(eval_dt='2024-07-10'), rtol=1e-12)
+
+
+@pytest.mark.parametrize('zero_mean', [True, False])
+@pytest.mark.parametrize('iso, start_dt, end_dt', [
+    ('PJM', '2023-10-01', '2024-06-30'),
+    ('PJM', '2023-10-15', '2024-06-30'),  # mid-month start: the days before start_dt are dropped
+    ('PJM', '2023-10-15', '2024-06-12'),
+    ('MISO', '2023-10-01', '2024-06-30'),
+])
+def test_cash_vol_matches_full_recompute(iso, start_dt, end_dt, zero_mean):
+    df_lmp = synthetic_lmps('2023-09-01', '2024-07-31')
+    lmp_stats = LmpStats(iso=iso, pnode_id=PNODE_ID)
+    lmp_stats.update(None, pd.Timestamp(start_dt).to_period('M').start_time, end_dt, df_lmp=df_lmp)
+
+    pd.testing.assert_frame_equal(
+        lmp_stats.calc_cash_vol(start_dt=start_dt, end_dt=end_dt, zero_mean=zero_mean),
+        _get_cash_vol(None, iso, PNODE_ID, start_dt, end_dt, zero_mean, df_lmp=df_lmp),
+        check_freq=False, rtol=1e-10
+    )
+
+
+def test_cash_vol_mid_month_start_needs_month_start_for_converted_isos():
+    df_lmp = synthetic_lmps('2023-10-01', '2024-06-30')
+    lmp_stats = LmpStats(iso='MISO', pnode_id=PNODE_ID)
+    lmp_stats.update(None, '2023-10-01', '2024-06-30', df_lmp=df_lmp)
+
+    with pytest.raises(AssertionError, match='first day of a month'):
+        lmp_stats.calc_cash_vol(start_dt='2023-10-15', end_dt='2024-06-30', zero_mean=True)
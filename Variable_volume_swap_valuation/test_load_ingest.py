@@ -0,0 +1,66 @@
+import json
+import os
+import pandas as pd
+
+# project code
+from load_ingest import LoadStore, PARSER_VERSION
+
+
+def write_load_file(folder_path: str, file_name: str, days: dict):
+    # csv load file as published, with 4 header lines and hours ending 1-25 in the columns
+    lines = ['PJM EDC Hourly Load\n'] * 4 + [',' + ','.join(f'HE{h:02d}' for h in range(1, 26)) + '\n']
+    lines += [f'{date},' + ','.join(values) + '\n' for date, values in days.items()]
+    with open(os.path.join(folder_path, file_name), 'w') as f:
+        f.writelines(lines)
+
+
+def hourly_values(non_numeric: dict = None) -> list:
+    # loads of hours ending 1-25, hours 2 and 25 are missing
+    values = [str(100 + h) for h in range(1, 26)]
+    values[1] = values[24] = ''
+    for hour, value in (non_numeric or {}).items():
+        values[hour - 1] = value
+    return values
+
+
+def test_non_numeric_loads_are_kept_as_in_the_files(tmp_path):
+    folder_path = tmp_path / 'CIEP'
+    folder_path.mkdir()
+    write_load_file(folder_path, 'Hist_ACE_BGS-Load.csv', {'1/1/2024': hourly_values(),
+                                                           '1/2/2024': hourly_values({6: ' -   '})})
+    write_load_file(folder_path, 'Hist_PSEG_BGS-Load.csv', {'1/1/2024': hourly_values()})
+    load_store = LoadStore(store_dir=str(tmp_path / 'store'))
+
+    report = load_store.ingest([str(folder_path)], kind='load', max_workers=2)
+    assert report['Error'].isna().all() and report['Zone'].tolist() == ['ACE', 'PSEG']
+
+    df = load_store.read('load')
+    assert len(df) == 3 * 25
+    assert df['MW'].isna().sum() == 3 * 2 + 1
+    non_numeric = df[df['Raw MW'].notna()]
+    assert non_numeric[['Zone', 'Date', 'Hour']].values.tolist() == [['ACE', pd.Timestamp('2024-01-02'), 6]]
+    assert non_numeric['Raw MW'].tolist() == [' -   '] and non_numeric['MW'].isna().all()
+
+
+def test_only_new_changed_or_outdated_files_are_parsed(tmp_path):
+    folder_path = tmp_path / 'CIEP'
+    folder_path.mkdir()
+    write_load_file(folder_path, 'Hist_ACE_BGS-Load.csv', {'1/1/2024': hourly_values()})
+    write_load_file(folder_path, 'Hist_PSEG_BGS-Load.csv', {'1/1/2024': hourly_values()})
+    load_store = LoadStore(store_dir=str(tmp_path / 'store'))
+    load_store.ingest([str(folder_path)], kind='load', max_workers=2)
+
+    assert load_store.ingest([str(folder_path)], kind='load', max_workers=2).empty
+
+    write_load_file(folder_path, 'Hist_PSEG_BGS-Load.csv', {'1/1/2024': hourly_values({6: ' -   '})})
+    assert load_store.ingest([str(folder_path)], kind='load', max_workers=2)['Zone'].tolist() == ['PSEG']
+
+    # files parsed by an earlier parser version are parsed again, e.g. for the 'Raw MW' column
+    manifest_file = tmp_path / 'store' / LoadStore.MANIFEST_FILE
+    manifest = json.loads(manifest_file.read_text())
+    for entry in manifest.values():
+        if entry['zone'] == 'ACE':
+            entry['version'] = PARSER_VERSION - 1
+    manifest_file.write_text(json.dumps(manifest))
+    report = LoadStore(store_dir=str(tmp_path / 'store')).ingest([str(folder_path)], kind='load', max_workers=2)
+    assert report['Zone'].tolist() == ['ACE']
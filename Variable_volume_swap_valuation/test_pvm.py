@@ -0,0 +1,120 @@
+import threading
+import numpy as np
+import pandas as pd
+import pytest
+
+# project code
+import pvm
+import lmp_prep
+from util import list_peak_blocks
+from pvm import calc_cash_vol, calc_cash_vol_array, get_all_zone_and_hub_cash_pvm
+
+
+def baseline_cash_vol(df_daily_prices: pd.DataFrame, iso: str, start_dt: str, end_dt: str,
+                      zero_mean: bool) -> pd.DataFrame:
+    # cash vols of the baseline "pvm._get_cash_vol", one peak block at a time from its daily prices
+    df_cash_vol = pd.DataFrame(columns=list_peak_blocks(iso=iso), index=pd.date_range(start_dt, end_dt, freq='ME'))
+
+    for peak_block in list_peak_blocks(iso=iso):
+        daily_prices = df_daily_prices[peak_block].dropna()
+        dt = (daily_prices.index[1:] - daily_prices.index[:-1]).days / 360
+        with np.errstate(invalid='ignore'):
+            daily_returns = np.log(daily_prices).diff().iloc[1:] / np.sqrt(dt)
+        if zero_mean:
+            monthly_vols = np.sqrt((daily_returns ** 2).groupby(pd.Grouper(freq='ME')).mean())
+        else:
+            monthly_vols = daily_returns.groupby(pd.Grouper(freq='ME')).std()
+        df_cash_vol[peak_block] = monthly_vols
+
+    return df_cash_vol.astype(float)
+
+
+def daily_prices_with_gaps(seed: int, all_nan_block: bool = False) -> pd.DataFrame:
+    # PJM daily prices with missing days, a missing week, negative prices and months with a single price
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2023-09-10', '2024-07-20')
+    df = pd.DataFrame(np.exp(rng.normal(3.5, 0.3, size=(len(dates), 3))), index=dates,
+                      columns=list_peak_blocks(iso='PJM'))
+
+    df = df.mask(rng.random(df.shape) < 0.15)
+    df = df.where(rng.random(df.shape) >= 0.02, -df)
+    df.loc['2023-12-01':'2023-12-08'] = np.nan
+    df.loc['2024-02-01':'2024-02-28', '2x16'] = np.nan
+    df.loc['2024-02-15', '2x16'] = 40.
+    if all_nan_block:
+        df['7x8'] = np.nan
+    return df.rename_axis('Date')
+
+
+@pytest.mark.parametrize('zero_mean', [True, False])
+@pytest.mark.parametrize('start_dt, end_dt', [
+    ('2023-10-01', '2024-06-30'),  # whole months
+    ('2023-09-01', '2024-07-31'),  # partial first and last months of prices
+    ('2023-10-15', '2024-06-15'),  # window starting and ending mid-month
+])
+@pytest.mark.parametrize('all_nan_block', [False, True])
+def test_cash_vol_matches_per_block_baseline(zero_mean, start_dt, end_dt, all_nan_block):
+    df_daily_prices = daily_prices_with_gaps(seed=0, all_nan_block=all_nan_block)
+
+    df_cash_vol = calc_cash_vol(df_daily_prices=df_daily_prices, iso='PJM', start_dt=start_dt, end_dt=end_dt,
+                                zero_mean=zero_mean)
+    df_expected = baseline_cash_vol(df_daily_prices=df_daily_prices, iso='PJM', start_dt=start_dt, end_dt=end_dt,
+                                    zero_mean=zero_mean)
+
+    pd.testing.assert_frame_equal(df_cash_vol, df_expected, check_freq=False, rtol=1e-12, atol=1e-12)
+
+
+@pytest.mark.parametrize('zero_mean', [True, False])
+def test_cash_vol_array_matches_baseline_for_each_node(zero_mean):
+    start_dt, end_dt = '2023-10-01', '2024-06-30'
+    nodes = [daily_prices_with_gaps(seed=seed, all_nan_block=seed == 2) for seed in range(4)]
+    dates = nodes[0].index
+    daily_prices = np.stack([df.to_numpy() for df in nodes], axis=-1)
+
+    cash_vols = calc_cash_vol_array(daily_prices=daily_prices, dates=dates,
+                                    month_ends=pd.date_range(start_dt, end_dt, freq='ME'), zero_mean=zero_mean)
+
+    for i, df in enumerate(nodes):
+        df_expected = baseline_cash_vol(df_daily_prices=df, iso='PJM', start_dt=start_dt, end_dt=end_dt,
+                                        zero_mean=zero_mean)
+        np.testing.assert_allclose(cash_vols[:, :, i], df_expected.to_numpy(), rtol=1e-12, atol=1e-12)
+
+
+def test_zones_without_lmps_are_reported_and_not_pulled_by_the_workers(monkeypatch):
+    columns = pd.MultiIndex.from_tuples([('General', 'ISO'), ('General', 'Name'), ('RISKDB.MARKET_PRICE_DATA', 'Node ID'),
+                                         ('RISKDB.FWD_MARKET_PRICE', 'Vol Backbone')])
+    price_peak_map = pd.DataFrame([['PJM', 'A', '1001', False], ['PJM', 'B', '1002', False],
+                                   ['ISONE', 'C', '4001', False], ['ISONE', 'D', '4002', True]], columns=columns)
+    pulls = []
+
+    def pull_lmps(emtdb, pnode_ids, start_dt, end_dt, lmp_cache=None):
+        # EMTDB has no LMPs for zone B and the ISONE hub
+        assert threading.current_thread() is threading.main_thread()
+        pulls.append(list(pnode_ids))
+        dates = pd.date_range(start_dt, end_dt)
+        rng = np.random.default_rng(0)
+        return pd.concat([pd.DataFrame(columns=['Pnode ID', 'Date', 'Hour', 'Price'])] + [pd.DataFrame({
+            'Pnode ID': pnode_id, 'Date': np.repeat(dates, 24), 'Hour': np.tile(np.arange(1, 25), len(dates)),
+            'Price': np.exp(rng.normal(3.5, 0.3, size=24 * len(dates)))
+        }) for pnode_id in pnode_ids if pnode_id not in ('1002', '4000')], ignore_index=True).astype(
+            {'Pnode ID': str, 'Date': 'datetime64[ns]', 'Hour': int, 'Price': float})
+
+    monkeypatch.setattr(pvm, 'get_price_peak_map', lambda: price_peak_map)
+    monkeypatch.setattr(pvm, 'pull_lmps', pull_lmps)
+    monkeypatch.setattr(lmp_prep, 'pull_lmps', pull_lmps)
+
+    pvm_zones, report = get_all_zone_and_hub_cash_pvm(emtdb=None, start_dt='2023-01-01', end_dt='2023-06-30',
+                                                      zero_mean=True, q_upper=1, max_workers=2, return_report=True)
+
+    assert list(pvm_zones) == ['PJM'] and list(pvm_zones['PJM']) == ['A']
+    errors = report.set_index('Name')['Error']
+    assert pd.isna(errors['A'])
+    assert errors['B'] == "Exception('missing LMPs: 1002')"
+    assert errors['C'] == errors['D'] == "skipped, Exception('missing hub LMPs: 4000')"
+    # one bulk pull, then the missing ISONE hub once before the workers start
+    assert len(pulls) == 2 and pulls[1] == ['4000']
+
+    # without the report, only the PVMs are returned
+    pvm_zones = get_all_zone_and_hub_cash_pvm(emtdb=None, start_dt='2023-01-01', end_dt='2023-06-30', zero_mean=True,
+                                              q_upper=1, max_workers=2)
+    assert list(pvm_zones) == ['PJM'] and list(pvm_zones['PJM']) == ['A']
@@ -0,0 +1,133 @@
+import datetime
+import oracledb
+import pandas as pd
+from types import SimpleNamespace
+
+# project code
+from util import EmtdbConnection
+
+COLUMNS = [('Date', oracledb.DB_TYPE_DATE), ('Hour', oracledb.DB_TYPE_NUMBER), ('Price', oracledb.DB_TYPE_NUMBER)]
+
+
+class FakeCursor:
+    # in-process stand-in for an oracledb cursor: 'SELECT' returns params['n_rows'] hourly prices, 'FAIL' raises
+    def __init__(self):
+        self.arraysize = 100
+        self.prefetchrows = 2
+        self.description = None
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, statement: str, parameters: dict):
+        if statement == 'FAIL':
+            raise Exception('ORA-00942: table or view does not exist')
+        start = datetime.datetime(2024, 1, 1)
+        self._rows = [(start + datetime.timedelta(days=i // 24), i % 24 + 1, 20 + i / 4)
+                      for i in range(parameters['n_rows'])]
+        self.description = COLUMNS
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def fetchmany(self, size: int):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+
+class FakeConnection:
+    def __init__(self, log: list):
+        self.log = log
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def cursor(self):
+        self.log.append('cursor')
+        return FakeCursor()
+
+    def close(self):
+        pass
+
+
+class FakePool:
+    def __init__(self, log: list):
+        self.log = log
+
+    def acquire(self):
+        self.log.append('acquire')
+        return FakeConnection(self.log)
+
+    def close(self):
+        pass
+
+
+def fake_driver(log: list) -> SimpleNamespace:
+    return SimpleNamespace(
+        makedsn=lambda host, port, sid: f'{host}:{port}/{sid}',
+        connect=lambda user, password, dsn: FakeConnection(log),
+        create_pool=lambda user, password, dsn, min, max, increment: FakePool(log),
+    )
+
+
+def test_execute_many_with_failing_query():
+    log = []
+    emtdb = EmtdbConnection(user='user', pw='pw', pool_max=3, driver=fake_driver(log))
+    results = emtdb.execute_many(queries={
+        'first': ('SELECT', {'n_rows': 48}),
+        'failing': ('FAIL', {}),
+        'last': ('SELECT', {'n_rows': 5}),
+    }, dtypes={'Hour': 'int8', 'Price': 'float64'})
+
+    assert list(results) == ['first', 'failing', 'last']
+    assert results['failing'].df is None and 'ORA-00942' in str(results['failing'].error)
+    assert results['first'].error is None and results['last'].error is None
+    assert len(results['first'].df) == 48 and len(results['last'].df) == 5
+    assert pd.api.types.is_datetime64_dtype(results['first'].df['Date'])
+    assert results['first'].df['Hour'].dtype == 'int8'
+    assert log.count('acquire') == 3
+
+
+def test_run_many_without_pool():
+    emtdb = EmtdbConnection(user='user', pw='pw', driver=fake_driver([]))
+
+    def failing():
+        raise Exception('connection lost')
+
+    results = emtdb.run_many(calls={
+        'select': lambda: emtdb.execute(qry='SELECT', params={'n_rows': 24}),
+        'failing': failing,
+    })
+
+    assert len(results['select'].df) == 24 and results['select'].error is None
+    assert results['failing'].df is None and str(results['failing'].error) == 'connection lost'
+
+
+def test_typed_execute_matches_untyped():
+    emtdb = EmtdbConnection(user='user', pw='pw', driver=fake_driver([]))
+    dtypes = {'Date': 'datetime64[ns]', 'Hour': 'int8', 'Price': 'float64'}
+
+    # batches of 10 rows grow the column buffers several times
+    for n_rows in (0, 1, 7, 30, 31, 250):
+        df = emtdb.execute(qry='SELECT', params={'n_rows': n_rows})
+        df_typed = emtdb.execute(qry='SELECT', params={'n_rows': n_rows}, array_size=10, dtypes=dtypes)
+        pd.testing.assert_frame_equal(df_typed, df.astype(dtypes))
+
+
+def test_execute_chunks():
+    emtdb = EmtdbConnection(user='user', pw='pw', driver=fake_driver([]))
+
+    chunks = list(emtdb.execute_chunks(qry='SELECT', params={'n_rows': 25}, chunk_size=10))
+    assert [len(x) for x in chunks] == [10, 10, 5]
+    assert pd.api.types.is_datetime64_dtype(chunks[0]['Date'])
+
+    chunks = list(emtdb.execute_chunks(qry='SELECT', params={'n_rows': 0}, chunk_size=10))
+    assert len(chunks) == 1 and chunks[0].empty and list(chunks[0].columns) == ['Date', 'Hour', 'Price']
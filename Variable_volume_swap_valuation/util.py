@@ -1,10 +1,12 @@
 import pandas as pd
+import numpy as np
 import oracledb
+import os
 from time import time
 from functools import lru_cache
-from typing import List, Iterable, Tuple, Callable, Optional, Generator
-
-oracledb.init_oracle_client()  # enable thick mode
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Iterable, Tuple, Callable, Optional, Generator, Dict, NamedTuple, Any
 
 
 def timer_func(func: Callable) -> Callable:
@@ -24,29 +26,236 @@ def get_price_peak_map() -> pd.DataFrame:
     return df
 
 
+# Oracle column types fetched as datetimes
+_DATE_DB_TYPES = tuple(
+    getattr(oracledb, x) for x in ('DB_TYPE_DATE', 'DB_TYPE_TIMESTAMP', 'DB_TYPE_TIMESTAMP_TZ', 'DB_TYPE_TIMESTAMP_LTZ')
+    if hasattr(oracledb, x)
+)
+
+
+class QueryResult(NamedTuple):
+    # result of one call in "run_calls" / "EmtdbConnection.run_many", with either df or error set
+    df: Any
+    seconds: float
+    error: Optional[Exception]
+
+
 class EmtdbConnection:
-    def __init__(self, user: str, pw: str):
+    def __init__(self, user: str, pw: str, pool_max: Optional[int] = None, driver=oracledb):
+        """
+        Args:
+            user: EMTDB user name
+            pw: EMTDB password
+            pool_max: If given, connections are taken from an oracledb session pool of at most pool_max sessions, so
+                that "run_many" / "execute_many" can run queries concurrently. Otherwise a single connection is used and
+                queries run one at a time.
+            driver: Module implementing the oracledb API used to connect (e.g. an in-process fake for testing). Thick
+                mode (Oracle Instant Client) is only enabled for oracledb itself.
+        """
+        if driver is oracledb and oracledb.is_thin_mode():
+            oracledb.init_oracle_client()  # enable thick mode, once before the first connection
+
         print('connecting to EMTDB...')
         host = "emtdbdb_aws.neeaws.local"
         port = 1721
         sid = 'EMTDB'
-        self._con = oracledb.connect(user=user, password=pw, dsn=oracledb.makedsn(host=host, port=port, sid=sid))
+        dsn = driver.makedsn(host=host, port=port, sid=sid)
+        self._con = None
+        self._pool = None
+        if pool_max is None:
+            self._con = driver.connect(user=user, password=pw, dsn=dsn)
+        else:
+            assert pool_max >= 1
+            self._pool = driver.create_pool(user=user, password=pw, dsn=dsn, min=1, max=pool_max, increment=1)
+        self.pool_max = pool_max
         print('connected.')
 
     def __del__(self):
-        self._con.close()
-
-    @timer_func
-    def execute(self, qry: str, params: dict, array_size: int = 100000) -> pd.DataFrame:
-        with self._con.cursor() as crsr:
-            crsr.arraysize = array_size
-            crsr.prefetchrows = array_size + 1
-            crsr.execute(statement=qry, parameters=params)
-            columns = [x[0] for x in crsr.description]
-            records = crsr.fetchall()
+        if getattr(self, '_con', None) is not None:
+            self._con.close()
+        if getattr(self, '_pool', None) is not None:
+            self._pool.close()
+
+    @contextmanager
+    def _connection(self):
+        # pooled sessions are released back to the pool on exit
+        if self._pool is None:
+            yield self._con
+        else:
+            with self._pool.acquire() as con:
+                yield con
+
+    def _execute(self, qry: str, params: dict, array_size: int = 100000,
+                 dtypes: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+        if dtypes is not None:
+            return self._execute_typed(qry=qry, params=params, array_size=array_size, dtypes=dtypes)
+
+        with self._connection() as con:
+            with con.cursor() as crsr:
+                crsr.arraysize = array_size
+                crsr.prefetchrows = array_size + 1
+                crsr.execute(statement=qry, parameters=params)
+                columns = [x[0] for x in crsr.description]
+                records = crsr.fetchall()
         df = pd.DataFrame.from_records(records, columns=columns)
         return df
 
+    def _execute_typed(self, qry: str, params: dict, array_size: int, dtypes: Dict[str, str]) -> pd.DataFrame:
+        # each batch of rows is copied into preallocated typed column buffers (grown by half when full and trimmed one
+        # column at a time at the end), so that peak memory is at most about 1.5 times the typed result plus one batch,
+        # instead of a list of typed batches plus their concatenation
+        buffers, column_dtypes, n_rows = {}, {}, 0
+        for df in self.execute_chunks(qry=qry, params=params, chunk_size=array_size, dtypes=dtypes):
+            if not column_dtypes:
+                column_dtypes = df.dtypes.to_dict()
+                buffers = {column: np.empty(len(df), dtype=_buffer_dtype(dtype))
+                           for column, dtype in column_dtypes.items()}
+            end = n_rows + len(df)
+            for column, buffer in buffers.items():
+                if len(buffer) < end:
+                    grown = np.empty(max(end, len(buffer) * 3 // 2), dtype=buffer.dtype)
+                    grown[:n_rows] = buffer[:n_rows]
+                    buffers[column] = buffer = grown
+                buffer[n_rows:end] = df[column].to_numpy(dtype=buffer.dtype)
+            n_rows = end
+            del df
+
+        for column, buffer in buffers.items():
+            if len(buffer) > n_rows:
+                buffers[column] = buffer[:n_rows].copy()
+            del buffer
+        df = pd.DataFrame(buffers, copy=False)
+        return df.astype({column: dtype for column, dtype in column_dtypes.items() if df[column].dtype != dtype})
+
+    @timer_func
+    def execute(self, qry: str, params: dict, array_size: int = 100000,
+                dtypes: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+        """
+        Executes a query and returns all rows
+
+        Args:
+            qry: SQL query with bind variables, e.g. ':start_dt'
+            params: Dictionary of bind variable to value
+            array_size: Number of rows fetched per round trip
+            dtypes: Optional dictionary of column to dtype, e.g. {'Hour': 'int8', 'Price': 'float32'}. If given, the rows
+                are streamed in batches of array_size and each batch is copied into preallocated typed column buffers,
+                instead of first materializing all rows as Python objects.
+
+        Returns: pd.DataFrame
+        """
+        return self._execute(qry=qry, params=params, array_size=array_size, dtypes=dtypes)
+
+    def execute_chunks(self, qry: str, params: dict, chunk_size: int = 100000,
+                       dtypes: Optional[Dict[str, str]] = None) -> Generator[pd.DataFrame, None, None]:
+        """
+        Executes a query and yields the rows in chunks (e.g. for out-of-core aggregation). The connection is held until
+        the generator is exhausted or closed.
+
+        Args:
+            qry: SQL query with bind variables, e.g. ':start_dt'
+            params: Dictionary of bind variable to value
+            chunk_size: Maximum number of rows per chunk (also the number of rows fetched per round trip)
+            dtypes: Optional dictionary of column to dtype applied to each chunk, e.g. {'Hour': 'int8'}. Date columns
+                are always converted to datetime64.
+
+        Returns: generator of pd.DataFrame with the query columns (at least one, possibly empty, chunk is yielded)
+        """
+        assert chunk_size > 0
+        dtypes = dtypes if dtypes is not None else {}
+        with self._connection() as con:
+            with con.cursor() as crsr:
+                crsr.arraysize = chunk_size
+                crsr.prefetchrows = chunk_size + 1
+                crsr.execute(statement=qry, parameters=params)
+                columns = [x[0] for x in crsr.description]
+                date_columns = [x[0] for x in crsr.description if x[1] in _DATE_DB_TYPES]
+                n_chunks = 0
+                while True:
+                    records = crsr.fetchmany(chunk_size)
+                    if not records and n_chunks > 0:
+                        break
+                    n_chunks += 1
+                    df = pd.DataFrame.from_records(records, columns=columns)
+                    del records
+                    for column in date_columns:
+                        if column not in dtypes:
+                            df[column] = pd.to_datetime(df[column])
+                    yield df.astype({k: v for k, v in dtypes.items() if k in df.columns})
+                    if len(df) < chunk_size:
+                        break
+
+    def run_many(self, calls: Dict[str, Callable[[], Any]], max_workers: Optional[int] = None) -> Dict[str, QueryResult]:
+        """
+        Runs a batch of calls that query EMTDB (e.g. functools.partial of "emtdb_api" functions) concurrently. An
+        exception raised by one call is returned in its QueryResult and does not stop the other calls.
+
+        Args:
+            calls: Dictionary of name to call without arguments
+            max_workers: Number of threads (defaults to pool_max). Calls run one at a time without a session pool.
+
+        Returns: dictionary of name to QueryResult, in the order of calls
+        """
+        max_workers = 1 if self._pool is None else (max_workers or self.pool_max)
+        return run_calls(calls=calls, max_workers=max_workers, description='queries')
+
+    def execute_many(self, queries: Dict[str, Tuple[str, dict]], max_workers: Optional[int] = None,
+                     array_size: int = 100000, dtypes: Optional[Dict[str, str]] = None) -> Dict[str, QueryResult]:
+        """
+        Executes a batch of queries concurrently, see "run_many"
+
+        Args:
+            queries: Dictionary of name to (qry, params)
+            max_workers: Number of threads (defaults to pool_max)
+            array_size: Cursor array size
+            dtypes: Optional dictionary of column to dtype, see "execute"
+
+        Returns: dictionary of name to QueryResult
+        """
+        calls = {
+            name: (lambda qry=qry, params=params: self._execute(qry=qry, params=params, array_size=array_size,
+                                                                dtypes=dtypes))
+            for name, (qry, params) in queries.items()
+        }
+        return self.run_many(calls=calls, max_workers=max_workers)
+
+
+def _buffer_dtype(dtype) -> np.dtype:
+    # numpy dtype of a column buffer, object for pandas extension dtypes (converted back at the end)
+    return dtype if isinstance(dtype, np.dtype) else np.dtype(object)
+
+
+def run_calls(calls: Dict[str, Callable[[], Any]], max_workers: int, description: str = 'calls') -> Dict[str, QueryResult]:
+    """
+    Runs a batch of calls on a thread pool. An exception raised by one call is returned in its QueryResult and does not
+    stop the other calls.
+
+    Args:
+        calls: Dictionary of name to call without arguments
+        max_workers: Number of threads
+        description: Description of the calls in the printed summary, e.g. 'queries'
+
+    Returns: dictionary of name to QueryResult, in the order of calls
+    """
+    def run(call: Callable[[], Any]) -> QueryResult:
+        t0 = time()
+        try:
+            return QueryResult(df=call(), seconds=time() - t0, error=None)
+        except Exception as e:
+            return QueryResult(df=None, seconds=time() - t0, error=e)
+
+    t0 = time()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {name: executor.submit(run, call) for name, call in calls.items()}
+        results = {name: future.result() for name, future in futures.items()}
+
+    n_failed = sum(res.error is not None for res in results.values())
+    print(f'Ran {len(results)} {description} ({n_failed} failed) on {max_workers} threads in {round(time() - t0, 1)} sec')
+    for name, res in results.items():
+        if res.error is not None:
+            print(f'{name!r} failed after {round(res.seconds, 1)} sec: {res.error!r}')
+
+    return results
+
 
 def hourly_index(start_dt: str, end_dt: str) -> pd.MultiIndex:
     return pd.MultiIndex.from_product(
@@ -180,6 +389,87 @@ def date_hour_to_time_block(date: pd.Timestamp, hour: int, iso: str) -> str:
         raise Exception(f'ISO not recognized: {iso}')
 
 
+# categories are kept in lexicographic order so that sorting a categorical column gives the same order as strings
+_PEAK_BLOCK_CATEGORIES = ['2x16', '5x16', '7x8']
+_CAISO_PEAK_BLOCK_CATEGORIES = ['6x16-Saturday', '6x16-Weekday', 'Off-Night', 'Off-Sunday']
+_TIME_BLOCK_CATEGORIES = ['WD_1', 'WD_2', 'WD_3', 'WD_4', 'WD_N', 'WE_1', 'WE_2', 'WE_3', 'WE_4', 'WE_N']
+
+
+def _split_dates_hours(dates: Iterable, hours: Optional[Iterable]) -> Tuple[np.ndarray, np.ndarray]:
+    # returns (days as datetime64[D], hour-ending values). If hours is None, dates are hour-beginning timestamps
+    dates = pd.DatetimeIndex(dates)
+    if dates.tz is not None:
+        dates = dates.tz_localize(None)  # keep local wall-clock time
+    if hours is None:
+        hours = dates.hour + 1
+    return dates.values.astype('datetime64[D]'), np.asarray(hours)
+
+
+def _day_flags(days: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # returns (is_holiday, is_saturday, is_sunday) for an array of datetime64[D] days
+    years = np.unique(days.astype('datetime64[Y]').astype(int) + 1970)
+    holidays = np.array([h.to_datetime64() for year in years for h in get_holidays(int(year))], dtype='datetime64[D]')
+    day_of_week = (days.astype('int64') + 3) % 7  # 1970-01-01 was a Thursday, Monday = 0
+    return np.isin(days, holidays), day_of_week == 5, day_of_week == 6
+
+
+def dates_hours_to_peak_blocks(dates: Iterable, hours: Optional[Iterable], iso: str) -> pd.Categorical:
+    """
+    Vectorized version of "date_hour_to_peak_block"
+
+    Args:
+        dates: Dates, e.g. df_lmp['Date'], or hour-beginning timestamps (e.g. a DatetimeIndex) if hours is None
+        hours: Hour ending values 1-24, e.g. df_lmp['Hour'], or None
+        iso: ISO, e.g. 'PJM'
+
+    Returns: pd.Categorical of peak blocks, aligned with dates
+    """
+    assert iso in ('PJM', 'ISONE', 'NYISO', 'MISO', 'ERCOT', 'SPP', 'CAISO')
+    days, hours = _split_dates_hours(dates, hours)
+    is_holiday, is_saturday, is_sunday = _day_flags(days)
+
+    if iso in ('PJM', 'ISONE', 'NYISO', 'MISO', 'ERCOT', 'SPP'):
+        first_he, last_he = (8, 23) if iso in ('PJM', 'ISONE', 'NYISO', 'MISO') else (7, 22)
+        is_night = ~((first_he <= hours) & (hours <= last_he))
+        is_off_day = is_holiday | is_saturday | is_sunday
+        codes = np.where(is_night, 2, np.where(is_off_day, 0, 1))  # 7x8, 2x16, 5x16
+        return pd.Categorical.from_codes(codes, categories=_PEAK_BLOCK_CATEGORIES)
+    else:
+        is_night = ~((7 <= hours) & (hours <= 22))
+        is_off_day = is_holiday | is_sunday
+        codes = np.where(is_night, 2, np.where(is_off_day, 3, np.where(is_saturday, 0, 1)))
+        return pd.Categorical.from_codes(codes, categories=_CAISO_PEAK_BLOCK_CATEGORIES)
+
+
+def dates_hours_to_time_blocks(dates: Iterable, hours: Optional[Iterable], iso: str) -> pd.Categorical:
+    """
+    Vectorized version of "date_hour_to_time_block"
+
+    Args:
+        dates: Dates, e.g. df_lmp['Date'], or hour-beginning timestamps (e.g. a DatetimeIndex) if hours is None
+        hours: Hour ending values 1-24, e.g. df_lmp['Hour'], or None
+        iso: ISO, e.g. 'PJM'
+
+    Returns: pd.Categorical of time blocks, aligned with dates
+    """
+    assert iso in ('PJM', 'ISONE', 'NYISO', 'MISO', 'ERCOT', 'SPP', 'CAISO')
+    if iso in ('PJM', 'ISONE', 'NYISO', 'MISO'):
+        first_he = 8
+    elif iso == 'ERCOT':
+        first_he = 7
+    else:
+        raise Exception(f'ISO not recognized: {iso}')
+
+    days, hours = _split_dates_hours(dates, hours)
+    is_holiday, is_saturday, is_sunday = _day_flags(days)
+
+    # 4 blocks of 4 hours starting at first_he, anything else is the night block (code 4)
+    block_starts = range(first_he, first_he + 16, 4)
+    codes = np.select([np.isin(hours, range(start, start + 4)) for start in block_starts], range(4), default=4)
+    codes = codes + 5 * (is_holiday | is_saturday | is_sunday)  # weekend codes follow the weekday codes
+    return pd.Categorical.from_codes(codes, categories=_TIME_BLOCK_CATEGORIES)
+
+
 def peak_block_to_traded_peak(peak_block: str, iso: str) -> str:
     # takes as input the output of "date_hour_to_peak_block"
     if iso in ('PJM', 'ISONE', 'MISO', 'ERCOT', 'SPP'):
@@ -211,48 +501,175 @@ def peak_block_to_complement(peak_block: str) -> Optional[str]:
         raise Exception(f'Peak Block not recognized: {peak_block}')
 
 
-def convert_lmps_tz(df_lmp: pd.DataFrame, convert_from: str, convert_to: str):
+HOUR_CALENDAR_ISOS = ('PJM', 'ISONE', 'NYISO', 'MISO', 'ERCOT', 'SPP', 'CAISO')
+
+_PEAK_BLOCK_DTYPE = pd.CategoricalDtype(_PEAK_BLOCK_CATEGORIES + _CAISO_PEAK_BLOCK_CATEGORIES)
+_TRADED_PEAK_DTYPE = pd.CategoricalDtype(['5x16', '6x16', 'Off'])
+_TIME_BLOCK_DTYPE = pd.CategoricalDtype(_TIME_BLOCK_CATEGORIES)
+
+
+def _hour_calendar_columns(days: np.ndarray, hours: np.ndarray, iso: str) -> Dict[str, Iterable]:
+    # calendar attributes for arrays of datetime64[D] days and hour ending values
+    is_holiday, is_saturday, is_sunday = _day_flags(days)
+    years = np.unique(days.astype('datetime64[Y]').astype(int) + 1970)
+    spring_dsts = np.array([spring_dst(int(year)).to_datetime64() for year in years], dtype='datetime64[D]')
+    fall_dsts = np.array([fall_dst(int(year)).to_datetime64() for year in years], dtype='datetime64[D]')
+
+    peak_blocks = dates_hours_to_peak_blocks(dates=days, hours=hours, iso=iso)
+    traded_peaks = peak_blocks.map(lambda x: 'Off' if x.startswith('Off') or x in ('2x16', '7x8') else x.split('-')[0])
+    if iso in ('PJM', 'ISONE', 'NYISO', 'MISO', 'ERCOT'):
+        time_blocks = dates_hours_to_time_blocks(dates=days, hours=hours, iso=iso)
+    else:
+        time_blocks = pd.Categorical.from_codes(np.full(len(days), -1), dtype=_TIME_BLOCK_DTYPE)  # not defined
+
+    return {
+        'Month': (days.astype('datetime64[M]').astype(int) % 12 + 1).astype('int8'),
+        'Day of Week': ((days.astype('int64') + 3) % 7).astype('int8'),  # Monday = 0
+        'Is Holiday': is_holiday,
+        'Is Weekend': is_saturday | is_sunday,
+        'Is Spring DST': np.isin(days, spring_dsts),
+        'Is Fall DST': np.isin(days, fall_dsts),
+        'Peak Block': pd.Categorical(np.asarray(peak_blocks), dtype=_PEAK_BLOCK_DTYPE),
+        'Traded Peak': pd.Categorical(np.asarray(traded_peaks), dtype=_TRADED_PEAK_DTYPE),
+        'Time Block': pd.Categorical(time_blocks, dtype=_TIME_BLOCK_DTYPE),
+    }
+
+
+def build_hour_calendar(first_year: int, last_year: int) -> pd.DataFrame:
     """
-    Converts df_lmp in EST to CPT
+    Builds a table of calendar attributes with one row per (ISO, Date, Hour) for the given years
 
     Args:
-        df_lmp: pd.DataFrame containing df_lmp with integer indices and columns 'Date', 'Hour', 'Price'. Naive dates and Hours are assigned the convert_from timezone.
-        convert_from: Timezone to convert from e.g. 'EST'
-        convert_to: Timezone to convert to e.g. 'EPT' or 'CPT'
+        first_year: First calendar year, e.g. 2023
+        last_year: Last calendar year, e.g. 2025
+
+    Returns: pd.DataFrame
+        columns = (ISO, Date, Hour, Month, Day of Week, Is Holiday, Is Weekend, Is Spring DST, Is Fall DST,
+                   Peak Block, Traded Peak, Time Block)
+        rows are ordered by ISO (as in HOUR_CALENDAR_ISOS), Date and Hour 1-24, so that a row can be located
+        arithmetically (see "lookup_hour_calendar"). Time Block is missing for ISOs without time blocks (SPP, CAISO).
+    """
+    assert first_year <= last_year
+    days = np.arange(np.datetime64(f'{first_year}-01-01'), np.datetime64(f'{last_year + 1}-01-01'))
+    grid_days = np.repeat(days, 24)
+    grid_hours = np.tile(np.arange(1, 25, dtype='int8'), len(days))
+
+    data = []
+    for iso in HOUR_CALENDAR_ISOS:
+        df = pd.DataFrame(_hour_calendar_columns(days=grid_days, hours=grid_hours, iso=iso))
+        df.insert(0, 'Hour', grid_hours)
+        df.insert(0, 'Date', grid_days.astype('datetime64[ns]'))
+        df.insert(0, 'ISO', iso)
+        data.append(df)
+
+    df = pd.concat(data, ignore_index=True)
+    df['ISO'] = pd.Categorical(df['ISO'], categories=list(HOUR_CALENDAR_ISOS))
+    return df
+
 
-    Returns: pd.Dataframe containing df_lmp in EPT in the same format as df_lmp. Note that this does not handle duplicates or missing hours.
+@lru_cache()
+def get_hour_calendar(first_year: int, last_year: int, cache_dir: Optional[str] = None) -> pd.DataFrame:
     """
+    Returns the hour calendar from "build_hour_calendar", memoized in memory and optionally persisted to disk.
+    The returned frame is shared between callers and should not be modified in place.
 
-    # Decreasing hours by 1 to convert from 1 through 24 format to 0 through 23 that Pandas works in
-    df_lmp.loc[:, 'Hour'] -= 1
+    Args:
+        first_year: First calendar year, e.g. 2023
+        last_year: Last calendar year, e.g. 2025
+        cache_dir: Directory to read/write the calendar as Parquet (requires pyarrow), or None to keep it in memory only
 
-    # Combining Date and Hour to get a timestamp
-    df_lmp['DateTime'] = df_lmp['Date'] + pd.to_timedelta(df_lmp['Hour'], unit='h')
+    Returns: pd.DataFrame (see "build_hour_calendar")
+    """
+    if cache_dir is None:
+        return build_hour_calendar(first_year, last_year)
 
-    # Discarding other columns
-    df_lmp = df_lmp[['DateTime', 'Price']]
+    file_name = os.path.join(cache_dir, f'hour_calendar_{first_year}_{last_year}.parquet')
+    if os.path.exists(file_name):
+        return pd.read_parquet(file_name)
 
-    df_lmp.set_index('DateTime', inplace=True)
+    df = build_hour_calendar(first_year, last_year)
+    os.makedirs(cache_dir, exist_ok=True)
+    df.to_parquet(file_name, index=False)
+    return df
+
+
+def lookup_hour_calendar(dates: Iterable, hours: Optional[Iterable], iso: str, columns: List[str],
+                         cache_dir: Optional[str] = None) -> pd.DataFrame:
+    """
+    Looks up hour calendar attributes by integer position instead of recomputing them per row
+
+    Args:
+        dates: Dates, e.g. df_lmp['Date'], or hour-beginning timestamps (e.g. a DatetimeIndex) if hours is None.
+            Day-level attributes (e.g. 'Is Holiday') of a column of dates can be looked up with hours=None.
+        hours: Hour ending values 1-24, e.g. df_lmp['Hour'], or None
+        iso: ISO, e.g. 'PJM'
+        columns: Hour calendar columns to return, e.g. ['Peak Block', 'Is Holiday']
+        cache_dir: Passed on to "get_hour_calendar"
+
+    Returns: pd.DataFrame
+        columns = columns
+        index = index of dates if dates is a pd.Series, otherwise a range index
+    """
+    assert iso in HOUR_CALENDAR_ISOS
+    index = dates.index if isinstance(dates, pd.Series) else None
+    days, hours = _split_dates_hours(dates, hours)
+    if len(days) == 0:
+        return pd.DataFrame(_hour_calendar_columns(days, hours, iso), index=index)[columns]
+
+    years = days.astype('datetime64[Y]').astype(int) + 1970
+    first_year, last_year = int(years.min()), int(years.max())
+    calendar = get_hour_calendar(first_year, last_year, cache_dir)
+
+    # hours outside 1-24 (e.g. a repeated DST hour) are not in the calendar and are computed directly
+    is_standard_hour = np.isin(hours, range(1, 25))
+    n_days = (np.datetime64(f'{last_year + 1}-01-01') - np.datetime64(f'{first_year}-01-01')).astype(int)
+    rows = (
+            HOUR_CALENDAR_ISOS.index(iso) * n_days * 24
+            + (days - np.datetime64(f'{first_year}-01-01')).astype(int) * 24
+            + np.where(is_standard_hour, hours, 1).astype(int) - 1
+    )
+    df = pd.DataFrame({column: calendar[column].array.take(rows) for column in columns}, index=index)
+
+    if not is_standard_hour.all():
+        non_standard = _hour_calendar_columns(days[~is_standard_hour], hours[~is_standard_hour], iso)
+        for column in columns:
+            df.loc[~is_standard_hour, column] = non_standard[column]
+
+    for column in columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].cat.remove_unused_categories()
+    return df
+
+
+def convert_lmps_tz(df_lmp: pd.DataFrame, convert_from: str, convert_to: str):
+    """
+    Converts df_lmp in EST to CPT
+
+    Args:
+        df_lmp: pd.DataFrame containing df_lmp with columns 'Date', 'Hour', 'Price' and any other columns (e.g. 'Pnode ID'),
+            which are kept. Naive dates and Hours are assigned the convert_from timezone.
+        convert_from: Timezone to convert from e.g. 'EST'
+        convert_to: Timezone to convert to e.g. 'EPT' or 'CPT'
+
+    Returns: pd.Dataframe containing df_lmp in EPT in the same format as df_lmp. Note that this does not handle duplicates or missing hours,
+        see "hourly_repair.repair_hourly_long".
+    """
+    # Combining Date and Hour (converted from 1 through 24 format to 0 through 23 that Pandas works in) to get a timestamp
+    date_time = pd.DatetimeIndex(df_lmp['Date'] + pd.to_timedelta(df_lmp['Hour'] - 1, unit='h'))
 
     # Localizing naive timestamps to the convert_from timezone
-    df_lmp.index = df_lmp.index.tz_localize(convert_from)
+    date_time = date_time.tz_localize(convert_from)
 
     # Converting to the convert_to
     if convert_to == 'CPT':
-        df_lmp.index = df_lmp.index.tz_convert('US/Central')
+        date_time = date_time.tz_convert('US/Central')
     elif convert_to == 'EPT':
-        df_lmp.index = df_lmp.index.tz_convert('US/Eastern')
-
-    df_lmp.reset_index(inplace=True)
-
-    df_lmp['Date'] = pd.to_datetime(df_lmp['DateTime'].dt.date)
-    df_lmp['Hour'] = df_lmp['DateTime'].dt.hour
+        date_time = date_time.tz_convert('US/Eastern')
 
     # Increasing hours by 1 to convert from 0 through 23 format to 1 through 24 that we're used to
-    df_lmp.loc[:, 'Hour'] += 1
-
-    # Discarding 'DateTime' column
-    df_lmp = df_lmp[['Date', 'Hour', 'Price']]
+    df_lmp = df_lmp.reset_index(drop=True)
+    df_lmp['Date'] = date_time.tz_localize(None).normalize()
+    df_lmp['Hour'] = date_time.hour + 1
 
     return df_lmp
 
@@ -0,0 +1,231 @@
+import numpy as np
+import pandas as pd
+from typing import NamedTuple, Optional
+
+# project code
+from option_pricing import ArrayLike, black_76, black_scholes
+from monte_carlo import MonteCarloEstimate, monte_carlo_mean
+
+
+class VariableVolumeSwapValuation(NamedTuple):
+    # valuation of variable volume swaps, each with the broadcast shape of the inputs
+    strike: np.ndarray
+    expected_payoff: np.ndarray
+    delta: np.ndarray
+
+
+class VariableVolumeSwapMonteCarlo(NamedTuple):
+    strike: MonteCarloEstimate
+    expected_payoff: MonteCarloEstimate
+
+
+def value_variable_volume_swaps(fwd: ArrayLike, sigma: ArrayLike, T: ArrayLike, N_L: ArrayLike, N_H: ArrayLike,
+                                K_L: ArrayLike, K_H: ArrayLike, K: Optional[ArrayLike] = None,
+                                discount_factor: ArrayLike = 1) -> VariableVolumeSwapValuation:
+    """
+    Values variable volume swaps whose volume is a call spread of the price, N_L + lev * (max(S_T - K_L, 0) -
+    max(S_T - K_H, 0)) with lev = (N_H - N_L) / (K_H - K_L), over arrays of buckets (e.g. contract months x peak blocks
+    x zones) in one pass. Same as "variable_volume_swap_strike", "variable_volume_swap_delta" and
+    "variable_volume_swap_expected_payoff_analytical" in Options_valuation.ipynb, with the forward as the underlying and
+    the payoffs discounted.
+
+    The call spreads at the forward and at the Girsanov-shifted forward (fwd * exp(sigma ** 2 * T)) are priced once, in
+    one Black-76 call, and shared by the strike, the expected payoff and the delta.
+
+    Args:
+        fwd: Forward price
+        sigma: Volatility of the forward (e.g. hub implied vol scaled by the PVM, see "scale_vols_by_pvm")
+        T: Time to expiry in years
+        N_L: Volume below K_L
+        N_H: Volume above K_H
+        K_L: Price at which the volume starts to increase
+        K_H: Price at which the volume stops to increase
+        K: Optional swap strike (defaults to the no-arbitrage strike, for which the expected payoff is 0)
+        discount_factor: Discount factor of the payment date, e.g. from "emtdb_api.pull_discount_factors"
+
+    Returns: VariableVolumeSwapValuation of arrays with the broadcast shape of the inputs
+        strike: No-arbitrage strike
+        expected_payoff: Present value of the expected payoff (S_T - K) * volume at strike K
+        delta: Present value of the sensitivity of the expected payoff to the forward (the forward volume to hedge)
+    """
+    fwd, sigma, T, N_L, N_H, K_L, K_H, discount_factor = np.broadcast_arrays(
+        *[np.asarray(x, dtype=float) for x in (fwd, sigma, T, N_L, N_H, K_L, K_H, discount_factor)])
+    lev = (N_H - N_L) / (K_H - K_L)
+    girsanov = np.exp((sigma ** 2) * T)
+
+    # options on (forward, shifted forward) x (K_L, K_H), undiscounted
+    options = black_76(f_0=np.stack([fwd, fwd * girsanov])[:, None], k=np.stack([K_L, K_H])[None], T=T, r=0,
+                       sigma=sigma)
+    CS, CS_tilde = options.price[:, 0] - options.price[:, 1]
+    delta_CS, delta_CS_tilde = options.delta[:, 0] - options.delta[:, 1]
+    delta_CS_tilde = delta_CS_tilde * girsanov
+
+    strike = (N_L * fwd + lev * fwd * CS_tilde) / (N_L + lev * CS)
+    K = strike if K is None else np.broadcast_to(np.asarray(K, dtype=float), strike.shape)
+
+    # E[S_T * max(S_T - k, 0)] = fwd * call price at the shifted forward, see "option_pricing.variable_volume_dollars"
+    expected_payoff = (N_L * fwd + lev * fwd * CS_tilde) - K * (N_L + lev * CS)
+    delta = N_L + lev * (CS_tilde + delta_CS_tilde * fwd - K * delta_CS)
+
+    return VariableVolumeSwapValuation(strike=strike, expected_payoff=discount_factor * expected_payoff,
+                                       delta=discount_factor * delta)
+
+
+def scale_vols_by_pvm(hub_vol: pd.Series, pvm: pd.DataFrame) -> pd.DataFrame:
+    """
+    Scales hub vols of contract months by the PVMs of their calendar months
+
+    Args:
+        hub_vol: Hub vol, index = Contract month start dates
+        pvm: PVMs, e.g. the 'Node' frame of "pvm.get_cash_pvm" (get_cash_pvm(...)['Node']), columns = Peak blocks,
+            rows = Months 1-12 (other rows are ignored)
+
+    Returns: pd.DataFrame
+        columns = Peak blocks
+        index = Contract month start dates
+    """
+    months = pd.DatetimeIndex(hub_vol.index).month
+    multipliers = pvm.loc[[x for x in pvm.index if x in range(1, 13)]].reindex(months).to_numpy(dtype=float)
+    return pd.DataFrame(multipliers * hub_vol.to_numpy(dtype=float)[:, None], index=hub_vol.index,
+                        columns=pvm.columns)
+
+
+def value_variable_volume_deal(df_fwd: pd.DataFrame, df_vol: pd.DataFrame, eval_dt: str, N_L: ArrayLike,
+                               N_H: ArrayLike, K_L: ArrayLike, K_H: ArrayLike, K: Optional[ArrayLike] = None,
+                               df_discount: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    Values all buckets of a full requirements deal at once, see "value_variable_volume_swaps"
+
+    Args:
+        df_fwd: Forward prices (e.g. split and shaped), columns = Buckets (e.g. peak blocks, or (zone, peak block)),
+            index = Contract month start dates
+        df_vol: Vols with the same columns and index as df_fwd, e.g. from "scale_vols_by_pvm"
+        eval_dt: Evaluation date, e.g. '2024-07-10'. Options expire at the end of their contract month.
+        N_L, N_H, K_L, K_H: Volume model, scalars or arrays broadcasting against df_fwd's values
+        K: Optional swap strikes (defaults to the no-arbitrage strikes)
+        df_discount: Optional discount factors from "emtdb_api.pull_discount_factors" (no discounting if not given)
+
+    Returns: pd.DataFrame
+        columns = ('Forward', 'Vol', 'T', 'Discount Factor', 'Strike', 'Expected Payoff', 'Delta')
+        index names = ('Contract Month', *bucket names)
+    """
+    assert df_vol.shape == df_fwd.shape
+    contract_months = pd.DatetimeIndex(df_fwd.index)
+    df_vol = df_vol.reindex(index=df_fwd.index, columns=df_fwd.columns)
+
+    T = ((contract_months + pd.offsets.MonthEnd()) - pd.to_datetime(eval_dt)).days.to_numpy() / 365
+    if df_discount is not None:
+        discount_factors = df_discount.set_index(df_discount['Contract Month'].astype(str))['Discount Factor']
+        discount_factor = discount_factors.reindex(contract_months.strftime('%Y%m')).to_numpy()
+        if np.isnan(discount_factor).any():
+            raise Exception(f'missing discount factors: {list(contract_months[np.isnan(discount_factor)])}')
+    else:
+        discount_factor = np.ones(len(contract_months))
+
+    valuation = value_variable_volume_swaps(
+        fwd=df_fwd.to_numpy(dtype=float), sigma=df_vol.to_numpy(dtype=float), T=T[:, None], N_L=N_L, N_H=N_H, K_L=K_L,
+        K_H=K_H, K=K, discount_factor=discount_factor[:, None]
+    )
+
+    shape = df_fwd.shape
+    data = {
+        'Forward': df_fwd.to_numpy(dtype=float),
+        'Vol': df_vol.to_numpy(dtype=float),
+        'T': np.broadcast_to(T[:, None], shape),
+        'Discount Factor': np.broadcast_to(discount_factor[:, None], shape),
+        'Strike': valuation.strike,
+        'Expected Payoff': valuation.expected_payoff,
+        'Delta': valuation.delta,
+    }
+    # one row per (contract month, bucket), in the row-major order of the values
+    buckets = df_fwd.columns if isinstance(df_fwd.columns, pd.MultiIndex) else pd.MultiIndex.from_arrays([df_fwd.columns])
+    index = pd.MultiIndex.from_tuples(
+        [(month,) + bucket for month in df_fwd.index for bucket in buckets],
+        names=['Contract Month'] + [x if x is not None else 'Bucket' for x in buckets.names]
+    )
+    return pd.DataFrame({k: np.asarray(v).ravel() for k, v in data.items()}, index=index)
+
+
+def value_variable_volume_swap_mc(S_T: np.ndarray, N_L: float, N_H: float, K_L: float, K_H: float,
+                                  K: Optional[float] = None, S_0: Optional[float] = None, sigma: Optional[float] = None,
+                                  T: Optional[float] = None, r: float = 0, discount_factor: float = 1,
+                                  antithetic: bool = False,
+                                  n_batches: Optional[int] = None) -> VariableVolumeSwapMonteCarlo:
+    """
+    Values a variable volume swap with the call spread volume of "value_variable_volume_swaps" over simulated terminal
+    prices (same as "variable_volume_swap_expected_payoff_empirical" in Options_valuation.ipynb, with the no-arbitrage
+    strike solved directly), with standard errors
+
+    If S_0, sigma and T are given, the terminal price and the calls at K_L and K_H are used as control variates, with
+    their Black-Scholes means.
+
+    Args:
+        S_T: Simulated terminal prices, e.g. from "monte_carlo.simulate_gbm_terminal" or the last step of
+            "monte_carlo.simulate_gbm_paths"
+        N_L, N_H, K_L, K_H: Volume model
+        K: Optional swap strike (defaults to the no-arbitrage strike)
+        S_0, sigma, T, r: Optional initial price, volatility, time to expiry in years and drift of the simulated
+            prices, for the control variates
+        discount_factor: Discount factor of the payment date
+        antithetic, n_batches: How the prices were sampled, see "monte_carlo.monte_carlo_mean"
+
+    Returns: VariableVolumeSwapMonteCarlo
+        strike: No-arbitrage strike
+        expected_payoff: Present value of the expected payoff (S_T - K) * volume at strike K
+    """
+    S_T = np.asarray(S_T, dtype=float)
+    lev = (N_H - N_L) / (K_H - K_L)
+    calls = np.maximum(S_T[:, None] - np.array([K_L, K_H]), 0)
+    volume = N_L + lev * (calls[:, 0] - calls[:, 1])
+
+    controls = control_means = None
+    if S_0 is not None:
+        assert sigma is not None and T is not None
+        controls = np.column_stack([S_T, calls])
+        call_means = black_scholes(s_0=S_0, k=np.array([K_L, K_H]), T=T, r=r, sigma=sigma).price * np.exp(r * T)
+        control_means = np.concatenate([[S_0 * np.exp(r * T)], call_means])
+
+    return _value_swap_mc(S_T=S_T, volume=volume, K=K, discount_factor=discount_factor, antithetic=antithetic,
+                          n_batches=n_batches, controls=controls, control_means=control_means)
+
+
+def value_simple_variable_volume_swap_mc(S_T: np.ndarray, K: Optional[float] = None, S_0: Optional[float] = None,
+                                         T: Optional[float] = None, r: float = 0, discount_factor: float = 1,
+                                         antithetic: bool = False,
+                                         n_batches: Optional[int] = None) -> VariableVolumeSwapMonteCarlo:
+    """
+    Values a variable volume swap whose volume is the price over simulated terminal prices (same as
+    "variable_volume_swap_simple_expected_payoff_empirical" in Options_valuation.ipynb), with standard errors. If S_0
+    and T are given, the terminal price is used as a control variate. See "value_variable_volume_swap_mc".
+
+    Returns: VariableVolumeSwapMonteCarlo
+    """
+    S_T = np.asarray(S_T, dtype=float)
+    controls = control_means = None
+    if S_0 is not None:
+        assert T is not None
+        controls, control_means = S_T, S_0 * np.exp(r * T)
+
+    return _value_swap_mc(S_T=S_T, volume=S_T, K=K, discount_factor=discount_factor, antithetic=antithetic,
+                          n_batches=n_batches, controls=controls, control_means=control_means)
+
+
+def _value_swap_mc(S_T: np.ndarray, volume: np.ndarray, K: Optional[float], discount_factor: float, antithetic: bool,
+                   n_batches: Optional[int], controls: Optional[np.ndarray],
+                   control_means: Optional[np.ndarray]) -> VariableVolumeSwapMonteCarlo:
+    def mean(samples: np.ndarray) -> MonteCarloEstimate:
+        return monte_carlo_mean(samples, antithetic=antithetic, n_batches=n_batches, controls=controls,
+                                control_means=control_means)
+
+    # the strike is the ratio E[S_T * volume] / E[volume], whose error is the error of the expected payoff at the
+    # strike per unit of expected volume
+    expected_volume = mean(volume).value
+    strike = mean(S_T * volume).value / expected_volume
+    strike_std_error = mean((S_T - strike) * volume).std_error / expected_volume
+
+    payoff = mean((S_T - (strike if K is None else K)) * volume)
+    return VariableVolumeSwapMonteCarlo(
+        strike=MonteCarloEstimate(value=strike, std_error=strike_std_error),
+        expected_payoff=MonteCarloEstimate(value=discount_factor * payoff.value,
+                                           std_error=discount_factor * payoff.std_error)
+    )
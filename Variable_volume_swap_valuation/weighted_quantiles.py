@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+from typing import List, Optional, Tuple
+
+# project code
+from option_pricing import ArrayLike
+
+
+def weighted_quantiles(data: np.ndarray, weights: np.ndarray, quantiles: ArrayLike, skipna: bool = False) -> np.ndarray:
+    """
+    Weighted quantiles of every column of data at once, with the same definition as "wquantiles.quantile" (linear
+    interpolation of the sorted values at their cumulative weights minus half their own weight, normalized by the total
+    weight). Each column is sorted once and all quantiles of all columns are looked up in one pass.
+
+    Args:
+        data: Values of shape (n_rows, n_columns)
+        weights: Non-negative weights of shape (n_rows,), or (n_rows, n_columns) for weights specific to each column
+        quantiles: Quantiles between 0 and 1, e.g. [0, 0.1, ..., 1]
+        skipna: If True, NaN values are ignored. Otherwise they are sorted last and included as "wquantiles.quantile"
+            does (any quantile interpolated with a NaN is NaN).
+
+    Returns: np.ndarray of shape (n_quantiles, n_columns)
+    """
+    data = np.asarray(data, dtype=float)
+    assert data.ndim == 2
+    weights = np.broadcast_to(np.asarray(weights, dtype=float).reshape(len(data), -1), data.shape)
+    quantiles = np.atleast_1d(np.asarray(quantiles, dtype=float))
+    assert ((quantiles >= 0) & (quantiles <= 1)).all(), 'quantiles must be between 0 and 1'
+    assert (weights >= 0).all(), 'weights must be non-negative'
+    n_columns = data.shape[1]
+
+    order = np.argsort(data, axis=0)
+    sorted_data = np.take_along_axis(data, order, axis=0)
+    sorted_weights = np.take_along_axis(weights, order, axis=0)
+    is_valid = ~np.isnan(sorted_data) if skipna else np.ones(data.shape, dtype=bool)
+    sorted_weights = np.where(is_valid, sorted_weights, 0)
+    n_valid = is_valid.sum(axis=0)
+
+    cum_weights = np.cumsum(sorted_weights, axis=0)
+    # total weights summed along contiguous memory as np.sum of each column, since ties at the last quantile depend on
+    # the rounding of the total
+    total_weights = np.ascontiguousarray(sorted_weights.T).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        positions = (cum_weights - 0.5 * sorted_weights) / total_weights
+    # skipped values are placed beyond the last quantile so that they are never interpolated
+    positions = np.where(is_valid, positions, 1.5)
+
+    # index of the last position at or below each quantile, for all quantiles and columns at once (positions are sorted)
+    j = (positions[:, None, :] <= quantiles[None, :, None]).sum(axis=0) - 1
+
+    # same rules as np.interp: the first / last value outside of the positions, the value itself on an exact match and
+    # otherwise linear interpolation (from the other side if it is NaN from one side)
+    last = n_valid - 1
+    j_low = np.clip(j, 0, np.maximum(last, 0))
+    j_high = np.clip(j + 1, 0, np.maximum(last, 0))
+    columns = np.arange(n_columns)
+    x_low, x_high = positions[j_low, columns], positions[j_high, columns]
+    y_low, y_high = sorted_data[j_low, columns], sorted_data[j_high, columns]
+    x = quantiles[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (y_high - y_low) / (x_high - x_low)
+        interpolated = slope * (x - x_low) + y_low
+        interpolated = np.where(np.isnan(interpolated), slope * (x - x_high) + y_high, interpolated)
+    interpolated = np.where(np.isnan(interpolated) & (y_low == y_high), y_low, interpolated)
+    interpolated = np.where(x_low == x, y_low, interpolated)
+
+    result = np.where(j < 0, sorted_data[0], np.where(j >= last, sorted_data[np.maximum(last, 0), columns],
+                                                      interpolated))
+    return np.where(n_valid > 0, result, np.nan)
+
+
+def weighted_quantile_table(df: pd.DataFrame, weights: pd.Series,
+                            percentiles: List[float] = tuple(np.linspace(0, 1, 11)), skipna: bool = False) -> pd.DataFrame:
+    """
+    Weighted P-table of every column of df (e.g. the long-term decay of each year and round, weighted by the selected
+    capacity or value of each path), see "weighted_quantiles"
+
+    Returns: pd.DataFrame
+        columns = Columns of df
+        index = Percentiles
+    """
+    values = weighted_quantiles(df.to_numpy(dtype=float), weights.to_numpy(dtype=float), percentiles, skipna=skipna)
+    return pd.DataFrame(values, index=list(percentiles), columns=df.columns)
+
+
+def bootstrap_weighted_quantile_table(df: pd.DataFrame, weights: pd.Series,
+                                      percentiles: List[float] = tuple(np.linspace(0, 1, 11)), n_boot: int = 1000,
+                                      confidence: float = 0.9, skipna: bool = False, seed: Optional[int] = None,
+                                      chunk_size: int = 1_000_000) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Bootstrap confidence bands of a weighted P-table (see "weighted_quantile_table"): the rows (e.g. paths) are
+    resampled with replacement n_boot times together with their weights, and the P-table of every resample is computed
+    at once, chunk_size values at a time
+
+    Args:
+        df: Values, e.g. the long-term decay of each path (rows) for each year and round (columns)
+        weights: Weights of the rows
+        percentiles: Percentiles between 0 and 1
+        n_boot: Number of bootstrap resamples
+        confidence: Confidence level of the bands, e.g. 0.9 for the 5% and 95% quantiles of the resampled P-tables
+        skipna: See "weighted_quantiles"
+        seed: Optional seed of the random generator for reproducible bands
+        chunk_size: Number of resampled values (rows x columns x resamples) computed at a time
+
+    Returns: (lower, upper) pd.DataFrames with the same columns and index as "weighted_quantile_table"
+    """
+    assert 0 < confidence < 1
+    data = df.to_numpy(dtype=float)
+    weights = weights.to_numpy(dtype=float)
+    n_rows, n_columns = data.shape
+    rng = np.random.default_rng(seed)
+
+    boot = []
+    boot_per_chunk = max(1, chunk_size // max(n_rows * n_columns, 1))
+    for start in range(0, n_boot, boot_per_chunk):
+        n = min(boot_per_chunk, n_boot - start)
+        rows = rng.integers(0, n_rows, size=(n_rows, n))
+        # (rows, resamples x columns), each resample's columns side by side
+        resampled_data = data[rows].reshape(n_rows, n * n_columns)
+        resampled_weights = np.repeat(weights[rows], n_columns, axis=1)
+        values = weighted_quantiles(resampled_data, resampled_weights, percentiles, skipna=skipna)
+        boot.append(values.reshape(len(percentiles), n, n_columns))
+    boot = np.concatenate(boot, axis=1)
+
+    alpha = (1 - confidence) / 2
+    lower, upper = np.nanquantile(boot, [alpha, 1 - alpha], axis=1)
+    return (pd.DataFrame(lower, index=list(percentiles), columns=df.columns),
+            pd.DataFrame(upper, index=list(percentiles), columns=df.columns))